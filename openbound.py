@@ -1,6 +1,7 @@
 #!/usr/bin/env python
 # encoding: utf-8
 import argparse
+import atexit
 import os
 import pathlib
 import pygame
@@ -18,11 +19,16 @@ from source.audiomanager     import AudioManager
 from source.cursor           import Cursor
 from source.draggableobject  import DraggableObject
 from source.font             import Font
+from source.frameprofiler    import FrameProfiler
 from source.geometry         import get_window_offset, point_in_box_excl, value_clamp
 from source.globals          import GRID_SIZE, PLAYER_RADIUS, WALL_UNITS
+from source.mapdata          import MapData, print_build_stats
 from source.mauzling         import Mauzling
-from source.misc_gfx         import Color, draw_grid, draw_map_bounds, draw_selection_box, FADE_SEQUENCE
+from source.misc_gfx         import Color, draw_map_bounds, draw_selection_box, FADE_SEQUENCE, GridPattern, SCALE_MODES
 from source.obstacle         import Obstacle
+from source.pathfinding      import write_query_log_csv
+from source.queryoverlay     import QueryOverlay
+from source.renderer         import DirtyRectRenderer, open_renderer, RENDER_BACKENDS
 from source.resizablebox     import ResizableBox
 from source.selectionmenu    import MapMenu, TerrainMenu, UnitMenu
 from source.textinput        import DigitInput, TextInput
@@ -55,10 +61,36 @@ def main(raw_args=None):
     parser.add_argument('-sw', type=int, required=False, metavar='640',       help="screen width",      default=640)
     parser.add_argument('-sh', type=int, required=False, metavar='480',       help="screen height",     default=480)
     parser.add_argument('--fullscreen',  required=False, action='store_true', help="run in fullscreen", default=False)
+    parser.add_argument('--incremental-replan', required=False, action='store_true', help="repair paths with D* Lite when walls change", default=False)
+    parser.add_argument('--navmesh',     required=False, action='store_true', help="pathfind with the rectangle navmesh", default=False)
+    parser.add_argument('--workers',     type=int, required=False, metavar='1', help="processes for building navgraphs (0 = one per core)", default=1)
+    parser.add_argument('--map-stats',   type=str, required=False, metavar='map.json', help="print navgraph build stats for a map and exit", default='')
+    parser.add_argument('--scale-mode',  type=str, required=False, choices=SCALE_MODES, help="how the screen is stretched to the window", default='nearest')
+    parser.add_argument('--renderer',    type=str, required=False, choices=RENDER_BACKENDS, help="software surfaces or the SDL2 renderer", default='software')
+    parser.add_argument('--dirty-rects', required=False, action='store_true', help="only redraw and update the parts of the screen that changed", default=False)
+    parser.add_argument('--frame-profile', required=False, action='store_true', help="print per-section frame times on exit (F5 shows them in game)", default=False)
+    parser.add_argument('--log-dir',     type=str, required=False, metavar='logs', help="where F4 writes pathfind query logs ('' = logs/ next to openbound.py)", default='')
     args = parser.parse_args()
     #
     RESOLUTION     = Vector2(args.sw, args.sh)
     RUN_FULLSCREEN = args.fullscreen
+    INC_REPLAN     = args.incremental_replan
+    USE_NAVMESH    = args.navmesh
+    NUM_WORKERS    = args.workers
+    SCALE_MODE     = args.scale_mode
+    RENDER_BACKEND = args.renderer
+    DIRTY_RECTS    = args.dirty_rects
+    #
+    # build stats only need the map model, so we can skip opening a window
+    #
+    if args.map_stats:
+        if not os.path.isfile(args.map_stats):
+            print('Error: map not found')
+            print('--', args.map_stats)
+            exit(1)
+        map_data = MapData(args.map_stats, num_workers=NUM_WORKERS)
+        print_build_stats(map_data.build_stats)
+        return
     #
     py_dir   = pathlib.Path(__file__).resolve().parent
     GFX_DIR  = os.path.join(py_dir, 'assets', 'gfx')
@@ -66,62 +98,37 @@ def main(raw_args=None):
     FONT_DIR = os.path.join(py_dir, 'assets', 'font')
     TILE_DIR = os.path.join(py_dir, 'assets', 'tiles')
     MAP_DIR  = os.path.join(py_dir, 'maps')
+    LOG_DIR  = args.log_dir if args.log_dir else os.path.join(py_dir, 'logs')
     #
     cursor_img_fns = get_file_paths(GFX_DIR, ['cursor.png', 'cursor_shift.png'])
     player_img_fns = get_file_paths(GFX_DIR, ['sq16.png', 'sq16_gray.png', 'zergling_sprites.png'])
-    playerdeath_fg = get_file_paths(GFX_DIR, ['zerglingdeath0001.png', 'zerglingdeath0001.png',
-                                              'zerglingdeath0002.png', 'zerglingdeath0002.png',
-                                              'zerglingdeath0003.png', 'zerglingdeath0003.png',
-                                              'zerglingdeath0004.png', 'zerglingdeath0004.png',
-                                              'zerglingdeath0005.png', 'zerglingdeath0005.png',
-                                              'zerglingdeath0006.png', 'zerglingdeath0006.png',
-                                              'zerglingdeath0007.png', 'zerglingdeath0007.png'])
-    playerdeath_bg = get_file_paths(GFX_DIR, ['zerglingdebris0000.png']*14 +
-                                             ['zerglingdebris0001.png']*50 +
-                                             ['zerglingdebris0002.png']*50 +
-                                             ['zerglingdebris0003.png']*50 +
-                                             ['zerglingdebris0004.png']*50 +
-                                             ['zerglingdebris0005.png']*50)
+    #
+    # animations are unique frames + how many ticks each one is shown for
+    #
+    playerdeath_fg = get_file_paths(GFX_DIR, ['zerglingdeath0001.png', 'zerglingdeath0002.png', 'zerglingdeath0003.png', 'zerglingdeath0004.png',
+                                              'zerglingdeath0005.png', 'zerglingdeath0006.png', 'zerglingdeath0007.png'])
+    playerdeath_fg_ticks = [2]*7
+    playerdeath_bg = get_file_paths(GFX_DIR, ['zerglingdebris0000.png', 'zerglingdebris0001.png', 'zerglingdebris0002.png',
+                                              'zerglingdebris0003.png', 'zerglingdebris0004.png', 'zerglingdebris0005.png'])
+    playerdeath_bg_ticks = [14, 50, 50, 50, 50, 50]
     t_tool_img_fns = get_file_paths(GFX_DIR, ['pencil_button.png',
                                               'selection_rect_button.png',
                                               'move_button.png'])
     ui_gfx_img_fns = get_file_paths(GFX_DIR, ['ling_icon.png'])
-    psiwal_img_fns = get_file_paths(GFX_DIR, ['psiemit0000.bmp', 'psiemit0000.bmp',
-                                              'psiemit0001.bmp', 'psiemit0001.bmp',
-                                              'psiemit0002.bmp', 'psiemit0002.bmp',
-                                              'psiemit0003.bmp', 'psiemit0003.bmp',
-                                              'psiemit0004.bmp', 'psiemit0004.bmp',
-                                              'psiemit0005.bmp', 'psiemit0005.bmp'])
+    psiwal_img_fns = get_file_paths(GFX_DIR, ['psiemit0000.bmp', 'psiemit0001.bmp', 'psiemit0002.bmp',
+                                              'psiemit0003.bmp', 'psiemit0004.bmp', 'psiemit0005.bmp'])
+    psiwal_ticks   = [2]*6
     crystl_img_fns = get_file_paths(GFX_DIR, ['khchunk0000.bmp'])
-    expovy_img_fns = get_file_paths(GFX_DIR, ['zairdthl0000.bmp', 'zairdthl0000.bmp',
-                                              'zairdthl0001.bmp', 'zairdthl0001.bmp',
-                                              'zairdthl0002.bmp', 'zairdthl0002.bmp',
-                                              'zairdthl0003.bmp', 'zairdthl0003.bmp',
-                                              'zairdthl0004.bmp', 'zairdthl0004.bmp',
-                                              'zairdthl0005.bmp', 'zairdthl0005.bmp',
-                                              'zairdthl0006.bmp', 'zairdthl0006.bmp',
-                                              'zairdthl0007.bmp', 'zairdthl0007.bmp'])
-    expscr_img_fns = get_file_paths(GFX_DIR, ['zairdths0000.bmp', 'zairdths0000.bmp',
-                                              'zairdths0001.bmp', 'zairdths0001.bmp',
-                                              'zairdths0002.bmp', 'zairdths0002.bmp',
-                                              'zairdths0003.bmp', 'zairdths0003.bmp',
-                                              'zairdths0004.bmp', 'zairdths0004.bmp',
-                                              'zairdths0005.bmp', 'zairdths0005.bmp',
-                                              'zairdths0006.bmp', 'zairdths0006.bmp',
-                                              'zairdths0007.bmp', 'zairdths0007.bmp'])
-    tele_img_fns   = get_file_paths(GFX_DIR, ['ehamed0000.bmp', 'ehamed0000.bmp', 'ehamed0000.bmp',
-                                              'ehamed0001.bmp', 'ehamed0001.bmp', 'ehamed0001.bmp',
-                                              'ehamed0002.bmp', 'ehamed0002.bmp', 'ehamed0002.bmp',
-                                              'ehamed0003.bmp', 'ehamed0003.bmp', 'ehamed0003.bmp',
-                                              'ehamed0004.bmp', 'ehamed0004.bmp', 'ehamed0004.bmp',
-                                              'ehamed0005.bmp', 'ehamed0005.bmp', 'ehamed0005.bmp',
-                                              'ehamed0006.bmp', 'ehamed0006.bmp', 'ehamed0006.bmp',
-                                              'ehamed0007.bmp', 'ehamed0007.bmp', 'ehamed0007.bmp',
-                                              'ehamed0008.bmp', 'ehamed0008.bmp', 'ehamed0008.bmp',
-                                              'ehamed0009.bmp', 'ehamed0009.bmp', 'ehamed0009.bmp',
-                                              'ehamed0010.bmp', 'ehamed0010.bmp', 'ehamed0010.bmp',
-                                              'ehamed0011.bmp', 'ehamed0011.bmp', 'ehamed0011.bmp',
-                                              'ehamed0012.bmp', 'ehamed0012.bmp', 'ehamed0012.bmp'])
+    expovy_img_fns = get_file_paths(GFX_DIR, ['zairdthl0000.bmp', 'zairdthl0001.bmp', 'zairdthl0002.bmp', 'zairdthl0003.bmp',
+                                              'zairdthl0004.bmp', 'zairdthl0005.bmp', 'zairdthl0006.bmp', 'zairdthl0007.bmp'])
+    expovy_ticks   = [2]*8
+    expscr_img_fns = get_file_paths(GFX_DIR, ['zairdths0000.bmp', 'zairdths0001.bmp', 'zairdths0002.bmp', 'zairdths0003.bmp',
+                                              'zairdths0004.bmp', 'zairdths0005.bmp', 'zairdths0006.bmp', 'zairdths0007.bmp'])
+    expscr_ticks   = [2]*8
+    tele_img_fns   = get_file_paths(GFX_DIR, ['ehamed0000.bmp', 'ehamed0001.bmp', 'ehamed0002.bmp', 'ehamed0003.bmp', 'ehamed0004.bmp',
+                                              'ehamed0005.bmp', 'ehamed0006.bmp', 'ehamed0007.bmp', 'ehamed0008.bmp', 'ehamed0009.bmp',
+                                              'ehamed0010.bmp', 'ehamed0011.bmp', 'ehamed0012.bmp'])
+    tele_ticks     = [3]*13
     wall_icons_fns = get_file_paths(GFX_DIR, ['nowall.png'])
     tele_icons_fns = get_file_paths(GFX_DIR, ['tele_origin.png', 'tele_dest.png'])
     #
@@ -165,17 +172,20 @@ def main(raw_args=None):
     pygame.mixer.pre_init(frequency=44100, size=-16, channels=2, buffer=2048)
     pygame.init()
     pygame.display.set_caption(GAME_VERS)
-    disp_flags = 0
-    if RUN_FULLSCREEN:
-        disp_flags |= pygame.FULLSCREEN
     if UPSCALE_2X:
-        upscale_screen = pygame.display.set_mode(size=2*RESOLUTION, flags=disp_flags, depth=0, display=0, vsync=0)
-        screen         = pygame.Surface(RESOLUTION)
+        screen = open_renderer(RENDER_BACKEND, RESOLUTION, 2*RESOLUTION, RUN_FULLSCREEN, SCALE_MODE, GAME_VERS)
     else:
-        screen = pygame.display.set_mode(size=RESOLUTION, flags=disp_flags, depth=0, display=0, vsync=0)
+        screen = open_renderer(RENDER_BACKEND, RESOLUTION, None, RUN_FULLSCREEN, SCALE_MODE, GAME_VERS)
+    if DIRTY_RECTS:
+        screen = DirtyRectRenderer(screen)
     trans_fade = pygame.Surface(RESOLUTION)
     edbar_fade = pygame.Surface(Vector2(RESOLUTION.x, 128))
+    grid_pattern = GridPattern(GRID_SIZE, Color.GRID_MINOR, Color.GRID_MAJOR)
     main_clock = pygame.time.Clock()
+    frame_profiler = FrameProfiler()
+    show_frame_profile = False
+    if args.frame_profile:
+        atexit.register(frame_profiler.print_summary)   # the game exits from a few different places
     #pygame.event.set_grab(True)
     pygame.mixer.set_num_channels(16)
 
@@ -203,17 +213,19 @@ def main(raw_args=None):
 
     # load animation gfx
     my_animations_background = AnimationManager()
-    my_animations_background.add_animation_cycle(playerdeath_bg, 'playerdebris')
+    my_animations_background.add_animation_cycle(playerdeath_bg, 'playerdebris', frame_ticks=playerdeath_bg_ticks)
     #
     my_animations = AnimationManager()
-    my_animations.add_animation_cycle(expovy_img_fns, 'overlord', colorkey=SC_PAL254)
-    my_animations.add_animation_cycle(expscr_img_fns, 'scourge',  colorkey=SC_PAL254)
+    my_animations.add_animation_cycle(expovy_img_fns, 'overlord', colorkey=SC_PAL254, frame_ticks=expovy_ticks)
+    my_animations.add_animation_cycle(expscr_img_fns, 'scourge',  colorkey=SC_PAL254, frame_ticks=expscr_ticks)
     my_animations.add_animation_cycle(wall_icons_fns, 'nowall_icon')
     my_animations.add_animation_cycle(tele_icons_fns, 'tele_icons')
-    my_animations.add_animation_cycle(tele_img_fns,   'hallucination')
-    my_animations.add_animation_cycle(playerdeath_fg, 'playerdeath')
-    my_animations.add_animation_cycle(psiwal_img_fns, 'psi_emitter', colorkey=SC_PAL254, swap_colors=WHITE_REMAP)
+    my_animations.add_animation_cycle(tele_img_fns,   'hallucination', frame_ticks=tele_ticks)
+    my_animations.add_animation_cycle(playerdeath_fg, 'playerdeath', frame_ticks=playerdeath_fg_ticks)
+    my_animations.add_animation_cycle(psiwal_img_fns, 'psi_emitter', colorkey=SC_PAL254, swap_colors=WHITE_REMAP, frame_ticks=psiwal_ticks)
     my_animations.add_animation_cycle(crystl_img_fns, 'crystal',     colorkey=SC_PAL254)
+    my_animations_background.build_atlas()
+    my_animations.build_atlas()
     #
     explosion_imgs = {'overlord'         : my_animations.all_animations['overlord'][0],
                       'scourge'          : my_animations.all_animations['scourge'][0],
@@ -258,6 +270,9 @@ def main(raw_args=None):
     widget_playerselected.add_text(Vector2(80,  RESOLUTION.y - 54), 'Lives:', 'lives', font_dict['lifecount'])
     widget_playerselected.add_text(Vector2(124, RESOLUTION.y - 54), '',   'lifecount', font_dict['lifecount'])
     #
+    query_overlay      = QueryOverlay(Vector2(4, 4), font_dict['small_w'])
+    show_query_overlay = False
+    #
     #
     #   MAIN MENU WIDGETS
     #
@@ -676,6 +691,7 @@ def main(raw_args=None):
     current_frame = 0
     current_gamestate = GameState.START_MENU
     while True:
+        frame_profiler.start_frame()
         #
         # Get keyboard / mouse inputs ---------------------------- #
         #
@@ -688,11 +704,15 @@ def main(raw_args=None):
         return_pressed  = False
         copy_pressed    = False
         paste_pressed   = False
+        overlay_pressed = False
+        export_pressed  = False
         pygame_events   = pygame.event.get()
         for event in pygame_events:
             if event.type == pl.QUIT:
                 pygame.quit()
                 sys.exit()
+            elif event.type == pl.VIDEOEXPOSE and DIRTY_RECTS:
+                screen.invalidate()
             elif event.type == pl.KEYDOWN:
                 if event.key == pl.K_LEFT:
                     arrow_left = True
@@ -714,6 +734,12 @@ def main(raw_args=None):
                     copy_pressed = True
                 if event.key == pl.K_v and control_pressed:
                     paste_pressed = True
+                if event.key == pl.K_F3:
+                    overlay_pressed = True
+                if event.key == pl.K_F4:
+                    export_pressed = True
+                if event.key == pl.K_F5:
+                    show_frame_profile = not show_frame_profile
             elif event.type == pl.KEYUP:
                 if event.key == pl.K_LEFT:
                     arrow_left = False
@@ -740,12 +766,13 @@ def main(raw_args=None):
         #
         (mx,my) = pygame.mouse.get_pos()
         if UPSCALE_2X:
-            upscaled_size = upscale_screen.get_size()   # might be 2x resoltuion, might be full monitor resolution
+            upscaled_size = screen.get_display_size()   # might be 2x resoltuion, might be full monitor resolution
             mouse_scale_factor = (RESOLUTION.x/upscaled_size[0], RESOLUTION.y/upscaled_size[1])
             mouse_pos_screen = Vector2(int(mx*mouse_scale_factor[0] + 0.5), int(my*mouse_scale_factor[1] + 0.5))
         else:
             mouse_pos_screen = Vector2(mx,my)
         mouse_pos_map = mouse_pos_screen - current_window_offset
+        frame_profiler.mark('input')
         #
         if left_clicking:
             leftclick_is_down = True
@@ -770,8 +797,7 @@ def main(raw_args=None):
         screen.fill(Color.BACKGROUND)
         if current_gamestate not in [GameState.BOUNDING, GameState.PAUSE_MENU]:
             grid_offset = Vector2(current_window_offset.x % (2*GRID_SIZE), current_window_offset.y % (2*GRID_SIZE))
-            draw_grid(screen, RESOLUTION,   GRID_SIZE, grid_offset, Color.GRID_MINOR)
-            draw_grid(screen, RESOLUTION, 2*GRID_SIZE, grid_offset, Color.GRID_MAJOR)
+            grid_pattern.draw(screen, grid_offset)
 
         #
         # STARTING MENU
@@ -910,6 +936,18 @@ def main(raw_args=None):
                     draw_cursor = my_player.issue_new_order(mouse_pos_map, shift_pressed)
                     if draw_cursor:
                         my_cursor.start_click_animation(mouse_pos_screen, shift_pressed)
+                #
+                if overlay_pressed:
+                    show_query_overlay = not show_query_overlay
+                if export_pressed:
+                    csv_fn = os.path.abspath(os.path.join(LOG_DIR, 'pathfind_queries_' + time.strftime('%Y%m%d_%H%M%S') + '.csv'))
+                    try:
+                        os.makedirs(LOG_DIR, exist_ok=True)
+                        write_query_log_csv(csv_fn, world_map.query_log)
+                        print('wrote', len(world_map.query_log), 'pathfind queries to', csv_fn)
+                    except OSError as e:
+                        print('Error: could not write pathfind query log')
+                        print('--', csv_fn, '--', e)
             #
             elif current_gamestate == GameState.PAUSE_MENU:
                 current_volume = 0.125
@@ -999,6 +1037,9 @@ def main(raw_args=None):
                 widget_playerselected.text_data['lifecount'] = str(my_player.num_lives)
                 widget_playerselected.draw(screen)
             #
+            if current_gamestate == GameState.BOUNDING and show_query_overlay:
+                query_overlay.draw(screen, world_map.query_log)
+            #
             if current_gamestate == GameState.BOUNDING:
                 my_cursor.draw(screen)
             #
@@ -1081,6 +1122,8 @@ def main(raw_args=None):
                 editor_tilemap = editor_tilemap[:,:di_y]
             elif di_y > editor_prevtilemapdim[1]:
                 editor_tilemap = np.pad(editor_tilemap, [(0,0), (0,di_y-editor_prevtilemapdim[1])])
+            if editor_tilemap.shape != editor_prevtilemapdim:
+                editor_tiledrawer.mark_dirty()
             editor_prevtilemapdim = editor_tilemap.shape
             #
             # set area where mapobjects can be placed/dragged so that they can't overlap editor elements at the bottom
@@ -1227,6 +1270,7 @@ def main(raw_args=None):
                     stb = [[int(selected_terrain_box[0].x) + int(selected_terrain_box[3].x), int(selected_terrain_box[0].y) + int(selected_terrain_box[3].y)],
                            [int(selected_terrain_box[1].x) + int(selected_terrain_box[3].x), int(selected_terrain_box[1].y) + int(selected_terrain_box[3].y)]]
                     editor_tilemap[stb[0][0]:stb[1][0], stb[0][1]:stb[1][1]] = selected_tileblock
+                    editor_tiledrawer.mark_dirty((stb[0][0], stb[0][1], stb[1][0], stb[1][1]))
                 if paste_pressed and copied_tilesize != None:
                     new_pos = (int(-current_window_offset.x/GRID_SIZE + mapobject_limits[0].x/GRID_SIZE + 0.6),
                                int(-current_window_offset.y/GRID_SIZE + mapobject_limits[0].y/GRID_SIZE + 0.6))
@@ -1267,8 +1311,10 @@ def main(raw_args=None):
                         #
                         if leftclick_is_down:
                             editor_tilemap[snap_x:snap_x+new_tile.shape[0],snap_y:snap_y+new_tile.shape[1]] = new_tile
+                            editor_tiledrawer.mark_dirty((snap_x, snap_y, snap_x+new_tile.shape[0], snap_y+new_tile.shape[1]))
                         elif rightclick_is_down:
                             editor_tilemap[snap_x:snap_x+del_tile.shape[0],snap_y:snap_y+del_tile.shape[1]] = del_tile
+                            editor_tiledrawer.mark_dirty((snap_x, snap_y, snap_x+del_tile.shape[0], snap_y+del_tile.shape[1]))
                     if selected_terrain_box != None:
                         clear_sel_tb = True
                 #
@@ -1297,6 +1343,7 @@ def main(raw_args=None):
                             selected_tileblock   = np.copy(editor_tilemap[stb[0][0]:stb[1][0], stb[0][1]:stb[1][1]])
                             terrainbox_blink_ind = 8
                             editor_tilemap[stb[0][0]:stb[1][0], stb[0][1]:stb[1][1]] = 0
+                            editor_tiledrawer.mark_dirty((stb[0][0], stb[0][1], stb[1][0], stb[1][1]))
                         if right_clicking and selected_terrain_box != None:
                             clear_sel_tb = True
                 #
@@ -1322,6 +1369,7 @@ def main(raw_args=None):
                     stb = [[int(selected_terrain_box[0].x) + int(selected_terrain_box[3].x), int(selected_terrain_box[0].y) + int(selected_terrain_box[3].y)],
                            [int(selected_terrain_box[1].x) + int(selected_terrain_box[3].x), int(selected_terrain_box[1].y) + int(selected_terrain_box[3].y)]]
                     editor_tilemap[stb[0][0]:stb[1][0], stb[0][1]:stb[1][1]] = selected_tileblock
+                    editor_tiledrawer.mark_dirty((stb[0][0], stb[0][1], stb[1][0], stb[1][1]))
                     selected_terrain_box = None
 
             #
@@ -1776,9 +1824,9 @@ def main(raw_args=None):
                         #
                         # load map json and set up world objects
                         #
-                        world_map = WorldMap(map_fn_to_load, tile_manager)
+                        world_map = WorldMap(map_fn_to_load, tile_manager, num_workers=NUM_WORKERS)
                         current_map_bounds = Vector2(world_map.map_width * GRID_SIZE, world_map.map_height * GRID_SIZE)
-                        my_player = Mauzling(world_map.start_pos, 0, player_img_fns[0], player_img_fns[2], swap_colors=WHITE_REMAP)
+                        my_player = Mauzling(world_map.start_pos, 0, player_img_fns[0], player_img_fns[2], swap_colors=WHITE_REMAP, incremental_replan=INC_REPLAN, use_navmesh=USE_NAVMESH)
                         my_player.num_lives = world_map.init_lives
                         current_map_fn = map_fn_to_load
                         map_fn_to_load = None
@@ -1819,20 +1867,36 @@ def main(raw_args=None):
             if not transition_alpha:
                 next_gamestate = None
 
+        frame_profiler.mark('update+draw')
+
         # Print FPS / mouse coords ------------------------------- #
         fps_str = '{0:0.2f}'.format(main_clock.get_fps())
         mxy_str = '{0}, {1}'.format(int(mouse_pos_map.x), int(mouse_pos_map.y))
         font_dict['fps'].render(screen, fps_str, Vector2(RESOLUTION[0]-34, 4), centered=False)
         font_dict['fps'].render(screen, mxy_str, Vector2(RESOLUTION[0]-58, RESOLUTION[1]-17), centered=False)
+        if show_frame_profile:
+            frame_profiler.draw(screen, font_dict['small_w'], Vector2(RESOLUTION[0]-268, 24))
+        frame_profiler.mark('hud')
+
+        # Redraw whatever changed (dirty-rect mode) -------------- #
+        if DIRTY_RECTS:
+            screen.redraw_dirty()
+            frame_profiler.mark('redraw (dirty)')
 
         # Stretch screen to fill upsized window (if needed) ------ #
+        # -- (the sdl2 renderer scales while presenting)
         if UPSCALE_2X:
-            scaled_screen = pygame.transform.scale(screen, upscale_screen.get_size())
-            upscale_screen.blit(scaled_screen, (0,0))
+            screen.upscale()
+            frame_profiler.mark('scale (' + SCALE_MODE + ')')
 
         # Update ------------------------------------------------- #
-        pygame.display.update()
-        main_clock.tick_busy_loop(FRAMERATE)
+        screen.present()
+        frame_profiler.mark('present')
+        if DIRTY_RECTS:
+            main_clock.tick(FRAMERATE)  # sleeps instead of spinning, so idle menus are actually idle
+        else:
+            main_clock.tick_busy_loop(FRAMERATE)
+        frame_profiler.mark('wait')
         current_frame += 1
 
         if left_released:
@@ -2,19 +2,31 @@ import pygame
 
 from pygame.math import Vector2
 
+from source.atlas   import TextureAtlas
 from source.globals import SWAP_COLORS
 
 # a class that loads gfx into memory, draws active animations
+# -- an animation is its unique frames plus how many ticks each one is shown for
+# -- running animations store the tick they're on, tick_frames[img_name][tick] says which frame that is
 
 class AnimationManager:
 	def __init__(self):
 		self.all_animations = {}
 		self.img_offsets    = {}	# for drawing centered
+		self.tick_frames    = {}	# [img_name] = frame index for every tick of the cycle
 		self.active_animations  = []
 		self.looping_animations = {}
+		self.alpha_frames       = {}	# [(img_name, frame, alpha)] = translucent copy of that frame, see get_alpha_frame()
+		self.frame_areas        = {}	# [img_name] = [(atlas page, rect) for each frame], see build_atlas()
 
-	def add_animation_cycle(self, img_fn_sequence, img_name, colorkey=None, swap_colors=None):
+	def add_animation_cycle(self, img_fn_sequence, img_name, colorkey=None, swap_colors=None, frame_ticks=None):
+		if frame_ticks == None:
+			frame_ticks = [1 for n in img_fn_sequence]
+		if len(frame_ticks) != len(img_fn_sequence) or any([n < 1 for n in frame_ticks]):
+			print('Error: animation needs one positive tick count per frame:', img_name)
+			exit(1)
 		self.all_animations[img_name] = [pygame.image.load(n).convert_alpha() for n in img_fn_sequence]
+		self.tick_frames[img_name]    = [i for (i, num_ticks) in enumerate(frame_ticks) for n in range(num_ticks)]
 		#
 		if colorkey != None:
 			for base_img in self.all_animations[img_name]:
@@ -36,6 +48,9 @@ class AnimationManager:
 							base_img.set_at((x, y), pygame.Color(swap_dict[my_col]))
 		#
 		self.img_offsets[img_name] = [Vector2(int(n.get_width()/2), int(n.get_height()/2)) for n in self.all_animations[img_name]]
+		self.alpha_frames = {k:v for (k,v) in self.alpha_frames.items() if k[0] != img_name}
+		if img_name in self.frame_areas:
+			del self.frame_areas[img_name]
 
 	def start_new_animation(self, img_name, position, centered=True, alpha_layer=False, prepend=False):
 		if prepend:
@@ -55,40 +70,75 @@ class AnimationManager:
 		self.active_animations  = []
 		self.looping_animations = {}
 
+	#
+	# call this once after adding all the animation cycles: packs every frame into an atlas so draw() can blit from a few pages
+	#
+	def build_atlas(self):
+		atlas = TextureAtlas(has_alpha=True)
+		atlas_entries = {k:[atlas.add(n) for n in v] for (k,v) in self.all_animations.items()}
+		atlas.build()
+		for (img_name, entries) in atlas_entries.items():
+			self.all_animations[img_name] = [atlas.get_surface(n) for n in entries]
+			self.frame_areas[img_name]    = [atlas.get_area(n) for n in entries]
+
+	#
+	# alpha_layer frames: the frame flattened onto an opaque surface with a surface alpha, made once and then reused
+	#
+	def get_alpha_frame(self, img_name, frame, alpha=128):
+		if (img_name, frame, alpha) not in self.alpha_frames:
+			my_img = self.all_animations[img_name][frame]
+			alpha_surface = pygame.Surface(my_img.get_size())
+			alpha_surface.set_alpha(alpha)
+			alpha_surface.blit(my_img, (0,0))
+			self.alpha_frames[(img_name, frame, alpha)] = alpha_surface
+		return self.alpha_frames[(img_name, frame, alpha)]
+
+	#
+	# (source, dest[, area, special_flags]) for Surface.blits(), or None if the frame doesn't overlap the screen
+	#
+	def get_blit(self, anim, screen_rect, offset):
+		frame  = self.tick_frames[anim[1]][anim[0]]
+		my_img = self.all_animations[anim[1]][frame]
+		my_pos = anim[2]
+		is_centered = anim[3]
+		is_alpha = anim[4]
+		if is_centered:
+			dest = my_pos - self.img_offsets[anim[1]][frame] + offset
+		else:
+			dest = my_pos + offset
+		if not screen_rect.colliderect(pygame.Rect(dest, my_img.get_size())):
+			return None
+		if is_alpha:
+			return (self.get_alpha_frame(anim[1], frame), dest, None, pygame.BLEND_ALPHA_SDL2)
+		if anim[1] in self.frame_areas:
+			(atlas_page, area) = self.frame_areas[anim[1]][frame]
+			return (atlas_page, dest, area)
+		return (my_img, dest)
+
+	#
+	# everything on screen goes out in one blits() call (looping animations first, same order as they were added)
+	# -- frames still advance for animations that were culled, so they stay in sync when they scroll back into view
+	# -- finished animations are compacted out of active_animations in place
+	#
 	def draw(self, screen, offset):
+		screen_rect = screen.get_rect()
+		blit_list   = []
 		for k,v in self.looping_animations.items():
-			my_img = self.all_animations[v[1]][v[0]]
-			my_pos = v[2]
-			is_centered = v[3]
-			is_alpha = v[4]
-			if is_centered:
-				centering_offset = self.img_offsets[v[1]][v[0]]
-			else:
-				centering_offset = Vector2(0,0)
-			if is_alpha:
-				alpha_surface = pygame.Surface(my_img.get_size())
-				alpha_surface.set_alpha(128)
-				alpha_surface.blit(my_img, (0,0))
-				screen.blit(alpha_surface, my_pos - centering_offset + offset, special_flags=pygame.BLEND_ALPHA_SDL2)
-			else:
-				screen.blit(my_img, my_pos - centering_offset + offset)
-			self.looping_animations[k][0] = (self.looping_animations[k][0] + 1) % len(self.all_animations[v[1]])
+			my_blit = self.get_blit(v, screen_rect, offset)
+			if my_blit != None:
+				blit_list.append(my_blit)
+			v[0] = (v[0] + 1) % len(self.tick_frames[v[1]])
+		#
+		num_kept = 0
+		for v in self.active_animations:
+			my_blit = self.get_blit(v, screen_rect, offset)
+			if my_blit != None:
+				blit_list.append(my_blit)
+			v[0] += 1
+			if v[0] < len(self.tick_frames[v[1]]):
+				self.active_animations[num_kept] = v
+				num_kept += 1
+		del self.active_animations[num_kept:]
 		#
-		for i,v in enumerate(self.active_animations):
-			my_img = self.all_animations[v[1]][v[0]]
-			my_pos = v[2]
-			is_centered = v[3]
-			is_alpha = v[4]
-			if is_centered:
-				centering_offset = self.img_offsets[v[1]][v[0]]
-			else:
-				centering_offset = Vector2(0,0)
-			if is_alpha:
-				alpha_surface = pygame.Surface(my_img.get_size())
-				alpha_surface.set_alpha(128)
-				alpha_surface.blit(my_img, (0,0))
-				screen.blit(alpha_surface, my_pos - centering_offset + offset, special_flags=pygame.BLEND_ALPHA_SDL2)
-			else:
-				screen.blit(my_img, my_pos - centering_offset + offset)
-			self.active_animations[i][0] += 1
-		self.active_animations = [n for n in self.active_animations if n[0] < len(self.all_animations[n[1]])]
+		if blit_list:
+			screen.blits(blit_list, doreturn=False)
@@ -0,0 +1,68 @@
+import pygame
+
+#
+# texture atlas: lots of small surfaces packed into a few large pages
+# -- add() everything, build() once, then get_area() gives (page, rect) for Surface.blits() and get_surface() a subsurface view
+# -- packing is a simple shelf packer (tallest first), it only takes microseconds so it's redone every time
+# -- entries are padded so the same pages can be uploaded as textures later without neighbors bleeding in when filtered
+#
+
+ATLAS_PAGE_SIZE = 1024
+ATLAS_PADDING   = 1
+
+#
+# sizes = [(w, h), ...] --> [(page, x, y), ...] in the same order
+#
+def pack_shelves(sizes, page_size=ATLAS_PAGE_SIZE, padding=ATLAS_PADDING):
+	layout   = [None for n in sizes]
+	(page, shelf_x, shelf_y, shelf_h) = (0, 0, 0, 0)
+	for i in sorted(range(len(sizes)), key=lambda i: (-sizes[i][1], -sizes[i][0], i)):
+		(w, h) = (sizes[i][0] + padding, sizes[i][1] + padding)
+		if shelf_x + w > page_size and shelf_x > 0:
+			(shelf_x, shelf_y, shelf_h) = (0, shelf_y + shelf_h, 0)
+		if shelf_y + h > page_size and shelf_y > 0:
+			(page, shelf_x, shelf_y, shelf_h) = (page + 1, 0, 0, 0)
+		layout[i] = (page, shelf_x, shelf_y)
+		shelf_x += w
+		shelf_h  = max(shelf_h, h)
+	return layout
+
+class TextureAtlas:
+	def __init__(self, has_alpha=True, page_size=ATLAS_PAGE_SIZE, padding=ATLAS_PADDING):
+		self.has_alpha = has_alpha
+		self.page_size = page_size
+		self.padding   = padding
+		self.surfaces  = []	# added surfaces, dropped once they're copied into pages
+		self.pages     = []
+		self.areas     = []	# [entry] = (page surface, rect)
+
+	def add(self, surface):
+		self.surfaces.append(surface)
+		return len(self.surfaces) - 1
+
+	def build(self):
+		sizes  = [list(n.get_size()) for n in self.surfaces]
+		layout = pack_shelves(sizes, self.page_size, self.padding)
+		num_pages = max([n[0] for n in layout] + [-1]) + 1
+		page_dims = [[1, 1] for n in range(num_pages)]
+		for ((page, x, y), (w, h)) in zip(layout, sizes):
+			page_dims[page][0] = max(page_dims[page][0], x + w)
+			page_dims[page][1] = max(page_dims[page][1], y + h)
+		for page_dim in page_dims:
+			if self.has_alpha:
+				self.pages.append(pygame.Surface(page_dim, pygame.SRCALPHA).convert_alpha())
+				self.pages[-1].fill((0,0,0,0))
+			else:
+				self.pages.append(pygame.Surface(page_dim).convert())
+		self.areas = []
+		for ((page, x, y), surface) in zip(layout, self.surfaces):
+			self.pages[page].blit(surface, (x, y), special_flags=pygame.BLEND_RGBA_MAX if self.has_alpha else 0)
+			self.areas.append((self.pages[page], pygame.Rect((x, y), surface.get_size())))
+		self.surfaces = []
+
+	def get_area(self, entry):
+		return self.areas[entry]
+
+	def get_surface(self, entry):
+		(page, rect) = self.areas[entry]
+		return page.subsurface(rect)
@@ -0,0 +1,242 @@
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import tempfile
+import time
+
+from source.globals     import GRID_SIZE, PLAYER_RADIUS
+from source.mapdata     import MapData
+from source.mapgen      import MAP_TYPES, write_generated_map
+from source.pathfinding import BUILD_STAGES, pathfind
+
+#
+# headless benchmarks, results are written as json so they can be compared across revisions
+# -- python -m source.bench pathfinding [--maps maps/*.json] [--gen-types pillars maze] [--sizes 16 32 48 64] [--out bench_pathfinding.json]
+# -- python -m source.bench render [--maps maps/*.json] [--resolution 640 480] [--scale 2] [--backends software sdl2] [--frames 200] [--out bench_render.json]
+#
+
+# paths are relative to the repo rather than the working directory, so this runs from anywhere
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MAP_DIR  = os.path.join(REPO_DIR, 'maps')
+
+def get_shipped_maps():
+	return [os.path.join(MAP_DIR, n) for n in sorted(os.listdir(MAP_DIR)) if n[-5:] == '.json']
+
+def get_git_revision():
+	try:
+		return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR, stderr=subprocess.DEVNULL).decode().strip()
+	except (OSError, subprocess.CalledProcessError):
+		return None
+
+def get_percentiles(times):
+	if not times:
+		return {}
+	times = sorted(times)
+	out   = {'mean': sum(times)/len(times), 'max': times[-1]}
+	for p in [50, 90, 99]:
+		out['p'+str(p)] = times[min(len(times)-1, int(len(times)*p/100))]
+	return out
+
+#
+# load time, per-stage build times (summed over wall states) and query latency for one map
+#
+def bench_pathfinding_map(map_fn, unit_radius, num_queries, seed):
+	tt = time.perf_counter()
+	map_data  = MapData(map_fn, unit_radius)
+	load_time = time.perf_counter() - tt
+	#
+	build_stats = [map_data.build_stats[(unit_radius, wkey)] for wkey in sorted(map_data.all_wall_maps.keys())]
+	stage_times = {k: sum([n['time'][k] for n in build_stats]) for k in BUILD_STAGES}
+	num_nodes   = sum([n['num_nodes'] for n in build_stats])
+	num_edges   = sum([n['num_edges'] for n in build_stats])
+	#
+	# queries start from open tile centers and go anywhere, in random wall states
+	#
+	rng        = random.Random(seed)
+	wall_keys  = sorted(map_data.all_wall_maps.keys())
+	map_size   = (map_data.map_width*GRID_SIZE, map_data.map_height*GRID_SIZE)
+	query_times = []
+	for i in range(num_queries):
+		for (obnum, statenum) in enumerate(rng.choice(wall_keys)):
+			map_data.change_wall_state(obnum, statenum)
+		open_tiles = (map_data.regionmap >= 0).nonzero()
+		if not len(open_tiles[0]):
+			break
+		k = rng.randrange(len(open_tiles[0]))
+		starting_pos = (open_tiles[0][k]*GRID_SIZE + GRID_SIZE/2, open_tiles[1][k]*GRID_SIZE + GRID_SIZE/2)
+		ending_pos   = (rng.uniform(0, map_size[0]-1), rng.uniform(0, map_size[1]-1))
+		tt = time.perf_counter()
+		pathfind(map_data, starting_pos, ending_pos, unit_radius)
+		query_times.append(time.perf_counter() - tt)
+	#
+	return {'map':         os.path.basename(map_fn),
+	        'map_width':   map_data.map_width,
+	        'map_height':  map_data.map_height,
+	        'wall_states': len(wall_keys),
+	        'num_nodes':   num_nodes,
+	        'num_edges':   num_edges,
+	        'load':        load_time,
+	        'stages':      stage_times,
+	        'queries':     get_percentiles(query_times)}
+
+def bench_pathfinding(args):
+	map_fns = sorted(args.maps)
+	results = []
+	with tempfile.TemporaryDirectory() as temp_dir:
+		for map_type in args.gen_types:
+			for map_size in args.sizes:
+				map_fn = os.path.join(temp_dir, map_type + '_' + str(map_size) + '.json')
+				write_generated_map(map_fn, map_type, map_size, map_size, seed=args.seed, pillar_density=args.density)
+				map_fns.append(map_fn)
+		for map_fn in map_fns:
+			results.append(bench_pathfinding_map(map_fn, args.radius, args.queries, args.seed))
+			print_pathfinding_result(results[-1])
+	return results
+
+def print_pathfinding_result(result):
+	print(result['map'], '({}x{}, {} wall states, {} nodes, {} edges)'.format(result['map_width'], result['map_height'], result['wall_states'], result['num_nodes'], result['num_edges']))
+	print(' -- load:   {:9.2f} ms'.format(1000*result['load']))
+	print(' -- stages: ' + '  '.join(['{} {:.2f} ms'.format(k, 1000*result['stages'][k]) for k in BUILD_STAGES]))
+	if result['queries']:
+		print(' -- query:  ' + '  '.join(['{} {:.3f} ms'.format(k, 1000*result['queries'][k]) for k in ['p50', 'p90', 'p99', 'max']]))
+
+#
+# per-frame cost of each WorldMap.draw layer while panning around the map at a fixed resolution, for each renderer backend
+# -- pygame is only imported here (with the dummy video driver) so the pathfinding suite stays pygame-free
+#
+RENDER_LAYERS = {'terrain':   {'draw_tiles': True,  'draw_obs': False, 'draw_walkable': False, 'draw_pathing': False},
+                 'obstacles': {'draw_tiles': False, 'draw_obs': True,  'draw_walkable': False, 'draw_pathing': False},
+                 'debug':     {'draw_tiles': False, 'draw_obs': False, 'draw_walkable': True,  'draw_pathing': True}}
+
+def bench_render_map(map_fn, tile_manager, renderers, num_frames, seed):
+	from pygame.math     import Vector2
+	from source.worldmap import WorldMap
+	world_map  = WorldMap(map_fn, tile_manager)
+	map_size   = world_map.get_mapsize()
+	results    = []
+	for (backend, screen) in renderers:
+		resolution = screen.get_size()
+		rng        = random.Random(seed)
+		offsets    = [Vector2(-rng.uniform(0, max(0, map_size.x - resolution[0])), -rng.uniform(0, max(0, map_size.y - resolution[1]))) for n in range(num_frames)]
+		#
+		# first frame with nothing cached (for sdl2 that includes uploading the textures)
+		#
+		world_map.invalidate_terrain()
+		tt = time.perf_counter()
+		world_map.draw(screen, offsets[0], **RENDER_LAYERS['terrain'])
+		screen.upscale()
+		screen.present()
+		cold_time = time.perf_counter() - tt
+		#
+		# draw = queueing up the layer, frame = that plus scaling and presenting (where the sdl2 renderer does its work)
+		#
+		layer_times = {}
+		frame_times = {}
+		for (layer, layer_kwargs) in RENDER_LAYERS.items():
+			draw_times = []
+			full_times = []
+			for offset in offsets:
+				screen.fill((0,0,0))
+				tt = time.perf_counter()
+				world_map.draw(screen, offset, **layer_kwargs)
+				draw_times.append(time.perf_counter() - tt)
+				screen.upscale()
+				screen.present()
+				full_times.append(time.perf_counter() - tt)
+			layer_times[layer] = get_percentiles(draw_times)
+			frame_times[layer] = get_percentiles(full_times)
+		results.append({'map':        os.path.basename(map_fn),
+		                'backend':    backend,
+		                'map_width':  world_map.map_width,
+		                'map_height': world_map.map_height,
+		                'cold':       cold_time,
+		                'layers':     layer_times,
+		                'frames':     frame_times})
+	return results
+
+def bench_render(args):
+	os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+	import pygame
+	from source.renderer    import open_renderer
+	from source.tilemanager import TileManager
+	pygame.init()
+	display_size = None
+	if args.scale > 1:
+		display_size = (args.scale*args.resolution[0], args.scale*args.resolution[1])
+	renderers    = [(n, open_renderer(n, args.resolution, display_size, scale_mode=args.scale_mode)) for n in args.backends]
+	tile_manager = TileManager(os.path.join(REPO_DIR, 'assets', 'tiles'))
+	#
+	map_fns = sorted(args.maps)
+	results = []
+	with tempfile.TemporaryDirectory() as temp_dir:
+		for map_type in args.gen_types:
+			for map_size in args.sizes:
+				map_fn = os.path.join(temp_dir, map_type + '_' + str(map_size) + '.json')
+				write_generated_map(map_fn, map_type, map_size, map_size, seed=args.seed, pillar_density=args.density)
+				map_fns.append(map_fn)
+		for map_fn in map_fns:
+			for result in bench_render_map(map_fn, tile_manager, renderers, args.frames, args.seed):
+				results.append(result)
+				print_render_result(results[-1])
+	pygame.quit()
+	return results
+
+def print_render_result(result):
+	print(result['map'], '({}x{}, {})'.format(result['map_width'], result['map_height'], result['backend']))
+	print(' -- cold terrain frame: {:.2f} ms'.format(1000*result['cold']))
+	for layer in RENDER_LAYERS.keys():
+		print(' -- {:10s} draw  '.format(layer + ':') + '  '.join(['{} {:.3f} ms'.format(k, 1000*result['layers'][layer][k]) for k in ['p50', 'p90', 'p99', 'max']]))
+		print(' -- {:10s} frame '.format('') + '  '.join(['{} {:.3f} ms'.format(k, 1000*result['frames'][layer][k]) for k in ['p50', 'p90', 'p99', 'max']]))
+
+def main(raw_args=None):
+	parser = argparse.ArgumentParser(description='openbound benchmarks', formatter_class=argparse.ArgumentDefaultsHelpFormatter,)
+	subparsers = parser.add_subparsers(dest='suite', required=True)
+	#
+	pf_parser = subparsers.add_parser('pathfinding', help="navgraph build stages and query latency", formatter_class=argparse.ArgumentDefaultsHelpFormatter,)
+	pf_parser.add_argument('--maps',    type=str, nargs='*', default=None, help="map json files (None = every map in maps/)")
+	pf_parser.add_argument('--gen-types', type=str, nargs='*', default=['pillars'], choices=MAP_TYPES, help="generated map layouts", dest='gen_types')
+	pf_parser.add_argument('--sizes',   type=int, nargs='*', default=[16, 32, 48, 64], help="generated map sizes (in tiles)")
+	pf_parser.add_argument('--density', type=float, default=0.02,                 help="pillar density of generated maps")
+	pf_parser.add_argument('--radius',  type=int, default=PLAYER_RADIUS,           help="unit radius")
+	pf_parser.add_argument('--queries', type=int, default=200,                     help="queries per map")
+	pf_parser.add_argument('--seed',    type=int, default=0,                       help="rng seed for generated maps and queries")
+	pf_parser.add_argument('--out',     type=str, default='bench_pathfinding.json', help="json output")
+	#
+	# navgraphs are still built on load, so generated maps for the render suite are opt-in (and corridors are the cheapest)
+	#
+	rn_parser = subparsers.add_parser('render', help="WorldMap.draw cost per layer", formatter_class=argparse.ArgumentDefaultsHelpFormatter,)
+	rn_parser.add_argument('--maps',       type=str, nargs='*', default=None, help="map json files (None = every map in maps/)")
+	rn_parser.add_argument('--gen-types',  type=str, nargs='*', default=['corridors'], choices=MAP_TYPES, help="generated map layouts", dest='gen_types')
+	rn_parser.add_argument('--sizes',      type=int, nargs='*', default=[],         help="generated map sizes (in tiles)")
+	rn_parser.add_argument('--density',    type=float, default=0.02,                help="pillar density of generated maps")
+	rn_parser.add_argument('--resolution', type=int, nargs=2, default=[640, 480],   help="screen size", metavar=('W', 'H'))
+	rn_parser.add_argument('--scale',      type=int, default=2,                     help="window size as a multiple of the resolution (1 = no scaling)")
+	rn_parser.add_argument('--scale-mode', type=str, default='nearest', choices=['nearest', 'smooth'], help="how the frame is stretched to the window", dest='scale_mode')
+	rn_parser.add_argument('--backends',   type=str, nargs='*', default=['software', 'sdl2'], choices=['software', 'sdl2'], help="renderers to compare")
+	rn_parser.add_argument('--frames',     type=int, default=200,                   help="frames per layer")
+	rn_parser.add_argument('--seed',       type=int, default=0,                     help="rng seed for generated maps and scroll offsets")
+	rn_parser.add_argument('--out',        type=str, default='bench_render.json',   help="json output")
+	args = parser.parse_args(raw_args)
+	if args.maps == None:
+		args.maps = get_shipped_maps()
+	#
+	if args.suite == 'pathfinding':
+		results = bench_pathfinding(args)
+	elif args.suite == 'render':
+		results = bench_render(args)
+	#
+	out_dat = {'suite':     args.suite,
+	           'revision':  get_git_revision(),
+	           'timestamp': time.strftime('%Y-%m-%d %H:%M:%S'),
+	           'python':    platform.python_version(),
+	           'args':      {k:v for (k,v) in vars(args).items() if k not in ['suite', 'out']},
+	           'results':   results}
+	with open(args.out, 'w') as f:
+		json.dump(out_dat, f, indent=1)
+	print('wrote', args.out)
+
+if __name__ == '__main__':
+	main()
@@ -2,29 +2,30 @@ import pygame
 
 from pygame.math import Vector2
 
+#
+# click markers: every (image, keyframe) is scaled once up front, drawing is just blits
+# -- a shift-click adds a marker alongside the ones still playing (queued waypoints), a normal click replaces them
+#
 class Cursor:
 	def __init__(self, img_filenames):
-		self.position = Vector2(0,0)
 		self.img      = [pygame.image.load(n).convert_alpha() for n in img_filenames]
-		self.img_i    = 0
-		self.frame    = -1
 		self.scale    = [(27,27), (33,33), (39,39), (33,33)]
 		self.offset   = [Vector2(14,14), Vector2(17,17), Vector2(20,20), Vector2(17,17)]
+		self.frames   = [[pygame.transform.scale(my_img, my_scale) for my_scale in self.scale] for my_img in self.img]
+		self.markers  = []	# [frame, position, img_i] for each click animation still playing
 
 	def start_click_animation(self, position, shift_pressed=False):
-		self.frame = 0
-		self.position = position
 		if shift_pressed:
-			self.img_i = 1
+			img_i = 1
 		else:
-			self.img_i = 0
+			img_i = 0
+			self.markers = []
+		self.markers.append([0, Vector2(position), img_i])
 
 	def draw(self, screen):
-		if self.frame >= 0:
-			my_img = pygame.transform.scale(self.img[self.img_i], self.scale[self.frame])
-			my_pos = self.position - self.offset[self.frame]
-			screen.blit(my_img, my_pos)
-			self.frame += 1
-		if self.frame >= len(self.scale):
-			self.frame = -1
-			
\ No newline at end of file
+		if not self.markers:
+			return
+		screen.blits([(self.frames[img_i][frame], position - self.offset[frame]) for (frame, position, img_i) in self.markers], doreturn=False)
+		for marker in self.markers:
+			marker[0] += 1
+		self.markers = [n for n in self.markers if n[0] < len(self.scale)]
@@ -0,0 +1,327 @@
+import heapq
+import math
+import numpy as np
+
+from source.globals     import GRID_SIZE
+from source.pathfinding import edge_is_traversable, get_distance
+
+INF   = float('inf')
+SQRT2 = math.sqrt(2)
+
+STRING_PULL_WINDOW = 8	# tile-path corners looked ahead when smoothing
+
+# (dx, dy, cost) for 8-connected tile moves
+NEIGHBOR_OFFSETS = [(-1, 0, 1.), (1, 0, 1.), (0,-1, 1.), (0, 1, 1.),
+                    (-1,-1, SQRT2), (1,-1, SQRT2), (-1, 1, SQRT2), (1, 1, SQRT2)]
+
+def pos_to_tile(pos):
+	return (int(pos[0] / GRID_SIZE), int(pos[1] / GRID_SIZE))
+
+def tile_to_pos(tile):
+	return (tile[0]*GRID_SIZE + GRID_SIZE/2, tile[1]*GRID_SIZE + GRID_SIZE/2)
+
+def octile_distance(a, b):
+	dx = abs(a[0] - b[0])
+	dy = abs(a[1] - b[1])
+	return max(dx, dy) + (SQRT2 - 1.)*min(dx, dy)
+
+#
+# incremental replanner for a single move order (D* Lite, Koenig & Likhachev 2002)
+# -- open tiles are the ones with a region id in the navgraph regionmap for this unit's radius,
+#    map_dat is the real wall map and is only used for line of sight when smoothing the path
+# -- searches backwards from the goal tile over the 8-connected tile grid so that the g-values survive the
+#    unit moving along its path. when walls change only the vertices around the changed tiles are updated,
+#    and the next call to get_waypoints() only re-expands the part of the search that was invalidated.
+# -- nodes_expanded is the count for the most recent search, total_nodes_expanded is summed over the order
+#
+class DStarLite:
+	def __init__(self, map_dat, regionmap, start_pos, goal_pos, unit_radius):
+		self.map_dat     = map_dat
+		self.walkable    = regionmap >= 0
+		self.unit_radius = unit_radius
+		self.start_pos   = (start_pos[0], start_pos[1])
+		self.goal_pos    = (goal_pos[0], goal_pos[1])
+		self.s_start     = self.get_start_tile(start_pos)
+		self.s_last      = self.s_start
+		self.s_goal      = pos_to_tile(goal_pos)
+		self.km          = 0.
+		self.g           = {}
+		self.rhs         = {self.s_goal: 0.}
+		self.open_list   = []
+		self.open_keys   = {}	# lazy deletion: only the entry matching open_keys[node] is live
+		#
+		self.nodes_expanded         = 0
+		self.initial_nodes_expanded = None
+		self.total_nodes_expanded   = 0
+		self.num_replans            = 0
+		#
+		self.push_node(self.s_goal, self.calculate_key(self.s_goal))
+
+	# large units can stand on tiles that are closed in their inflated map, start from the nearest open one
+	def get_start_tile(self, pos):
+		s = pos_to_tile(pos)
+		if not self.is_blocked(s):
+			return s
+		open_tiles = [(get_distance(pos, tile_to_pos(n)), n) for (n, base_cost) in self.neighbors(s) if not self.is_blocked(n)]
+		if not open_tiles:
+			return s
+		return sorted(open_tiles)[0][1]
+
+	def is_blocked(self, s):
+		if s[0] < 0 or s[1] < 0 or s[0] >= self.walkable.shape[0] or s[1] >= self.walkable.shape[1]:
+			return True
+		return not self.walkable[s[0],s[1]]
+
+	# moving diagonally requires both adjacent orthogonal tiles to be open, otherwise we'd clip the corner
+	def edge_cost(self, u, v, base_cost):
+		if self.is_blocked(u) or self.is_blocked(v):
+			return INF
+		if u[0] != v[0] and u[1] != v[1]:
+			if self.is_blocked((u[0], v[1])) or self.is_blocked((v[0], u[1])):
+				return INF
+		return base_cost
+
+	def neighbors(self, s):
+		for (dx, dy, base_cost) in NEIGHBOR_OFFSETS:
+			n = (s[0]+dx, s[1]+dy)
+			if n[0] >= 0 and n[1] >= 0 and n[0] < self.walkable.shape[0] and n[1] < self.walkable.shape[1]:
+				yield (n, base_cost)
+
+	def calculate_key(self, s):
+		m = min(self.g.get(s, INF), self.rhs.get(s, INF))
+		return (m + octile_distance(self.s_start, s) + self.km, m)
+
+	def push_node(self, s, key):
+		self.open_keys[s] = key
+		heapq.heappush(self.open_list, (key[0], key[1], s))
+
+	def update_vertex(self, u):
+		if u != self.s_goal:
+			best = INF
+			for (n, base_cost) in self.neighbors(u):
+				c = self.edge_cost(u, n, base_cost)
+				if c < INF:
+					best = min(best, c + self.g.get(n, INF))
+			self.rhs[u] = best
+		if u in self.open_keys:
+			del self.open_keys[u]
+		if self.g.get(u, INF) != self.rhs.get(u, INF):
+			self.push_node(u, self.calculate_key(u))
+
+	#
+	# settle_all keeps going until nothing is left to expand, instead of stopping once the start is consistent
+	#
+	def compute_shortest_path(self, settle_all=False):
+		expanded = 0
+		while self.open_list:
+			(k1, k2, u) = self.open_list[0]
+			if self.open_keys.get(u) != (k1, k2):
+				heapq.heappop(self.open_list)
+				continue
+			if not settle_all and (k1, k2) >= self.calculate_key(self.s_start) and self.rhs.get(self.s_start, INF) == self.g.get(self.s_start, INF):
+				break
+			heapq.heappop(self.open_list)
+			del self.open_keys[u]
+			expanded += 1
+			k_new = self.calculate_key(u)
+			if (k1, k2) < k_new:
+				self.push_node(u, k_new)
+			elif self.g.get(u, INF) > self.rhs.get(u, INF):
+				self.g[u] = self.rhs[u]
+				for (n, base_cost) in self.neighbors(u):
+					self.update_vertex(n)
+			else:
+				self.g[u] = INF
+				self.update_vertex(u)
+				for (n, base_cost) in self.neighbors(u):
+					self.update_vertex(n)
+		self.nodes_expanded        = expanded
+		self.total_nodes_expanded += expanded
+		if self.initial_nodes_expanded == None:
+			self.initial_nodes_expanded = expanded
+
+	#
+	# walls changed: update the vertices whose outgoing edge costs depend on the tiles that flipped
+	#
+	def update_map(self, map_dat, regionmap, current_pos):
+		walkable       = regionmap >= 0
+		changed_tiles  = np.argwhere(walkable != self.walkable)
+		self.map_dat   = map_dat
+		self.walkable  = walkable
+		self.start_pos = (current_pos[0], current_pos[1])
+		self.s_start   = self.get_start_tile(current_pos)
+		self.km       += octile_distance(self.s_last, self.s_start)
+		self.s_last    = self.s_start
+		touched = {}
+		for (cx, cy) in changed_tiles:
+			for dx in [-1,0,1]:
+				for dy in [-1,0,1]:
+					u = (int(cx)+dx, int(cy)+dy)
+					if u not in touched and u[0] >= 0 and u[1] >= 0 and u[0] < walkable.shape[0] and u[1] < walkable.shape[1]:
+						touched[u] = True
+						self.update_vertex(u)
+		if len(changed_tiles):
+			self.num_replans += 1
+		return len(changed_tiles)
+
+	#
+	# follows g down from the start, [] if the goal can't be reached
+	# -- after a wall change tiles off the path can still be inconsistent, and following g through them can go round in circles.
+	#    if that happens the whole search is settled (so g is the true distance everywhere) and we follow it again
+	#
+	def get_tile_path(self):
+		self.compute_shortest_path()
+		tile_path = self.follow_g()
+		if tile_path == None:
+			self.compute_shortest_path(settle_all=True)
+			tile_path = self.follow_g()
+		return tile_path or []
+
+	# --> tile path, [] if the start is cut off, None if we came back to a tile we'd already been on
+	def follow_g(self):
+		if self.g.get(self.s_start, INF) == INF:
+			return []
+		tile_path = [self.s_start]
+		visited   = {self.s_start: True}
+		while tile_path[-1] != self.s_goal:
+			s = tile_path[-1]
+			best = (INF, None)
+			for (n, base_cost) in self.neighbors(s):
+				c = self.edge_cost(s, n, base_cost) + self.g.get(n, INF)
+				if c < best[0]:
+					best = (c, n)
+			if best[1] == None:
+				return []
+			if best[1] in visited:
+				return None
+			visited[best[1]] = True
+			tile_path.append(best[1])
+		return tile_path
+
+	def get_step(self, tile_path, k):
+		return (tile_path[k+1][0] - tile_path[k][0], tile_path[k+1][1] - tile_path[k][1])
+
+	#
+	# returns reversed list of (x, y) waypoints (same convention as pathfind)
+	#
+	def get_waypoints(self):
+		tile_path = self.get_tile_path()
+		if not tile_path:
+			return []
+		points = [self.start_pos] + [tile_to_pos(n) for n in tile_path[1:-1]] + [self.goal_pos]
+		# string-pull the tile path back into any-angle segments
+		# -- only corners of the tile path are candidates, and only a few ahead, so the ray casts stay bounded on long paths
+		# -- if not even the next corner is in sight we follow the tile path to it, every tile move was checked by the search
+		corners = [0] + [k for k in range(1, len(tile_path)-1) if self.get_step(tile_path, k-1) != self.get_step(tile_path, k)] + [len(points)-1]
+		smoothed = [points[0]]
+		ci = 0
+		while ci < len(corners) - 1:
+			cj = min(len(corners) - 1, ci + STRING_PULL_WINDOW)
+			while cj > ci and not edge_is_traversable([points[corners[ci]], points[corners[cj]]], self.map_dat, self.unit_radius):
+				cj -= 1
+			if cj == ci:
+				# start / goal can be off their tile centers, in which case we go via the center
+				if corners[ci] == 0 and len(tile_path) > 1:
+					smoothed.append(tile_to_pos(tile_path[0]))
+				smoothed.extend(points[corners[ci]+1:corners[ci+1]])
+				if corners[ci+1] == len(points)-1 and len(tile_path) > 1:
+					smoothed.append(tile_to_pos(tile_path[-1]))
+				smoothed.append(points[corners[ci+1]])
+				ci += 1
+			else:
+				smoothed.append(points[corners[cj]])
+				ci = cj
+		return smoothed[::-1]
+
+#
+# self-check: plan random queries, then keep changing the wall state and replanning from where we are
+# -- every returned segment has to be traversable in the wall map it was planned for, exits 1 if one isn't
+# -- python -m source.dstarlite [maps/test_wall.json ...] [--gen-types maze corridors] [--sizes 32] [--queries 50]
+#
+if __name__ == '__main__':
+	import argparse
+	import os
+	import random
+	import tempfile
+	import time
+	from source.bench       import get_shipped_maps
+	from source.globals     import PLAYER_RADIUS
+	from source.mapdata     import MapData
+	from source.mapgen      import MAP_TYPES, write_generated_map
+	from source.pathfinding import UNIT_RADIUS_EPS, valid_player_pos
+	#
+	parser = argparse.ArgumentParser(description='D* Lite replanning self-check', formatter_class=argparse.ArgumentDefaultsHelpFormatter,)
+	parser.add_argument('maps', nargs='*', default=None, help="map json files (None = every map in maps/)")
+	parser.add_argument('--gen-types', type=str, nargs='*', default=['pillars', 'maze', 'corridors'], choices=MAP_TYPES, help="generated map layouts", dest='gen_types')
+	parser.add_argument('--sizes',    type=int, nargs='*', default=[32],   help="generated map sizes (in tiles)")
+	parser.add_argument('--radius',   type=int, default=PLAYER_RADIUS,     help="unit radius")
+	parser.add_argument('--queries',  type=int, default=50,                help="random queries per map")
+	parser.add_argument('--changes',  type=int, default=4,                 help="wall changes per query")
+	parser.add_argument('--seed',     type=int, default=0,                 help="rng seed for generated maps and queries")
+	args = parser.parse_args()
+	#
+	my_unitbuff = args.radius - UNIT_RADIUS_EPS
+	num_failed  = 0
+	with tempfile.TemporaryDirectory() as temp_dir:
+		map_fns = args.maps if args.maps else get_shipped_maps()
+		gen_fns = []
+		for map_type in args.gen_types:
+			for map_size in args.sizes:
+				gen_fns.append(os.path.join(temp_dir, map_type + '_' + str(map_size) + '.json'))
+				write_generated_map(gen_fns[-1], map_type, map_size, map_size, seed=args.seed, num_obstacles=2, num_locs=4, num_states=3)
+		for map_fn in map_fns + gen_fns:
+			world_map = MapData(map_fn, args.radius)
+			wall_keys = sorted(world_map.all_wall_maps.keys())
+			rng       = random.Random(args.seed)
+			# with a single wall state there's nothing to replan, which is only expected of shipped maps
+			if len(wall_keys) < 2:
+				print(os.path.basename(map_fn), '-- only one wall state, skipped')
+				if map_fn in gen_fns:
+					num_failed += 1
+				continue
+			(num_plans, num_replans, num_segs, num_bad, plan_time) = (0, 0, 0, 0, 0.)
+			for query_i in range(args.queries):
+				for (obnum, statenum) in enumerate(rng.choice(wall_keys)):
+					world_map.change_wall_state(obnum, statenum)
+				(map_dat, pf_nodes, pf_edges, pf_collision, pf_regionmap) = world_map.get_navgraph(args.radius)
+				open_tiles = np.argwhere(pf_regionmap >= 0)
+				if not len(open_tiles):
+					continue
+				(start_pos, goal_pos) = [tile_to_pos(open_tiles[rng.randrange(len(open_tiles))]) for n in range(2)]
+				# somewhere in the tile if there's room, else the tile center
+				# -- in game the goal is the end of a pathfind() path, so also somewhere a unit can stand
+				jittered = [(p[0] + rng.uniform(-GRID_SIZE/2, GRID_SIZE/2), p[1] + rng.uniform(-GRID_SIZE/2, GRID_SIZE/2)) for p in (start_pos, goal_pos)]
+				(start_pos, goal_pos) = [j if valid_player_pos(j, map_dat, my_unitbuff) else p for (p, j) in zip((start_pos, goal_pos), jittered)]
+				if not valid_player_pos(start_pos, map_dat, my_unitbuff) or not valid_player_pos(goal_pos, map_dat, my_unitbuff):
+					continue
+				replanner = DStarLite(map_dat, pf_regionmap, start_pos, goal_pos, my_unitbuff)
+				current_pos = start_pos
+				for change_i in range(args.changes + 1):
+					if change_i > 0:
+						for (obnum, statenum) in enumerate(rng.choice(wall_keys)):
+							world_map.change_wall_state(obnum, statenum)
+						(map_dat, pf_nodes, pf_edges, pf_collision, pf_regionmap) = world_map.get_navgraph(args.radius)
+						if not valid_player_pos(current_pos, map_dat, my_unitbuff):
+							break
+						if replanner.update_map(map_dat, pf_regionmap, current_pos):
+							num_replans += 1
+					tt = time.perf_counter()
+					waypoints = replanner.get_waypoints()[::-1]
+					plan_time += time.perf_counter() - tt
+					num_plans += 1
+					for i in range(len(waypoints)-1):
+						num_segs += 1
+						if not edge_is_traversable([waypoints[i], waypoints[i+1]], map_dat, my_unitbuff):
+							num_bad += 1
+							print(' -- untraversable segment', waypoints[i], '-->', waypoints[i+1], 'wall state', world_map.current_wall_state)
+					# carry on from the first waypoint, so the next replan starts partway along the path
+					if len(waypoints) >= 2:
+						current_pos = waypoints[1]
+			num_failed += num_bad
+			print(os.path.basename(map_fn), '--', num_plans, 'plans', num_replans, 'after wall changes', num_segs, 'segments', num_bad, 'untraversable', ' {:.3f} ms per plan'.format(1000*plan_time/max(num_plans, 1)))
+			if num_replans == 0:
+				print(' -- no wall change ever affected a path in progress')
+				num_failed += 1
+	print('FAILED' if num_failed else 'OK')
+	if num_failed:
+		exit(1)
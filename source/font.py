@@ -1,7 +1,9 @@
 import pygame
 
+from collections import OrderedDict
 from pygame.math import Vector2
 
+from source.atlas    import TextureAtlas
 from source.misc_gfx import clip
 
 #
@@ -12,6 +14,21 @@ from source.misc_gfx import clip
 COLUMN_DELIMITER_COLOR = (127, 127, 127, 255)
 TEXT_CHARACTER_COLOR   = (  0,   0,   0, 255)
 
+TEXT_CACHE_SIZE = 256   # rendered strings kept per font
+ROW_CACHE_SIZE  = 256   # word-wrapped layouts kept per font
+
+#
+# least-recently-used lookup in an OrderedDict, make_func() fills in misses
+#
+def get_lru(cache, key, max_size, make_func):
+    if key in cache:
+        cache.move_to_end(key)
+        return cache[key]
+    if len(cache) >= max_size:
+        cache.popitem(last=False)
+    cache[key] = make_func()
+    return cache[key]
+
 class Font():
     def __init__(self, path, color, scalar=1):
         self.spacing = scalar
@@ -37,9 +54,17 @@ class Font():
                 current_char_width = 0
             else:
                 current_char_width += 1
+        # glyphs are packed into one atlas page, render() blits straight from it
+        atlas = TextureAtlas(has_alpha=True)
+        atlas_entries = {k:atlas.add(v) for (k,v) in self.characters.items()}
+        atlas.build()
+        self.characters  = {k:atlas.get_surface(v) for (k,v) in atlas_entries.items()}
+        self.char_areas  = {k:atlas.get_area(v) for (k,v) in atlas_entries.items()}
         self.char_height = self.characters['A'].get_height()
         self.char_width  = {k:self.characters[k].get_width() for k in self.characters.keys()}
         self.char_width[' '] = self.char_width['A']
+        self.text_cache  = OrderedDict()    # [(text, max_width, num_rows, centered)] = (surface, offset), see get_text_surface()
+        self.row_cache   = OrderedDict()    # [(text, max_width)] = words_by_row
 
     #
     #
@@ -48,9 +73,12 @@ class Font():
         return ''.join([n for n in text if (n in self.characters or n == ' ')])
 
     #
-    #
+    # x_offset follows from text, so the layout is cached by (text, max_width) alone
     #
     def get_words_by_row(self, text, x_offset, max_width):
+        return get_lru(self.row_cache, (text, max_width), ROW_CACHE_SIZE, lambda: self.split_rows(text, x_offset, max_width))
+
+    def split_rows(self, text, x_offset, max_width):
         words       = text.split(' ')
         split_words = []
         current_xi  = 0
@@ -113,9 +141,10 @@ class Font():
 
 
     #
+    # glyph blits for text drawn at (0,0) --> [(atlas page, offset, area), ...], or None if there's nothing to draw
     #
-    #
-    def render(self, screen, text, pos, centered=False, max_width=-1, num_rows=1):
+    def get_blit_list(self, text, centered=False, max_width=-1, num_rows=1):
+        pos = Vector2(0,0)
         sanitized_text = self.sanitize(text)
         x_trim = len(sanitized_text)
         while x_trim >= 1 and sanitized_text[x_trim-1] == ' ':
@@ -147,6 +176,7 @@ class Font():
         # we're rendering multiple rows, lets split by word
         # -- if a word takes up more an entire row we're going to split it
         #
+        blit_list = []
         if max_width > 0 and num_rows > 1:
             words_by_row = self.get_words_by_row(text_trimmed, x_offset, max_width)
             words_by_row = words_by_row[:num_rows]
@@ -163,7 +193,8 @@ class Font():
                     centered_adj = Vector2(int(x_offset[-1].x/2 - max_width/2), 0)
                 for j,char in enumerate(text_row):
                     if char != ' ':
-                        screen.blit(self.characters[char], pos + x_offset[j] + y_offset[j] - centered_adj)
+                        (atlas_page, area) = self.char_areas[char]
+                        blit_list.append((atlas_page, pos + x_offset[j] + y_offset[j] - centered_adj, area))
         #
         else:
             centered_adj = Vector2(0,0)
@@ -171,4 +202,31 @@ class Font():
                 centered_adj = Vector2(int(x_offset[-1].x/2), int(self.char_height/2))
             for i,char in enumerate(text_to_render):
                 if char != ' ':
-                    screen.blit(self.characters[char], pos + x_offset[i] - centered_adj)
+                    (atlas_page, area) = self.char_areas[char]
+                    blit_list.append((atlas_page, pos + x_offset[i] - centered_adj, area))
+        if not blit_list:
+            return None
+        return blit_list
+
+    #
+    # text --> (surface, offset of its top-left from the render position), or (None, None) if there's nothing to draw
+    # -- the glyphs are composed once into one transparent surface, kept in a per-font LRU cache
+    #
+    def get_text_surface(self, text, centered=False, max_width=-1, num_rows=1):
+        return get_lru(self.text_cache, (text, max_width, num_rows, centered), TEXT_CACHE_SIZE, lambda: self.compose_text(text, centered, max_width, num_rows))
+
+    def compose_text(self, text, centered, max_width, num_rows):
+        blit_list = self.get_blit_list(text, centered, max_width, num_rows)
+        if blit_list == None:
+            return (None, None)
+        bounds = [pygame.Rect((int(n[1].x), int(n[1].y)), n[2].size) for n in blit_list]
+        bounds = bounds[0].unionall(bounds)
+        text_surface = pygame.Surface(bounds.size, pygame.SRCALPHA).convert_alpha()
+        text_surface.fill((0,0,0,0))
+        text_surface.blits([(n[0], n[1] - Vector2(bounds.topleft), n[2]) for n in blit_list], doreturn=False)
+        return (text_surface, Vector2(bounds.topleft))
+
+    def render(self, screen, text, pos, centered=False, max_width=-1, num_rows=1):
+        (text_surface, text_offset) = self.get_text_surface(text, centered, max_width, num_rows)
+        if text_surface != None:
+            screen.blit(text_surface, pos + text_offset)
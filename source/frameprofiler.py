@@ -0,0 +1,83 @@
+import pygame
+import time
+
+from collections import deque
+from pygame.math import Vector2
+
+from source.misc_gfx import Color
+
+FRAME_HISTORY   = 240
+OVERLAY_ALPHA   = 192
+# (header, width in px) for each column of the overlay
+PROFILE_COLUMNS = [('section', 96), ('mean ms', 52), ('p95 ms', 52), ('max ms', 52)]
+
+#
+# per-frame timing split into named sections
+# -- start_frame() at the top of the loop, mark(section) after each chunk of work (the time since the previous mark goes to that section)
+# -- a section can be marked several times per frame, the times add up
+#
+class FrameProfiler:
+	def __init__(self, num_frames=FRAME_HISTORY):
+		self.num_frames    = num_frames
+		self.section_times = {}	# [section] = deque of per-frame seconds
+		self.sections      = []	# in the order they were first marked
+		self.current_frame = {}
+		self.last_mark     = None
+		self.background    = None	# overlay background, remade only when the number of rows changes
+
+	def start_frame(self):
+		if self.last_mark != None:
+			self.end_frame()
+		self.current_frame = {}
+		self.last_mark     = time.perf_counter()
+
+	def mark(self, section):
+		tt = time.perf_counter()
+		if section not in self.current_frame:
+			self.current_frame[section] = 0.
+		self.current_frame[section] += tt - self.last_mark
+		self.last_mark = tt
+
+	def end_frame(self):
+		self.current_frame['total'] = sum(self.current_frame.values())
+		for (section, section_time) in self.current_frame.items():
+			if section not in self.section_times:
+				self.section_times[section] = deque(maxlen=self.num_frames)
+				self.sections.append(section)
+			self.section_times[section].append(section_time)
+		self.last_mark = None
+
+	#
+	# [(section, mean, p95, max)] in seconds, over the last num_frames frames (a section that was skipped in a frame counts as 0 there)
+	#
+	def get_stats(self):
+		stats = []
+		num_frames = max([len(n) for n in self.section_times.values()] + [1])
+		for section in [n for n in self.sections if n != 'total'] + ['total']:
+			if section not in self.section_times:
+				continue
+			times = sorted(list(self.section_times[section]) + [0. for n in range(num_frames - len(self.section_times[section]))])
+			stats.append((section, sum(times)/len(times), times[min(len(times)-1, int(len(times)*0.95))], times[-1]))
+		return stats
+
+	def print_summary(self):
+		print('frame profile (last', max([len(n) for n in self.section_times.values()] + [0]), 'frames)')
+		for (section, mean_time, p95_time, max_time) in self.get_stats():
+			print(' -- {:16s} mean {:7.3f} ms   p95 {:7.3f} ms   max {:7.3f} ms'.format(section, 1000*mean_time, 1000*p95_time, 1000*max_time))
+
+	def draw(self, screen, font, pos):
+		stats      = self.get_stats()
+		row_height = font.char_height + 3
+		width      = sum([n[1] for n in PROFILE_COLUMNS]) + 8
+		if self.background == None or self.background.get_size() != (width, (len(stats) + 1)*row_height + 8):
+			self.background = pygame.Surface((width, (len(stats) + 1)*row_height + 8))
+			self.background.fill(Color.BACKGROUND)
+			self.background.set_alpha(OVERLAY_ALPHA)
+		screen.blit(self.background, pos)
+		rows = [[n[0] for n in PROFILE_COLUMNS]]
+		rows.extend([[section] + ['{:.2f}'.format(1000*n) for n in (mean_time, p95_time, max_time)] for (section, mean_time, p95_time, max_time) in stats])
+		for (i, row_strs) in enumerate(rows):
+			col_x = 0
+			for (row_str, (header, col_width)) in zip(row_strs, PROFILE_COLUMNS):
+				font.render(screen, row_str, Vector2(pos.x + 4 + col_x, pos.y + 4 + i*row_height))
+				col_x += col_width
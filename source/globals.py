@@ -2,6 +2,9 @@ PLAYER_RADIUS = 8
 GRID_SIZE     = 16
 SCROLL_SPEED  = 16
 
+# terrain is pre-rendered into square chunks of this many pixels, only the ones on screen get blitted
+TERRAIN_CHUNK_SIZE = 256
+
 # basically a tolerance for floating point precision when determining equalities
 SMALL_NUMBER = 1e-6
 
@@ -11,3 +14,15 @@ SWAP_COLORS = [(255,0,255,255), (222,0,222,255), (189,0,189,255), (156,0,156,255
 
 #
 WALL_UNITS = ['psi_emitter', 'crystal']
+
+#
+# (is_wall, image_fn, tile_span) -- tile_span is the width of the image in tiles (16x16 = 1, 32x32 = 2, 64x64 = 4)
+#
+TILE_NAME = [(0, '',                 1),
+             (1, '',                 1),
+             (0, 'blank.png',        1),
+             (1, 'wall5.png',        1),
+             (0, 'block.png',        1),
+             (0, 'blank_light.png',  1),
+             (0, 'jungle_test.png',  2),
+             (1, 'jungle_test2.png', 4)]
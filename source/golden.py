@@ -0,0 +1,244 @@
+import argparse
+import importlib
+import json
+import os
+import random
+import tempfile
+import time
+
+from concurrent.futures import ProcessPoolExecutor
+
+from source.bench       import REPO_DIR, get_git_revision, get_shipped_maps
+from source.globals     import GRID_SIZE, PLAYER_RADIUS
+from source.mapdata     import MapData
+from source.mapgen      import MAP_TYPES, write_generated_map
+from source.pathfinding import UNIT_RADIUS_EPS, valid_player_pos
+
+#
+# golden-output regression corpus for the pathfinder
+# -- generate: record (map, wall state, start, goal) --> waypoints for random queries with the current pathfind
+# -- check:    rerun every query with a candidate implementation (in parallel) and compare within a tolerance
+#
+# python -m source.golden generate --out golden_pathfinding.json
+# python -m source.golden check golden_pathfinding.json [--impl source.navmesh:navmesh_pathfind] [--workers 4]
+#
+
+DEFAULT_IMPL = 'source.pathfinding:pathfind'
+
+#
+# fixed queries that once broke pathfind, added to every corpus (each (map, radius) pair becomes its own map entry)
+# -- larger units: goals nudged onto tiles that are closed in the inflated map were out of sight of every node and pathfind exited
+#
+REGRESSION_QUERIES = [{'map': 'maps/test_wall.json', 'radius': 10, 'wall_state': [0, 0], 'start': [425.66, 662.79], 'goal': [11.53, 202.89]},
+                      {'map': 'maps/test_wall.json', 'radius': 14, 'wall_state': [0, 0], 'start': [718.59, 416.99], 'goal': [21.66, 137.36]}]
+
+def get_pathfind_function(impl):
+	(module_name, function_name) = impl.split(':')
+	return getattr(importlib.import_module(module_name), function_name)
+
+#
+# shipped maps are stored by filename (relative to the repo if they're in it), generated ones by the parameters needed to make them again
+#
+def get_corpus_filename(map_fn):
+	rel_fn = os.path.relpath(os.path.abspath(map_fn), REPO_DIR)
+	if rel_fn.startswith('..'):
+		return os.path.abspath(map_fn)
+	return rel_fn
+
+def load_corpus_map(map_spec, unit_radius, temp_dir):
+	if map_spec['type'] == 'file':
+		return MapData(os.path.join(REPO_DIR, map_spec['filename']), unit_radius)
+	map_fn = os.path.join(temp_dir, map_spec['name'] + '.json')
+	write_generated_map(map_fn, map_spec['map_type'], map_spec['size'], map_spec['size'],
+	                    seed=map_spec['seed'],
+	                    pillar_density=map_spec['density'],
+	                    num_obstacles=map_spec['obstacles'],
+	                    num_locs=map_spec['locs'],
+	                    num_states=map_spec['states'])
+	return MapData(map_fn, unit_radius)
+
+def set_wall_state(map_data, wall_state):
+	for (obnum, statenum) in enumerate(wall_state):
+		map_data.change_wall_state(obnum, statenum)
+
+#
+# returns (waypoints, seconds), waypoints is None if the pathfinder bailed out
+#
+def run_query(pathfind_function, map_data, starting_pos, ending_pos, unit_radius):
+	tt = time.perf_counter()
+	try:
+		waypoints = [[n[0], n[1]] for n in pathfind_function(map_data, starting_pos, ending_pos, unit_radius)]
+	except SystemExit:
+		waypoints = None
+	return (waypoints, time.perf_counter() - tt)
+
+def generate_map_queries(map_spec, unit_radius, num_queries, seed, temp_dir):
+	map_data  = load_corpus_map(map_spec, unit_radius, temp_dir)
+	rng       = random.Random(seed)
+	wall_keys = sorted(map_data.all_wall_maps.keys())
+	map_size  = (map_data.map_width*GRID_SIZE, map_data.map_height*GRID_SIZE)
+	pathfind_function = get_pathfind_function(DEFAULT_IMPL)
+	queries = []
+	num_attempts = 0
+	while len(queries) < num_queries and num_attempts < 100*num_queries:
+		num_attempts += 1
+		wall_state = rng.choice(wall_keys)
+		set_wall_state(map_data, wall_state)
+		# start anywhere a unit can actually stand (to the pixel), goal anywhere at all
+		starting_pos = (rng.randint(0, map_size[0]-1), rng.randint(0, map_size[1]-1))
+		ending_pos   = (rng.randint(0, map_size[0]-1), rng.randint(0, map_size[1]-1))
+		if map_data.regionmap[int(starting_pos[0]/GRID_SIZE), int(starting_pos[1]/GRID_SIZE)] < 0:
+			continue
+		if not valid_player_pos(starting_pos, map_data.wall_map, unit_radius - UNIT_RADIUS_EPS):
+			continue
+		(waypoints, query_time) = run_query(pathfind_function, map_data, starting_pos, ending_pos, unit_radius)
+		queries.append({'wall_state': list(wall_state),
+		                'start':      list(starting_pos),
+		                'goal':       list(ending_pos),
+		                'waypoints':  waypoints,
+		                'time':       query_time})
+	return queries
+
+def generate_regression_entries(temp_dir):
+	pathfind_function = get_pathfind_function(DEFAULT_IMPL)
+	entries = {}
+	for reg_query in REGRESSION_QUERIES:
+		entry_key = (reg_query['map'], reg_query['radius'])
+		if entry_key not in entries:
+			map_spec = {'type': 'file', 'name': 'regression_' + os.path.basename(reg_query['map'])[:-5] + '_r' + str(reg_query['radius']), 'filename': reg_query['map']}
+			entries[entry_key] = ({'spec': map_spec, 'radius': reg_query['radius'], 'queries': []}, load_corpus_map(map_spec, reg_query['radius'], temp_dir))
+		(map_entry, map_data) = entries[entry_key]
+		set_wall_state(map_data, reg_query['wall_state'])
+		(waypoints, query_time) = run_query(pathfind_function, map_data, tuple(reg_query['start']), tuple(reg_query['goal']), reg_query['radius'])
+		map_entry['queries'].append({'wall_state': reg_query['wall_state'],
+		                             'start':      reg_query['start'],
+		                             'goal':       reg_query['goal'],
+		                             'waypoints':  waypoints,
+		                             'time':       query_time})
+	return [n[0] for n in entries.values()]
+
+def generate_corpus(args):
+	map_specs = [{'type': 'file', 'name': os.path.basename(n)[:-5], 'filename': get_corpus_filename(n)} for n in sorted(args.maps)]
+	for map_type in args.gen_types:
+		for map_size in args.sizes:
+			map_specs.append({'type': 'generated', 'name': map_type + '_' + str(map_size), 'map_type': map_type, 'size': map_size, 'seed': args.seed, 'density': args.density,
+			                  'obstacles': args.obstacles, 'locs': args.locs, 'states': args.states})
+	corpus = {'revision':  get_git_revision(),
+	          'timestamp': time.strftime('%Y-%m-%d %H:%M:%S'),
+	          'radius':    args.radius,
+	          'maps':      []}
+	with tempfile.TemporaryDirectory() as temp_dir:
+		for (i, map_spec) in enumerate(map_specs):
+			queries = generate_map_queries(map_spec, args.radius, args.queries, args.seed + i, temp_dir)
+			corpus['maps'].append({'spec': map_spec, 'queries': queries})
+			print(map_spec['name'], '--', len(queries), 'queries')
+		for map_entry in generate_regression_entries(temp_dir):
+			corpus['maps'].append(map_entry)
+			print(map_entry['spec']['name'], '--', len(map_entry['queries']), 'queries (radius ' + str(map_entry['radius']) + ')')
+	with open(args.out, 'w') as f:
+		json.dump(corpus, f)
+	print('wrote', args.out)
+
+#
+# worker side of the checker: rerun every query for one map
+# -- error is the largest coordinate difference over all waypoints (inf if the waypoint counts differ)
+# -- the reference pathfind is re-timed next to the candidate in this worker, so the times are comparable
+#    (alternating which goes first, so neither always pays for cold caches)
+#
+def check_map_queries(map_entry, impl, unit_radius, tolerance):
+	pathfind_function  = get_pathfind_function(impl)
+	reference_function = get_pathfind_function(DEFAULT_IMPL)
+	results = []
+	with tempfile.TemporaryDirectory() as temp_dir:
+		map_data = load_corpus_map(map_entry['spec'], unit_radius, temp_dir)
+		for (i, query) in enumerate(map_entry['queries']):
+			set_wall_state(map_data, query['wall_state'])
+			if i % 2:
+				(waypoints, query_time)   = run_query(pathfind_function,  map_data, tuple(query['start']), tuple(query['goal']), unit_radius)
+				(ref_waypoints, ref_time) = run_query(reference_function, map_data, tuple(query['start']), tuple(query['goal']), unit_radius)
+			else:
+				(ref_waypoints, ref_time) = run_query(reference_function, map_data, tuple(query['start']), tuple(query['goal']), unit_radius)
+				(waypoints, query_time)   = run_query(pathfind_function,  map_data, tuple(query['start']), tuple(query['goal']), unit_radius)
+			expected = query['waypoints']
+			if waypoints == None or expected == None or len(waypoints) != len(expected):
+				error = 0. if waypoints == expected else float('inf')
+			else:
+				error = max([0.] + [max(abs(a[0]-b[0]), abs(a[1]-b[1])) for (a,b) in zip(waypoints, expected)])
+			results.append({'ok':        error <= tolerance,
+			                'error':     error,
+			                'time_ref':  ref_time,
+			                'time_new':  query_time,
+			                'waypoints': waypoints})
+	return results
+
+def check_corpus(args):
+	with open(args.corpus, 'r') as f:
+		corpus = json.load(f)
+	num_workers = args.workers if args.workers > 0 else (os.cpu_count() or 1)
+	print('checking', args.impl, 'against', args.corpus, '(revision ' + str(corpus['revision']) + ', ' + str(num_workers) + ' workers)')
+	with ProcessPoolExecutor(max_workers=num_workers) as executor:
+		futures = [executor.submit(check_map_queries, map_entry, args.impl, map_entry.get('radius', corpus['radius']), args.tolerance) for map_entry in corpus['maps']]
+		all_results = [future.result() for future in futures]
+	#
+	num_failed = 0
+	report     = []
+	for (map_entry, results) in zip(corpus['maps'], all_results):
+		failed = [i for (i, r) in enumerate(results) if not r['ok']]
+		num_failed += len(failed)
+		time_ref = sum([r['time_ref'] for r in results])
+		time_new = sum([r['time_new'] for r in results])
+		time_ratio = time_new / time_ref if time_ref > 0 else 0.
+		print('{:24s} {:5d} queries {:5d} failed   ref {:9.2f} ms   new {:9.2f} ms   delta {:+9.2f} ms ({:.2f}x)'.format(map_entry['spec']['name'], len(results), len(failed),
+		      1000*time_ref, 1000*time_new, 1000*(time_new - time_ref), time_ratio))
+		for i in failed[:args.show]:
+			query = map_entry['queries'][i]
+			print(' -- wall state', query['wall_state'], 'start', query['start'], 'goal', query['goal'], 'error', results[i]['error'],
+			      'time delta {:+.3f} ms'.format(1000*(results[i]['time_new'] - results[i]['time_ref'])))
+			print('    expected:', query['waypoints'])
+			print('    got:     ', results[i]['waypoints'])
+		for (query, r) in zip(map_entry['queries'], results):
+			report.append({'map': map_entry['spec']['name'], 'wall_state': query['wall_state'], 'start': query['start'], 'goal': query['goal'],
+			               'ok': r['ok'], 'error': r['error'] if r['error'] != float('inf') else None, 'time_ref': r['time_ref'], 'time_new': r['time_new'], 'time_delta': r['time_new'] - r['time_ref']})
+	if args.report:
+		with open(args.report, 'w') as f:
+			json.dump(report, f, indent=1)
+		print('wrote', args.report)
+	print('FAILED' if num_failed else 'OK', '--', num_failed, 'of', len(report), 'queries differ by more than', args.tolerance)
+	return num_failed
+
+def main(raw_args=None):
+	parser = argparse.ArgumentParser(description='pathfinding golden corpus', formatter_class=argparse.ArgumentDefaultsHelpFormatter,)
+	subparsers = parser.add_subparsers(dest='command', required=True)
+	#
+	gen_parser = subparsers.add_parser('generate', help="record a corpus with the current pathfind", formatter_class=argparse.ArgumentDefaultsHelpFormatter,)
+	gen_parser.add_argument('--maps',    type=str, nargs='*', default=None, help="map json files (None = every map in maps/)")
+	gen_parser.add_argument('--gen-types', type=str, nargs='*', default=['pillars', 'maze', 'corridors'], choices=MAP_TYPES, help="generated map layouts", dest='gen_types')
+	gen_parser.add_argument('--sizes',   type=int, nargs='*', default=[16, 32, 48], help="generated map sizes (in tiles)")
+	gen_parser.add_argument('--density', type=float, default=0.02,                help="pillar density of generated maps")
+	gen_parser.add_argument('--obstacles', type=int, default=1,                   help="obstacles in generated maps")
+	gen_parser.add_argument('--locs',    type=int, default=4,                      help="locations per obstacle in generated maps")
+	gen_parser.add_argument('--states',  type=int, default=3,                      help="wall states per obstacle in generated maps")
+	gen_parser.add_argument('--radius',  type=int, default=PLAYER_RADIUS,          help="unit radius")
+	gen_parser.add_argument('--queries', type=int, default=200,                    help="queries per map")
+	gen_parser.add_argument('--seed',    type=int, default=0,                      help="rng seed for generated maps and queries")
+	gen_parser.add_argument('--out',     type=str, default='golden_pathfinding.json', help="corpus output")
+	#
+	chk_parser = subparsers.add_parser('check', help="compare a pathfind implementation against a corpus", formatter_class=argparse.ArgumentDefaultsHelpFormatter,)
+	chk_parser.add_argument('corpus',      type=str,                        help="corpus json from generate")
+	chk_parser.add_argument('--impl',      type=str,   default=DEFAULT_IMPL, help="module:function with the pathfind signature")
+	chk_parser.add_argument('--tolerance', type=float, default=0.01,         help="max coordinate difference (pixels)")
+	chk_parser.add_argument('--workers',   type=int,   default=0,            help="worker processes (0 = one per core)")
+	chk_parser.add_argument('--show',      type=int,   default=5,            help="failed queries to print per map")
+	chk_parser.add_argument('--report',    type=str,   default='',           help="write per-query results to this json")
+	args = parser.parse_args(raw_args)
+	#
+	if args.command == 'generate':
+		if args.maps == None:
+			args.maps = get_shipped_maps()
+		generate_corpus(args)
+	elif args.command == 'check':
+		if check_corpus(args):
+			exit(1)
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,338 @@
+import itertools
+import json
+import multiprocessing
+import numpy as np
+import os
+import sys
+
+from collections                import deque
+from concurrent.futures         import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from source.globals     import GRID_SIZE, PLAYER_RADIUS, TILE_NAME, WALL_UNITS
+from source.navmesh     import build_navmesh
+from source.pathfinding import BUILD_STAGES, FILT_NAMES, get_inflate_tiles, get_navgraph_edges, get_pathfinding_data, get_region_edges, get_scaled_nodes, inflate_wall_map, QUERY_LOG_SIZE, UNIT_RADIUS_EPS
+
+# aim for a few batches of regions per worker so that one slow batch doesn't leave the others idle
+BATCHES_PER_WORKER = 4
+
+#
+# wall flag for every tile id, expanding multi-tile images the same way TileManager slices them up
+#
+def get_tile_wall_flags():
+	is_wall = []
+	for (tile_is_wall, fn, tile_span) in TILE_NAME:
+		is_wall.extend([tile_is_wall]*(tile_span*tile_span))
+	return is_wall
+
+#
+# worker side of the parallel navgraph build: edges for a batch of regions from one wall state
+#
+def get_region_edges_batch(region_batch, map_dat, unit_radius):
+	return [get_region_edges(nodes, node_dict, map_dat, unit_radius) for (nodes, node_dict) in region_batch]
+
+#
+# returns (pathfinding_data, stage_times), so that workers can send their timings back too
+#
+def get_timed_pathfinding_data(map_dat):
+	stage_times = {}
+	return (get_pathfinding_data(map_dat, stage_times), stage_times)
+
+#
+# rough memory footprint in bytes: numpy arrays by their buffers, containers by their contents
+#
+def get_deep_size(obj):
+	if isinstance(obj, np.ndarray):
+		return obj.nbytes
+	size = sys.getsizeof(obj)
+	if isinstance(obj, dict):
+		size += sum([get_deep_size(k) + get_deep_size(v) for (k,v) in obj.items()])
+	elif isinstance(obj, (list, tuple, set)):
+		size += sum([get_deep_size(n) for n in obj])
+	return size
+
+#
+# human-readable version of MapData.build_stats
+#
+def print_build_stats(build_stats, show_regions=True):
+	for (unit_radius, wkey) in sorted(build_stats.keys()):
+		stats = build_stats[(unit_radius, wkey)]
+		print('unit radius', unit_radius, '-- wall state', list(wkey), '--', stats['num_regions'], 'regions,', stats['num_nodes'], 'nodes,', stats['num_edges'], 'edges')
+		print(' -- filters: ' + '  '.join(['{} {} ({:.1f}%)'.format(k, stats['filt_count'][k], 100*stats['pass_rates'][k]) for k in FILT_NAMES]))
+		print(' -- time:    ' + '  '.join(['{} {:.2f} ms'.format(k, 1000*stats['time'][k]) for k in BUILD_STAGES]))
+		print(' -- memory:  ' + '  '.join(['{} {:.1f} KB'.format(k, stats['memory'][k]/1024) for k in sorted(stats['memory'].keys())]))
+		if show_regions:
+			for region_stats in stats['regions']:
+				if region_stats['num_nodes']:
+					print('    region {:4d}: {:5d} nodes  '.format(region_stats['region'], region_stats['num_nodes']) +
+					      '  '.join(['{} {}'.format(k, region_stats['filt_count'][k]) for k in FILT_NAMES]) + '  ' +
+					      '  '.join(['{} {:.2f} ms'.format(k, 1000*region_stats['time'][k]) for k in BUILD_STAGES[3:]]))
+
+#
+# the map model and everything navigation needs, without pygame
+# -- wall data comes from the map json and the TILE_NAME wall flags, positions are (x, y) tuples in pixels
+# -- WorldMap wraps this with tiles, obstacles and drawing
+# -- num_workers > 1 builds the navgraphs for all wall states in a process pool (0 = one per core)
+#
+class MapData:
+	def __init__(self, map_filename, unit_radius=PLAYER_RADIUS, num_workers=1):
+		#
+		# load in basic map data
+		#
+		with open(map_filename,'r') as f:
+			json_dat = json.load(f)
+		self.json_dat     = json_dat
+		self.map_name     = json_dat['map_name']
+		self.map_author   = json_dat['map_author']
+		self.map_notes    = json_dat['map_notes']
+		self.difficulty   = json_dat['difficulty']
+		self.map_width    = json_dat['map_width']
+		self.map_height   = json_dat['map_height']
+		self.init_lives   = json_dat['init_lives']
+		self.start_pos    = (json_dat['start_pos'][0], json_dat['start_pos'][1])
+		self.tile_dat     = np.array(json_dat['tile_dat']).T
+		self.wall_map     = np.zeros((self.map_width, self.map_height))
+		self.unit_radius  = unit_radius
+		self.p_loswidth   = unit_radius - UNIT_RADIUS_EPS
+		#
+		tile_is_wall = get_tile_wall_flags()
+		for i in range(self.tile_dat.shape[0]):
+			for j in range(self.tile_dat.shape[1]):
+				self.wall_map[i,j] = tile_is_wall[self.tile_dat[i,j]]
+
+		#
+		# parse obstacle locations and the wall states their events can put them in
+		#
+		self.ob_keys      = [n[1] for n in sorted([(int(k[9:]), k) for k in json_dat.keys() if k[:9] == 'obstacle_'])]
+		self.ob_locs      = {}	# [obnum][loc_name] = (x0, y0, x1, y1)
+		self.wall_states  = {}	# [obnum][wall_state] = (0, 0, 1, 1, ...)
+		self.wall_strings = {}	# [obnum][wall_state] = ('1-1', '1-2', ...)
+		self.wall_events  = {}	# [obnum][event] = (wall_state, wall_units)
+		for obnum,k in enumerate(self.ob_keys):
+			loc_keys   = [n[1] for n in sorted([(int(k2[4:]), k2) for k2 in json_dat[k].keys() if k2[:4] == 'loc_'])]
+			event_keys = [n[1] for n in sorted([(int(k2[4:]), k2) for k2 in json_dat[k].keys() if k2[:4] == 'exp_'])]
+			self.ob_locs[obnum] = {}
+			for k2 in loc_keys:
+				my_loc_dat = json_dat[k][k2]
+				self.ob_locs[obnum][k2[4:]] = (my_loc_dat[0], my_loc_dat[1], my_loc_dat[2], my_loc_dat[3])
+			#
+			# get all possible wall states for this ob
+			#
+			loc_2_ind    = {loc_keys[n][4:]:n for n in range(len(loc_keys))}
+			my_wall_keys = [tuple([0 for n in loc_keys])]
+			for k2 in event_keys:
+				my_wall_keys.append([0 for n in loc_keys])
+				my_event_dat = json_dat[k][k2]
+				for i,unitname in enumerate(my_event_dat[1]):
+					if unitname in WALL_UNITS:
+						my_wall_keys[-1][loc_2_ind[my_event_dat[0][i]]] = 1
+				my_wall_keys[-1] = tuple(my_wall_keys[-1])
+			self.wall_states[obnum] = sorted(list(set(my_wall_keys)))
+			self.wall_events[obnum] = []
+			for k2 in event_keys:
+				my_event_dat = json_dat[k][k2]
+				my_k = [0 for n in loc_keys]
+				my_u = [0 for n in loc_keys]
+				for i,unitname in enumerate(my_event_dat[1]):
+					if unitname in WALL_UNITS:
+						my_k[loc_2_ind[my_event_dat[0][i]]] = 1
+						my_u[loc_2_ind[my_event_dat[0][i]]] = WALL_UNITS.index(unitname) + 1
+				self.wall_events[obnum].append((self.wall_states[obnum].index(tuple(my_k)), [n for n in my_u]))
+			self.wall_strings[obnum] = [loc_keys[n][4:] for n in range(len(loc_keys))]
+
+		#
+		# lets sanitize the map: make sure it's surrounded by unmovable terrain
+		#
+		for i in range(self.wall_map.shape[0]):
+			self.wall_map[i,0] = 1
+			self.wall_map[i,self.wall_map.shape[1]-1] = 1
+		for j in range(self.wall_map.shape[1]):
+			self.wall_map[0,j] = 1
+			self.wall_map[self.wall_map.shape[0]-1,j] = 1
+
+		#
+		# how many different wallmaps do we need to account for all the wall states?
+		#
+		sk = sorted(self.wall_states.keys())
+		self.current_wall_state = tuple([0 for k in sk])
+		self.all_wall_maps = {}
+		wall_combinations  = [[(k,n) for n in range(len(self.wall_states[k]))] for k in sk]
+		wall_combinations  = list(itertools.product(*wall_combinations))
+		for wc in wall_combinations:
+			obnums  = [n[0] for n in wc]
+			wstates = [n[1] for n in wc]
+			wkey    = tuple(wstates)
+			self.all_wall_maps[wkey] = np.copy(self.wall_map)
+			for i in range(len(obnums)):
+				my_wall_states  = self.wall_states[obnums[i]][wstates[i]]
+				my_wall_strings = self.wall_strings[obnums[i]]
+				for j in range(len(my_wall_states)):
+					if my_wall_states[j]:
+						(x0, y0, x1, y1) = self.ob_locs[obnums[i]][my_wall_strings[j]]
+						tl_q = (int(x0/GRID_SIZE), int(y0/GRID_SIZE))
+						br_q = (int(x1/GRID_SIZE), int(y1/GRID_SIZE))
+						self.all_wall_maps[wkey][tl_q[0]:br_q[0],tl_q[1]:br_q[1]] = 1
+
+		#
+		# lets construct all the stuff we need for pathfinding
+		# -- navgraphs for our unit radius are built up front, other unit radii are built on demand
+		#
+		self.navgraph_bases = {}	# [(inflate_tiles, wall_state)] = (nodes, node_dict, collision, regionmap)
+		self.navgraphs      = {}	# [(unit_radius, wall_state)]   = (nodes, edges, collision, regionmap)
+		self.navmeshes      = {}	# [(inflate_tiles, wall_state)] = (rects, rect_map, portals)
+		self.base_times     = {}	# [(inflate_tiles, wall_state)] = {stage: seconds}
+		self.build_stats    = {}	# [(unit_radius, wall_state)]   = build report, see set_navgraph()
+		self.query_log      = deque(maxlen=QUERY_LOG_SIZE)	# stats for the most recent pathfind calls
+		self.build_all_navgraphs(self.unit_radius, num_workers)
+		#
+		self.wall_map = self.all_wall_maps[self.current_wall_state]
+		(self.nodes, self.edges, self.collision, self.regionmap) = self.navgraphs[(self.unit_radius, self.current_wall_state)]
+
+	#
+	# region labeling and corner detection only depend on how much the walls get inflated,
+	# so they're shared by every unit radius that rounds to the same number of tiles
+	#
+	def get_navgraph_base(self, num_inflate, wkey):
+		if (num_inflate, wkey) not in self.navgraph_bases:
+			inflated_map = inflate_wall_map(self.all_wall_maps[wkey], num_inflate)
+			(self.navgraph_bases[(num_inflate, wkey)], self.base_times[(num_inflate, wkey)]) = get_timed_pathfinding_data(inflated_map)
+		return self.navgraph_bases[(num_inflate, wkey)]
+
+	def build_navgraph(self, unit_radius, wkey):
+		los_width   = unit_radius - UNIT_RADIUS_EPS
+		num_inflate = get_inflate_tiles(los_width)
+		(pf_nodes, pf_nodedict, pf_collision, pf_regionmap) = self.get_navgraph_base(num_inflate, wkey)
+		(pf_nodes_scaled, pf_edges, region_stats) = get_navgraph_edges(pf_nodes, pf_nodedict, self.all_wall_maps[wkey], los_width)
+		self.set_navgraph(unit_radius, wkey, pf_edges, region_stats)
+
+	#
+	# store a finished navgraph along with its build report:
+	# -- node / edge counts, filt_count totals and the pass rate of each filter (relative to the one before it),
+	#    seconds per build stage, bytes per structure, and the same counts and edge stage timings per region
+	# -- labeling, nodes and line_merge are shared by all unit radii with the same inflation, so they're the times of the one build
+	#
+	def set_navgraph(self, unit_radius, wkey, pf_edges, region_stats):
+		num_inflate = get_inflate_tiles(unit_radius - UNIT_RADIUS_EPS)
+		(pf_nodes, pf_nodedict, pf_collision, pf_regionmap) = self.navgraph_bases[(num_inflate, wkey)]
+		#
+		pf_collision_scaled = []
+		for rid in range(len(pf_nodes)):
+			pf_collision_scaled.append([])
+			for line in pf_collision[rid]:
+				pf_collision_scaled[-1].append(((line[0][0]*GRID_SIZE, line[0][1]*GRID_SIZE),
+				                                (line[1][0]*GRID_SIZE, line[1][1]*GRID_SIZE)))
+		#
+		self.navgraphs[(unit_radius, wkey)] = (get_scaled_nodes(pf_nodes), pf_edges, pf_collision_scaled, pf_regionmap)
+		#
+		filt_total = [sum([n[0][i] for n in region_stats]) for i in range(len(FILT_NAMES))]
+		stage_time = {k: v for (k,v) in self.base_times[(num_inflate, wkey)].items()}
+		for k in BUILD_STAGES[3:]:
+			stage_time[k] = sum([n[1][k] for n in region_stats])
+		self.build_stats[(unit_radius, wkey)] = {
+			'unit_radius': unit_radius,
+			'wall_state':  list(wkey),
+			'num_regions': len(pf_nodes),
+			'num_nodes':   sum([len(n) for n in pf_nodes]),
+			'num_edges':   filt_total[4],
+			'filt_count':  {FILT_NAMES[i]: filt_total[i] for i in range(len(FILT_NAMES))},
+			'pass_rates':  {FILT_NAMES[i]: filt_total[i]/max(1, filt_total[max(0, i-1)]) for i in range(len(FILT_NAMES))},
+			'time':        stage_time,
+			'memory':      {'wall_map':  self.all_wall_maps[wkey].nbytes,
+			                'regionmap': pf_regionmap.nbytes,
+			                'nodes':     get_deep_size(pf_nodes),
+			                'node_dict': get_deep_size(pf_nodedict),
+			                'edges':     get_deep_size(pf_edges),
+			                'collision': get_deep_size(pf_collision_scaled)},
+			'regions':     [{'region':     rid,
+			                 'num_nodes':  len(pf_nodes[rid]),
+			                 'filt_count': {FILT_NAMES[i]: region_stats[rid][0][i] for i in range(len(FILT_NAMES))},
+			                 'time':       region_stats[rid][1]} for rid in range(len(pf_nodes))]}
+
+	#
+	# build the navgraphs for every wall state, in a process pool if we were given more than one worker
+	# -- first pass labels each wall state's (inflated) map, second pass builds edges for batches of regions.
+	#    results are plain tuples / dicts / int arrays so they're cheap to send back to the parent.
+	# -- if the pool can't be started (or dies) we fall back to building everything sequentially
+	#
+	def build_all_navgraphs(self, unit_radius, num_workers=1):
+		if num_workers <= 0:
+			num_workers = os.cpu_count() or 1
+		wkeys = [wkey for wkey in self.all_wall_maps.keys() if (unit_radius, wkey) not in self.navgraphs]
+		if num_workers > 1 and len(wkeys):
+			try:
+				self.build_navgraphs_parallel(unit_radius, wkeys, num_workers)
+			except (OSError, BrokenProcessPool) as e:
+				print('Warning: parallel navgraph build failed, building sequentially instead:', e)
+		for wkey in wkeys:
+			if (unit_radius, wkey) not in self.navgraphs:
+				self.build_navgraph(unit_radius, wkey)
+
+	def build_navgraphs_parallel(self, unit_radius, wkeys, num_workers):
+		los_width   = unit_radius - UNIT_RADIUS_EPS
+		num_inflate = get_inflate_tiles(los_width)
+		# spawn rather than fork, the parent may already have SDL threads running
+		mp_context  = multiprocessing.get_context('spawn')
+		with ProcessPoolExecutor(max_workers=num_workers, mp_context=mp_context) as executor:
+			base_futures = {}
+			for wkey in wkeys:
+				if (num_inflate, wkey) not in self.navgraph_bases:
+					inflated_map = inflate_wall_map(self.all_wall_maps[wkey], num_inflate)
+					base_futures[wkey] = executor.submit(get_timed_pathfinding_data, inflated_map)
+			for (wkey, future) in base_futures.items():
+				(self.navgraph_bases[(num_inflate, wkey)], self.base_times[(num_inflate, wkey)]) = future.result()
+			#
+			# split regions into batches of roughly equal cost (edge candidates are quadratic in the node count)
+			#
+			region_costs = {wkey: [len(n)**2 for n in self.navgraph_bases[(num_inflate, wkey)][0]] for wkey in wkeys}
+			target_cost  = max(1, sum([sum(n) for n in region_costs.values()]) // (num_workers*BATCHES_PER_WORKER))
+			edge_futures = []
+			for wkey in wkeys:
+				(pf_nodes, pf_nodedict, pf_collision, pf_regionmap) = self.navgraph_bases[(num_inflate, wkey)]
+				batch      = []
+				batch_cost = 0
+				for rid in range(len(pf_nodes)):
+					batch.append((pf_nodes[rid], pf_nodedict[rid]))
+					batch_cost += region_costs[wkey][rid]
+					if batch_cost >= target_cost or rid == len(pf_nodes)-1:
+						edge_futures.append((wkey, executor.submit(get_region_edges_batch, batch, self.all_wall_maps[wkey], los_width)))
+						batch      = []
+						batch_cost = 0
+			#
+			pf_edges     = {wkey: [] for wkey in wkeys}
+			region_stats = {wkey: [] for wkey in wkeys}
+			for (wkey, future) in edge_futures:
+				for (region_edges, filt_count, stage_times) in future.result():
+					pf_edges[wkey].append(region_edges)
+					region_stats[wkey].append((filt_count, stage_times))
+			for wkey in wkeys:
+				self.set_navgraph(unit_radius, wkey, pf_edges[wkey], region_stats[wkey])
+
+	#
+	# returns (wall_map, nodes, edges, collision, regionmap) for the current wall state
+	#
+	def get_navgraph(self, unit_radius):
+		if (unit_radius, self.current_wall_state) not in self.navgraphs:
+			self.build_navgraph(unit_radius, self.current_wall_state)
+		(nodes, edges, collision, regionmap) = self.navgraphs[(unit_radius, self.current_wall_state)]
+		return (self.wall_map, nodes, edges, collision, regionmap)
+
+	#
+	# returns (wall_map, rects, rect_map, portals, regionmap) for the current wall state
+	# -- the navmesh only depends on the inflated map, so it's shared per inflation level like the labeling
+	#
+	def get_navmesh(self, unit_radius):
+		num_inflate  = get_inflate_tiles(unit_radius - UNIT_RADIUS_EPS)
+		wkey         = self.current_wall_state
+		pf_regionmap = self.get_navgraph_base(num_inflate, wkey)[3]
+		if (num_inflate, wkey) not in self.navmeshes:
+			self.navmeshes[(num_inflate, wkey)] = build_navmesh(pf_regionmap)
+		(rects, rect_map, portals) = self.navmeshes[(num_inflate, wkey)]
+		return (self.wall_map, rects, rect_map, portals, pf_regionmap)
+
+	def change_wall_state(self, obnum, statenum):
+		self.current_wall_state = [n for n in self.current_wall_state]
+		self.current_wall_state[obnum] = statenum
+		self.current_wall_state = tuple(self.current_wall_state)
+		#
+		self.wall_map = self.all_wall_maps[self.current_wall_state]
+		(self.nodes, self.edges, self.collision, self.regionmap) = self.navgraphs[(self.unit_radius, self.current_wall_state)]
@@ -0,0 +1,178 @@
+import argparse
+import json
+import numpy as np
+import random
+
+from source.globals import GRID_SIZE, WALL_UNITS
+
+#
+# synthetic maps for stress and scaling tests, written in the same json schema the editor saves
+# -- python -m source.mapgen maze --size 256 256 --obstacles 2 --locs 6 --states 4 --out maps/gen_maze.json
+# -- tile arrays are indexed [x,y] like MapData.wall_map, tile_dat is stored row-major ([y][x]) like the editor writes it
+#
+
+MAP_TYPES  = ['pillars', 'maze', 'corridors']
+TILE_FLOOR = 2
+TILE_WALL  = 3
+LOC_TILES  = 2
+EXP_DELAY  = 10
+
+#
+# square-ish arena with random single-tile pillars
+#
+def gen_pillar_tiles(map_width, map_height, rng, pillar_density=0.02):
+	tiles = np.full((map_width, map_height), TILE_FLOOR, dtype='int')
+	for y in range(2, map_height-2):
+		for x in range(2, map_width-2):
+			if rng.random() < pillar_density:
+				tiles[x,y] = TILE_WALL
+	return tiles
+
+#
+# perfect maze (iterative backtracker) on a grid of cells corridor_width tiles wide, with 1-tile walls
+#
+def gen_maze_tiles(map_width, map_height, rng, corridor_width=1):
+	tiles = np.full((map_width, map_height), TILE_WALL, dtype='int')
+	pitch = corridor_width + 1
+	(cells_x, cells_y) = ((map_width-1)//pitch, (map_height-1)//pitch)
+	if cells_x < 1 or cells_y < 1:
+		return tiles
+	visited = np.zeros((cells_x, cells_y), dtype='bool')
+	stack   = [(0,0)]
+	visited[0,0] = True
+	tiles[1:1+corridor_width,1:1+corridor_width] = TILE_FLOOR
+	while stack:
+		(cx, cy) = stack[-1]
+		neighbors = [(cx+dx, cy+dy) for (dx,dy) in [(1,0), (-1,0), (0,1), (0,-1)] if 0 <= cx+dx < cells_x and 0 <= cy+dy < cells_y and not visited[cx+dx,cy+dy]]
+		if not neighbors:
+			stack.pop()
+			continue
+		(nx, ny) = rng.choice(neighbors)
+		visited[nx,ny] = True
+		# carve the next cell and the wall between the two
+		(x0, y0) = (1 + min(cx,nx)*pitch, 1 + min(cy,ny)*pitch)
+		(x1, y1) = (1 + max(cx,nx)*pitch + corridor_width, 1 + max(cy,ny)*pitch + corridor_width)
+		tiles[x0:x1,y0:y1] = TILE_FLOOR
+		stack.append((nx, ny))
+	return tiles
+
+#
+# one long serpentine corridor: horizontal runs joined at alternating ends
+#
+def gen_corridor_tiles(map_width, map_height, rng, corridor_width=2):
+	tiles = np.full((map_width, map_height), TILE_WALL, dtype='int')
+	pitch = corridor_width + 1
+	num_runs = (map_height-1)//pitch
+	for i in range(num_runs):
+		y0 = 1 + i*pitch
+		tiles[1:map_width-1,y0:y0+corridor_width] = TILE_FLOOR
+		if i < num_runs-1:
+			x0 = map_width-1-corridor_width if i%2 == 0 else 1
+			tiles[x0:x0+corridor_width,y0:y0+pitch+corridor_width] = TILE_FLOOR
+	return tiles
+
+#
+# obstacles with num_locs locations on open floor and num_states distinct wall states each (including all-clear)
+# -- locs never cover the player start, so it stays valid in every wall state
+#
+def gen_obstacles(tiles, rng, num_obstacles, num_locs, num_states, start_tile):
+	floor_tiles    = [(x,y) for (x,y) in zip(*(tiles[:-LOC_TILES,:-LOC_TILES] == TILE_FLOOR).nonzero()) if (x,y) != start_tile]
+	loc_candidates = [(x,y) for (x,y) in floor_tiles if not (0 <= start_tile[0]-x < LOC_TILES and 0 <= start_tile[1]-y < LOC_TILES)]
+	if not loc_candidates:
+		return {}
+	def get_box(x, y, w, h):
+		return [int(x*GRID_SIZE), int(y*GRID_SIZE), int((x+w)*GRID_SIZE), int((y+h)*GRID_SIZE)]
+	#
+	obstacles = {}
+	for obnum in range(num_obstacles):
+		ob_dat = {}
+		(sx, sy) = rng.choice(floor_tiles)
+		(ex, ey) = rng.choice(floor_tiles)
+		ob_dat['startbox'] = get_box(sx, sy, 1, 1)
+		ob_dat['endbox']   = get_box(ex, ey, 1, 1)
+		ob_dat['revive']   = [int(sx*GRID_SIZE + GRID_SIZE//2), int(sy*GRID_SIZE + GRID_SIZE//2)]
+		ob_dat['actions']  = [['move_player', 0], ['add_lives', 0], ['change_music', '']]
+		for i in range(num_locs):
+			(lx, ly) = rng.choice(loc_candidates)
+			ob_dat['loc_' + str(i+1)] = get_box(lx, ly, LOC_TILES, LOC_TILES)
+		#
+		wall_subsets = set()
+		max_states   = min(num_states, 2**num_locs)
+		while len(wall_subsets) < max_states - 1:
+			my_subset = tuple([i for i in range(num_locs) if rng.random() < 0.5])
+			if my_subset:
+				wall_subsets.add(my_subset)
+		for (i, my_subset) in enumerate(sorted(wall_subsets)):
+			exp_locs  = [str(n+1) for n in range(num_locs)]
+			exp_units = [WALL_UNITS[0] if n in my_subset else 'overlord' for n in range(num_locs)]
+			ob_dat['exp_' + str(i+1)] = [exp_locs, exp_units, EXP_DELAY]
+		obstacles['obstacle_' + str(obnum+1)] = ob_dat
+	return obstacles
+
+#
+# obstacle defaults match the command line, an obstacle with no locations could only ever be all-clear
+#
+def gen_map(map_type, map_width, map_height, seed=0, pillar_density=0.02, corridor_width=None, num_obstacles=0, num_locs=4, num_states=2):
+	if num_obstacles > 0 and num_locs <= 0:
+		print('Error: obstacles need at least one location')
+		exit(1)
+	rng = random.Random(seed)
+	if map_type == 'pillars':
+		tiles = gen_pillar_tiles(map_width, map_height, rng, pillar_density)
+	elif map_type == 'maze':
+		tiles = gen_maze_tiles(map_width, map_height, rng, corridor_width or 1)
+	elif map_type == 'corridors':
+		tiles = gen_corridor_tiles(map_width, map_height, rng, corridor_width or 2)
+	else:
+		print('Error: unknown map type:', map_type)
+		exit(1)
+	# MapData walls off the border anyway, mirror that so the tiles match what the game sees
+	tiles[0,:]  = TILE_WALL
+	tiles[-1,:] = TILE_WALL
+	tiles[:,0]  = TILE_WALL
+	tiles[:,-1] = TILE_WALL
+	tiles[1,1]  = TILE_FLOOR
+	#
+	json_dat = {'map_name':   map_type + '_' + str(map_width) + 'x' + str(map_height),
+	            'map_author': 'mapgen',
+	            'map_notes':  'seed ' + str(seed),
+	            'difficulty': 0,
+	            'map_width':  map_width,
+	            'map_height': map_height,
+	            'init_lives': 1,
+	            'start_pos':  [GRID_SIZE + GRID_SIZE//2, GRID_SIZE + GRID_SIZE//2],
+	            'tile_dat':   tiles.T.tolist()}
+	json_dat.update(gen_obstacles(tiles, rng, num_obstacles, num_locs, num_states, (1,1)))
+	return json_dat
+
+def write_generated_map(out_fn, map_type, map_width, map_height, **kwargs):
+	with open(out_fn, 'w') as f:
+		json.dump(gen_map(map_type, map_width, map_height, **kwargs), f)
+
+def main(raw_args=None):
+	parser = argparse.ArgumentParser(description='synthetic map generator', formatter_class=argparse.ArgumentDefaultsHelpFormatter,)
+	parser.add_argument('type',        type=str, choices=MAP_TYPES,            help="map layout")
+	parser.add_argument('--size',      type=int, nargs=2, default=[64, 64],    help="map width and height (in tiles)", metavar=('W', 'H'))
+	parser.add_argument('--seed',      type=int,   default=0,                  help="rng seed")
+	parser.add_argument('--density',   type=float, default=0.02,               help="pillar density (pillars)")
+	parser.add_argument('--width',     type=int,   default=0,                  help="corridor width in tiles (maze, corridors), 0 = type default")
+	parser.add_argument('--obstacles', type=int,   default=0,                  help="number of obstacles")
+	parser.add_argument('--locs',      type=int,   default=4,                  help="locations per obstacle")
+	parser.add_argument('--states',    type=int,   default=2,                  help="wall states per obstacle (including all-clear)")
+	parser.add_argument('--out',       type=str,   required=True,              help="map json output")
+	args = parser.parse_args(raw_args)
+	#
+	if args.size[0] < 4 or args.size[1] < 4:
+		print('Error: map size must be at least 4x4')
+		exit(1)
+	write_generated_map(args.out, args.type, args.size[0], args.size[1],
+	                    seed=args.seed,
+	                    pillar_density=args.density,
+	                    corridor_width=args.width,
+	                    num_obstacles=args.obstacles,
+	                    num_locs=args.locs,
+	                    num_states=args.states)
+	print('wrote', args.out)
+
+if __name__ == '__main__':
+	main()
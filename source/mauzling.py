@@ -5,9 +5,12 @@ import pygame
 from collections import deque
 from pygame.math import Vector2
 
+from source.atlas       import TextureAtlas
 from source.geometry    import angle_clamp, boxes_overlap, point_in_box, SMALL_NUMBER
+from source.dstarlite   import DStarLite
 from source.misc_gfx    import clip, Color
-from source.pathfinding import pathfind
+from source.navmesh     import navmesh_pathfind
+from source.pathfinding import edge_is_traversable, pathfind, UNIT_RADIUS_EPS
 from source.globals     import GRID_SIZE, PLAYER_RADIUS, SWAP_COLORS
 
 #
@@ -67,7 +70,7 @@ def get_sprite_column(angle):
 #
 #
 class Mauzling:
-    def __init__(self, pos, angle, image_filename, spritesheet_filename, swap_colors=None):
+    def __init__(self, pos, angle, image_filename, spritesheet_filename, swap_colors=None, incremental_replan=False, use_navmesh=False):
         self.position    = pos
         self.angle       = angle_clamp(angle)
         self.radius      = PLAYER_RADIUS
@@ -78,6 +81,8 @@ class Mauzling:
         self.iscript_ind = 0
         self.inc_orders  = []           # orders we're waiting to accept (click delay)
         self.order_queue = deque([])    # orders we have accepted
+        self.incremental_replan = incremental_replan    # keep a D* Lite search per order and repair it when walls change
+        self.use_navmesh        = use_navmesh           # pathfind over the rectangle navmesh instead of the visibility graph
         self.img         = pygame.image.load(image_filename).convert_alpha()
         self.num_lives   = 0
         #
@@ -103,6 +108,17 @@ class Mauzling:
                 self.separated_sprites[-1].append(pygame.Surface(rect.size, flags=pygame.SRCALPHA).convert_alpha())
                 self.separated_sprites[-1][-1].blit(base_img, (0,0), rect)
                 self.separated_sprites_flipped[-1].append(pygame.transform.flip(self.separated_sprites[-1][-1], True, False))
+        #
+        # both sprite sets go into one atlas, draw() blits from it
+        #
+        atlas = TextureAtlas(has_alpha=True)
+        atlas_entries         = [[atlas.add(n) for n in col] for col in self.separated_sprites]
+        atlas_entries_flipped = [[atlas.add(n) for n in col] for col in self.separated_sprites_flipped]
+        atlas.build()
+        self.separated_sprites         = [[atlas.get_surface(n) for n in col] for col in atlas_entries]
+        self.separated_sprites_flipped = [[atlas.get_surface(n) for n in col] for col in atlas_entries_flipped]
+        self.sprite_areas         = [[atlas.get_area(n) for n in col] for col in atlas_entries]
+        self.sprite_areas_flipped = [[atlas.get_area(n) for n in col] for col in atlas_entries_flipped]
     
     #
     #
@@ -112,7 +128,7 @@ class Mauzling:
             if self.is_selected:
                 el_tl = Vector2(self.bbox[0].x - 2 + offset.x, self.bbox[0].y + offset.y + 10)
                 ellipse_bounds = [el_tl.x, el_tl.y, 2*PLAYER_RADIUS + 5, 13]
-                pygame.draw.ellipse(screen, Color.SEL_ELLIPSE, ellipse_bounds, width=1)
+                screen.draw_ellipse(Color.SEL_ELLIPSE, ellipse_bounds, width=1)
             #rotated_image = pygame.transform.rotate(self.img, self.angle)
             my_sprite_inds = get_sprite_column(self.angle)
             if self.state in [PlayerState.IDLE, PlayerState.DELAY, PlayerState.DELAY_Q]:
@@ -121,18 +137,19 @@ class Mauzling:
                 # need to decrement by one to get current animation frame because tick() already incremented it
                 my_iscript_ind = (self.iscript_ind + len(MOVE_CYCLE) - 1)%len(MOVE_CYCLE)
             if my_sprite_inds[1]:
-                rotated_image = self.separated_sprites_flipped[my_sprite_inds[0]][my_iscript_ind]
+                (atlas_page, area) = self.sprite_areas_flipped[my_sprite_inds[0]][my_iscript_ind]
             else:
-                rotated_image = self.separated_sprites[my_sprite_inds[0]][my_iscript_ind]
-            new_rect = rotated_image.get_rect(center=self.img.get_rect(center=self.position+SPRITE_OFFSET[my_iscript_ind]+offset).center)
-            screen.blit(rotated_image, new_rect)
+                (atlas_page, area) = self.sprite_areas[my_sprite_inds[0]][my_iscript_ind]
+            new_rect = pygame.Rect((0,0), area.size)
+            new_rect.center = self.img.get_rect(center=self.position+SPRITE_OFFSET[my_iscript_ind]+offset).center
+            screen.blit(atlas_page, new_rect, area)
             if draw_bounding_box:
                 edges_to_draw = [(Vector2(self.bbox[0].x, self.bbox[0].y), Vector2(self.bbox[1].x, self.bbox[0].y)),
                                  (Vector2(self.bbox[1].x, self.bbox[0].y), Vector2(self.bbox[1].x, self.bbox[1].y)),
                                  (Vector2(self.bbox[1].x, self.bbox[1].y), Vector2(self.bbox[0].x, self.bbox[1].y)),
                                  (Vector2(self.bbox[0].x, self.bbox[1].y), Vector2(self.bbox[0].x, self.bbox[0].y))]
                 for edge in edges_to_draw:
-                    pygame.draw.line(screen, Color.HITBOX, edge[0]+offset, edge[1]+offset, width=1)
+                    screen.draw_line(Color.HITBOX, edge[0]+offset, edge[1]+offset, width=1)
     
     #
     #
@@ -324,15 +341,20 @@ class Mauzling:
             if self.inc_orders[i][1] <= 0:
                 if v[2] == OrderType.QUEUE and self.order_queue:
                     # for shift-clicks delay will be QUEUE_DELAY, for subpaths of a larger path it will be 0
-                    order_dat = [v[0], QUEUE_DELAY, True, None]
+                    order_dat = [v[0], QUEUE_DELAY, True, None, None]
                     self.order_queue.append(order_dat)
                 else:
                     # for new moves accept_delay = 0
-                    order_dat = [v[0], 0, True, None]
+                    order_dat = [v[0], 0, True, None, None]
                     self.order_queue = deque([order_dat])
         self.inc_orders = [n for n in self.inc_orders if n[1] > 0]
         #
-        # act out our current order if we have one. order = (goal_pos, accept_delay, request_new_path, clicked_pos)
+        # walls changed underneath the path we're following? repair it before acting on it
+        #
+        if self.order_queue and self.order_queue[0][4] != None and self.order_queue[0][4].map_dat is not world_object.wall_map:
+            self.repair_path(world_object)
+        #
+        # act out our current order if we have one. order = (goal_pos, accept_delay, request_new_path, clicked_pos, replanner)
         #
         if self.order_queue:
             #
@@ -345,18 +367,27 @@ class Mauzling:
                 if self.order_queue[0][2]:
                     pathfind_success = False
                     clicked_pos = self.order_queue[0][0]
-                    waypoints = pathfind(world_object, self.position, clicked_pos)
+                    if self.use_navmesh:
+                        waypoints = navmesh_pathfind(world_object, self.position, clicked_pos, self.radius)
+                    else:
+                        waypoints = pathfind(world_object, self.position, clicked_pos, self.radius)
+                    waypoints = [Vector2(n[0], n[1]) for n in waypoints]
                     if waypoints:
                         dist_togo = (waypoints[0] - self.position).length()
                         # we're already at the destination? then lets just turn if we need to
                         if dist_togo < SMALL_NUMBER:
                             self.turn_angles = self.get_turn_angles(self.position, self.angle, self.order_queue[0][0])
-                            self.order_queue[0] = [self.position, -2, False, None]
+                            self.order_queue[0] = [self.position, -2, False, None, None]
                         # otherwise assign all the subpaths as new move orders
                         else:
+                            replanner = None
+                            if self.incremental_replan:
+                                (map_dat, pf_nodes, pf_edges, pf_collision, pf_regionmap) = world_object.get_navgraph(self.radius)
+                                replanner = DStarLite(map_dat, pf_regionmap, self.position, waypoints[0], self.radius - UNIT_RADIUS_EPS)
+                                replanner.compute_shortest_path()
                             self.order_queue.popleft()
                             for n in waypoints[:-1]:
-                                self.order_queue.appendleft([n, 0, False, clicked_pos])
+                                self.order_queue.appendleft([n, 0, False, clicked_pos, replanner])
                             self.order_queue[0][1] = -1     # so we process the first subpath immediately
                         pathfind_success = True
                 # abandon this order if no path was returned
@@ -392,6 +423,40 @@ class Mauzling:
                         self.update_position(new_position, self.angle)
                         self.increment_iscript()
 
+    #
+    # the wall state changed while we were following a path: push the changed tiles into the D* Lite search,
+    # keep the remaining waypoints if they are still walkable, otherwise swap in the repaired path
+    #
+    def repair_path(self, world_object):
+        replanner   = self.order_queue[0][4]
+        clicked_pos = self.order_queue[0][3]
+        (map_dat, pf_nodes, pf_edges, pf_collision, pf_regionmap) = world_object.get_navgraph(self.radius)
+        replanner.update_map(map_dat, pf_regionmap, self.position)
+        num_planned = 0
+        while num_planned < len(self.order_queue) and self.order_queue[num_planned][4] is replanner:
+            num_planned += 1
+        remaining = [self.position] + [self.order_queue[n][0] for n in range(num_planned)]
+        still_valid = True
+        for i in range(len(remaining)-1):
+            if not edge_is_traversable([remaining[i], remaining[i+1]], map_dat, replanner.unit_radius):
+                still_valid = False
+                break
+        if still_valid:
+            return
+        waypoints = [Vector2(n[0], n[1]) for n in replanner.get_waypoints()]
+        for i in range(num_planned):
+            self.order_queue.popleft()
+        if not waypoints:
+            self.state = PlayerState.ARRIVED
+            return
+        if len(waypoints) < 2:
+            return
+        for n in waypoints[:-1]:
+            self.order_queue.appendleft([n, 0, False, clicked_pos, replanner])
+        # process the first repaired subpath immediately, the accept countdown runs after us so turn now
+        self.order_queue[0][1] = -1
+        self.turn_angles = self.get_turn_angles(self.position, self.angle, self.order_queue[0][0], clickpos=clicked_pos)
+
     #
     # returns True if cursor click animation should be drawn
     #
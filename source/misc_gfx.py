@@ -9,6 +9,9 @@ OB_REVIVE_RADIUS = 3	# width of revive spot (for drawing)
 # -- gamestate changes occur on the first instance of 255
 FADE_SEQUENCE = [50, 100, 150, 200, 250, 255, 250, 150, 100, 50]
 
+# how the game screen gets stretched onto the window, see upscale_to_display()
+SCALE_MODES = ['nearest', 'scale2x', 'smooth']
+
 class Color:
 	BACKGROUND  = (  0,   0,   0)	#
 	INFO_TEXT   = (255, 255, 255)	# fps indicators, mouse positioning, etc
@@ -52,30 +55,69 @@ def clip(surf, x, y, x_size, y_size):
 	image = surf.subsurface(handle_surf.get_clip())
 	return image.copy()
 
-def draw_grid(screen, screensize, gridsize, offset, color):
-	for x in range(0, int(screensize.x)+2, gridsize):
-		p1 = Vector2(x, -gridsize)
-		p2 = Vector2(x, screensize.y + gridsize)
-		pygame.draw.line(screen, color, p1+offset, p2+offset, width=1)
-	for y in range(0, int(screensize.y)+2, gridsize):
-		p1 = Vector2(-gridsize, y)
-		p2 = Vector2(screensize.x + gridsize, y)
-		pygame.draw.line(screen, color, p1+offset, p2+offset, width=1)
+#
+# minor + major background grid rendered once into a surface one major cell bigger than the screen each way,
+# so any offset (mod the major spacing) covers the screen with a single blit, it's only redrawn if the screen size changes
+#
+class GridPattern:
+	def __init__(self, gridsize, minor_color, major_color, background_color=Color.BACKGROUND):
+		self.gridsize         = gridsize
+		self.minor_color      = minor_color
+		self.major_color      = major_color
+		self.background_color = background_color
+		self.surface          = None
+
+	def get_surface(self, screensize):
+		major_size   = 2*self.gridsize
+		pattern_size = (int(screensize[0]) + major_size, int(screensize[1]) + major_size)
+		if self.surface == None or self.surface.get_size() != pattern_size:
+			self.surface = pygame.Surface(pattern_size).convert()
+			self.surface.fill(self.background_color)
+			for (spacing, color) in [(self.gridsize, self.minor_color), (major_size, self.major_color)]:
+				for x in range(0, pattern_size[0], spacing):
+					pygame.draw.line(self.surface, color, (x, 0), (x, pattern_size[1]-1), width=1)
+				for y in range(0, pattern_size[1], spacing):
+					pygame.draw.line(self.surface, color, (0, y), (pattern_size[0]-1, y), width=1)
+		return self.surface
+
+	#
+	# offset = grid offset in [0, 2*gridsize)
+	#
+	def draw(self, screen, offset):
+		major_size = 2*self.gridsize
+		screen.blit(self.get_surface(screen.get_size()), (int(offset.x) % major_size - major_size, int(offset.y) % major_size - major_size))
 
 def draw_selection_box(screen, box, offset, color):
 	if box != None:
 		dx = Vector2(box[1].x - box[0].x, 0)
 		dy = Vector2(0, box[1].y - box[0].y)
 		v  = box[0]
-		pygame.draw.line(screen, color,       v+offset,    v+dx+offset, width=1)
-		pygame.draw.line(screen, color,    v+dx+offset, v+dx+dy+offset, width=1)
-		pygame.draw.line(screen, color, v+dx+dy+offset,    v+dy+offset, width=1)
-		pygame.draw.line(screen, color,    v+dy+offset,       v+offset, width=1)
+		screen.draw_line(color,       v+offset,    v+dx+offset, width=1)
+		screen.draw_line(color,    v+dx+offset, v+dx+dy+offset, width=1)
+		screen.draw_line(color, v+dx+dy+offset,    v+dy+offset, width=1)
+		screen.draw_line(color,    v+dy+offset,       v+offset, width=1)
 
 def draw_map_bounds(screen, mapsize, offset, color):
 	dx = Vector2(mapsize.x, 0)
 	dy = Vector2(0, mapsize.y)
-	pygame.draw.line(screen, color,       offset,    dx+offset, width=3)
-	pygame.draw.line(screen, color,    dx+offset, dx+dy+offset, width=3)
-	pygame.draw.line(screen, color, dx+dy+offset,    dy+offset, width=3)
-	pygame.draw.line(screen, color,    dy+offset,       offset, width=3)
+	screen.draw_line(color,       offset,    dx+offset, width=3)
+	screen.draw_line(color,    dx+offset, dx+dy+offset, width=3)
+	screen.draw_line(color, dx+dy+offset,    dy+offset, width=3)
+	screen.draw_line(color,    dy+offset,       offset, width=3)
+
+#
+# stretch the game screen onto the display surface, writing straight into it (no per-frame allocations)
+# -- scale2x only does exactly 2x, if the display is some other size it goes through a preallocated 2x buffer first
+# -- the screen has to be made in the display's format for the destination-surface versions of these to work
+#
+def upscale_to_display(screen, display_surface, scale_mode='nearest', scale2x_buffer=None):
+	display_size = display_surface.get_size()
+	if scale_mode == 'nearest':
+		pygame.transform.scale(screen, display_size, display_surface)
+	elif scale_mode == 'smooth':
+		pygame.transform.smoothscale(screen, display_size, display_surface)
+	elif scale2x_buffer == None:
+		pygame.transform.scale2x(screen, display_surface)
+	else:
+		pygame.transform.scale2x(screen, scale2x_buffer)
+		pygame.transform.scale(scale2x_buffer, display_size, display_surface)
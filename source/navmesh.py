@@ -0,0 +1,314 @@
+import heapq
+import numpy as np
+
+from source.globals     import GRID_SIZE
+from source.pathfinding import edge_is_traversable, get_distance, get_pathfinding_endpoints, UNIT_RADIUS_EPS
+
+#
+# rectangle-decomposition navmesh, an alternative to the corner-node visibility graph
+# -- each region of the (radius-inflated) map is greedily covered by maximal rectangles of open tiles,
+#    scanning columns left to right and growing each rectangle down then right. every tile is visited a
+#    bounded number of times so the build is roughly linear in the number of tiles.
+# -- a unit can stand anywhere in the box spanned by the tile centers of a rectangle, and anywhere in the
+#    strip between two neighbouring rectangles' boxes, so each shared border yields two portals: the edge of
+#    our box and the edge of theirs. paths are A* over rectangles followed by a funnel pass over the portals.
+#
+
+#
+# returns (rects, rect_map, portals)
+# -- rects[i]    = (x0, y0, x1, y1, region_id) in tiles, x1/y1 exclusive
+# -- rect_map    = tile --> rect index (-1 for closed tiles)
+# -- portals[i]  = [(j, seg_on_i, seg_on_j), ...] where the segments are ((x, y), (x, y)) in pixels
+#
+def build_navmesh(pf_regionmap):
+	(map_w, map_h) = pf_regionmap.shape
+	rect_map = -np.ones((map_w, map_h), dtype='int32')
+	rects    = []
+	for x in range(map_w):
+		for y in range(map_h):
+			rid = pf_regionmap[x,y]
+			if rid < 0 or rect_map[x,y] >= 0:
+				continue
+			y1 = y + 1
+			while y1 < map_h and pf_regionmap[x,y1] == rid and rect_map[x,y1] < 0:
+				y1 += 1
+			x1 = x + 1
+			while x1 < map_w and np.all(pf_regionmap[x1,y:y1] == rid) and np.all(rect_map[x1,y:y1] < 0):
+				x1 += 1
+			rect_map[x:x1,y:y1] = len(rects)
+			rects.append((x, y, x1, y1, int(rid)))
+	#
+	portals = [[] for n in rects]
+	for (i, (x0, y0, x1, y1, rid)) in enumerate(rects):
+		# neighbours to our right
+		if x1 < map_w:
+			for (j, ya, yb) in get_border_runs([rect_map[x1,y] for y in range(y0,y1)], y0):
+				seg_i = (tile_center(x1-1, ya), tile_center(x1-1, yb-1))
+				seg_j = (tile_center(x1,   ya), tile_center(x1,   yb-1))
+				portals[i].append((j, seg_i, seg_j))
+				portals[j].append((i, seg_j, seg_i))
+		# neighbours below us
+		if y1 < map_h:
+			for (j, xa, xb) in get_border_runs([rect_map[x,y1] for x in range(x0,x1)], x0):
+				seg_i = (tile_center(xa, y1-1), tile_center(xb-1, y1-1))
+				seg_j = (tile_center(xa, y1),   tile_center(xb-1, y1))
+				portals[i].append((j, seg_i, seg_j))
+				portals[j].append((i, seg_j, seg_i))
+	return (rects, rect_map, portals)
+
+def tile_center(x, y):
+	return (x*GRID_SIZE + GRID_SIZE/2, y*GRID_SIZE + GRID_SIZE/2)
+
+#
+# nearest point to pos in the box spanned by a rect's tile centers
+#
+def clamp_to_rect(pos, rect):
+	(top_left, bottom_right) = (tile_center(rect[0], rect[1]), tile_center(rect[2]-1, rect[3]-1))
+	return (min(max(pos[0], top_left[0]), bottom_right[0]), min(max(pos[1], top_left[1]), bottom_right[1]))
+
+#
+# split a row of rect indices along a border into runs of (rect_index, start, end)
+#
+def get_border_runs(border, offset):
+	runs = []
+	for (k, j) in enumerate(border):
+		if j < 0:
+			continue
+		if runs and runs[-1][0] == j and runs[-1][2] == offset + k:
+			runs[-1][2] += 1
+		else:
+			runs.append([int(j), offset + k, offset + k + 1])
+	return [tuple(n) for n in runs]
+
+#
+# find the rect we're in, or the nearest one in our region if our tile is closed in the inflated map
+#
+def get_rect_at(pos, rect_map, pf_regionmap, region):
+	(x, y) = (int(pos[0] / GRID_SIZE), int(pos[1] / GRID_SIZE))
+	candidates = []
+	for (tx,ty) in [(x+dx, y+dy) for dx in [-1,0,1] for dy in [-1,0,1]]:
+		if tx >= 0 and ty >= 0 and tx < rect_map.shape[0] and ty < rect_map.shape[1] and pf_regionmap[tx,ty] == region:
+			candidates.append((get_distance(pos, tile_center(tx,ty)), int(rect_map[tx,ty])))
+	if not candidates:
+		return None
+	return sorted(candidates)[0][1]
+
+#
+# twice the signed area of triangle abc
+#
+def triarea2(a, b, c):
+	return (c[0] - a[0])*(b[1] - a[1]) - (b[0] - a[0])*(c[1] - a[1])
+
+def get_midpoint(seg):
+	return ((seg[0][0] + seg[1][0])/2, (seg[0][1] + seg[1][1])/2)
+
+#
+# simple stupid funnel algorithm (Mononen), portals are (left, right) pairs
+#
+def string_pull(portals):
+	apex  = portals[0][0]
+	left  = portals[0][0]
+	right = portals[0][1]
+	(apex_i, left_i, right_i) = (0, 0, 0)
+	points = [apex]
+	i = 1
+	while i < len(portals):
+		(p_left, p_right) = portals[i]
+		# try to narrow the funnel from the right
+		if triarea2(apex, right, p_right) <= 0:
+			if apex == right or triarea2(apex, left, p_right) > 0:
+				right   = p_right
+				right_i = i
+			else:
+				# right crossed over left, so left is a corner on our path
+				points.append(left)
+				apex   = left
+				apex_i = left_i
+				(left, right)     = (apex, apex)
+				(left_i, right_i) = (apex_i, apex_i)
+				i = apex_i + 1
+				continue
+		# try to narrow the funnel from the left
+		if triarea2(apex, left, p_left) >= 0:
+			if apex == left or triarea2(apex, right, p_left) < 0:
+				left   = p_left
+				left_i = i
+			else:
+				points.append(right)
+				apex   = right
+				apex_i = right_i
+				(left, right)     = (apex, apex)
+				(left_i, right_i) = (apex_i, apex_i)
+				i = apex_i + 1
+				continue
+		i += 1
+	if points[-1] != portals[-1][0]:
+		points.append(portals[-1][0])
+	return remove_collinear(points)
+
+#
+# runs of 1-tile rects have zero-width portals, and the funnel emits a corner at each one even when they're in a straight line
+# -- drop any point lying on the segment between its neighbours (going back the way we came is still a corner)
+#
+def remove_collinear(points, eps=1e-6):
+	out = points[:1]
+	for p in points[1:]:
+		while len(out) >= 2:
+			(a, b) = (out[-2], out[-1])
+			if abs(triarea2(a, b, p)) <= eps and (b[0] - a[0])*(p[0] - b[0]) + (b[1] - a[1])*(p[1] - b[1]) >= 0:
+				out.pop()
+			else:
+				break
+		out.append(p)
+	return out
+
+#
+# order a portal segment's endpoints as (left, right) for something travelling in direction travel_dir
+#
+def orient_portal(seg, travel_dir):
+	midpoint = get_midpoint(seg)
+	before   = (midpoint[0] - travel_dir[0], midpoint[1] - travel_dir[1])
+	if triarea2(before, seg[0], seg[1]) > 0:
+		return (seg[0], seg[1])
+	return (seg[1], seg[0])
+
+#
+# returns reversed list of (x, y) waypoints (same convention as pathfind)
+#
+def navmesh_pathfind(world_object, starting_pos, ending_pos, unit_radius=None):
+	#
+	if unit_radius == None:
+		unit_radius = world_object.unit_radius
+	(map_dat, rects, rect_map, portals, pf_regionmap) = world_object.get_navmesh(unit_radius)
+	my_unitbuff  = unit_radius - UNIT_RADIUS_EPS
+	starting_pos = (starting_pos[0], starting_pos[1])
+	ending_pos   = (ending_pos[0], ending_pos[1])
+	#
+	endpoints = get_pathfinding_endpoints(map_dat, pf_regionmap, starting_pos, ending_pos, my_unitbuff)
+	if endpoints == None:
+		return []
+	(unit_region, starting_tile, ending_pos) = endpoints
+	#
+	if edge_is_traversable([starting_pos, ending_pos], map_dat, my_unitbuff, stepsize=0.9):
+		return [ending_pos, starting_pos]
+	#
+	start_rect = int(rect_map[starting_tile])
+	goal_rect  = get_rect_at(ending_pos, rect_map, pf_regionmap, unit_region)
+	if goal_rect == None:
+		return []
+	#
+	# astar over rectangles, entering each one at the middle of the portal we came through
+	#
+	entry_pos = {start_rect: starting_pos}
+	g_score   = {start_rect: 0.}
+	came_from = {}
+	queue     = [(get_distance(starting_pos, ending_pos), 0., start_rect)]
+	found     = False
+	while queue:
+		(my_f, my_g, current_rect) = heapq.heappop(queue)
+		if my_g > g_score[current_rect]:
+			continue
+		if current_rect == goal_rect:
+			found = True
+			break
+		for (neighbor, seg_a, seg_b) in portals[current_rect]:
+			(mid_a, mid_b) = (get_midpoint(seg_a), get_midpoint(seg_b))
+			crossing = ((mid_a[0] + mid_b[0])/2, (mid_a[1] + mid_b[1])/2)
+			g = my_g + get_distance(entry_pos[current_rect], crossing)
+			if g < g_score.get(neighbor, float('inf')):
+				g_score[neighbor]   = g
+				entry_pos[neighbor] = crossing
+				came_from[neighbor] = (current_rect, seg_a, seg_b)
+				heapq.heappush(queue, (g + get_distance(crossing, ending_pos), g, neighbor))
+	if not found:
+		return []
+	#
+	crossings = []
+	current_rect = goal_rect
+	while current_rect != start_rect:
+		(prev_rect, seg_a, seg_b) = came_from[current_rect]
+		crossings.append((seg_a, seg_b))
+		current_rect = prev_rect
+	# start / end can be off their tile centers, in which case we go via the nearest point of their rect's box
+	funnel_portals = [(starting_pos, starting_pos)]
+	start_clamped  = clamp_to_rect(starting_pos, rects[start_rect])
+	if start_clamped != starting_pos:
+		funnel_portals.append((start_clamped, start_clamped))
+	for (seg_a, seg_b) in crossings[::-1]:
+		(mid_a, mid_b) = (get_midpoint(seg_a), get_midpoint(seg_b))
+		travel_dir = (mid_b[0] - mid_a[0], mid_b[1] - mid_a[1])
+		funnel_portals.append(orient_portal(seg_a, travel_dir))
+		funnel_portals.append(orient_portal(seg_b, travel_dir))
+	end_clamped = clamp_to_rect(ending_pos, rects[goal_rect])
+	if end_clamped != ending_pos:
+		funnel_portals.append((end_clamped, end_clamped))
+	funnel_portals.append((ending_pos, ending_pos))
+	return string_pull(funnel_portals)[::-1]
+
+#
+# compare build time, size and query time against the visibility graph
+# -- python -m source.navmesh maps/test_wall.json [--radius 8] [--queries 200]
+#
+if __name__ == '__main__':
+	import argparse
+	import pickle
+	import random
+	import time
+	from source.globals     import PLAYER_RADIUS
+	from source.mapdata     import MapData
+	from source.pathfinding import get_inflate_tiles, pathfind, valid_player_pos
+	#
+	parser = argparse.ArgumentParser(description='navmesh vs visibility graph', formatter_class=argparse.ArgumentDefaultsHelpFormatter,)
+	parser.add_argument('maps', nargs='+', help="map json files")
+	parser.add_argument('--radius',  type=int, required=False, default=PLAYER_RADIUS, help="unit radius")
+	parser.add_argument('--queries', type=int, required=False, default=200,           help="random queries per map")
+	parser.add_argument('--seed',    type=int, required=False, default=0,             help="rng seed for query positions")
+	args = parser.parse_args()
+	#
+	my_unitbuff  = args.radius - UNIT_RADIUS_EPS
+	num_inflate  = get_inflate_tiles(my_unitbuff)
+	#
+	for map_fn in args.maps:
+		world_map = MapData(map_fn)
+		wkey      = world_map.current_wall_state
+		#
+		# rebuild from scratch, the navmesh then reuses the region labeling the navgraph just made
+		world_map.navgraph_bases.pop((num_inflate, wkey), None)
+		world_map.navgraphs.pop((args.radius, wkey), None)
+		tt = time.perf_counter()
+		world_map.build_navgraph(args.radius, wkey)
+		vg_build = time.perf_counter() - tt
+		(map_dat, pf_nodes, pf_edges, pf_collision, pf_regionmap) = world_map.get_navgraph(args.radius)
+		tt = time.perf_counter()
+		world_map.navmeshes[(num_inflate, wkey)] = build_navmesh(pf_regionmap)
+		nm_build = time.perf_counter() - tt
+		(map_dat, rects, rect_map, portals, pf_regionmap) = world_map.get_navmesh(args.radius)
+		#
+		vg_count = (sum([len(n) for n in pf_nodes]), sum([len(e) for ed in pf_edges for e in ed.values()])//2)
+		nm_count = (len(rects), sum([len(n) for n in portals])//2)
+		vg_bytes = len(pickle.dumps((pf_nodes, pf_edges)))
+		nm_bytes = len(pickle.dumps((rects, rect_map, portals)))
+		#
+		rng = random.Random(args.seed)
+		(map_w, map_h) = (map_dat.shape[0]*GRID_SIZE, map_dat.shape[1]*GRID_SIZE)
+		queries = []
+		while len(queries) < args.queries:
+			start_pos = (rng.uniform(args.radius, map_w-args.radius-1), rng.uniform(args.radius, map_h-args.radius-1))
+			goal_pos  = (rng.uniform(args.radius, map_w-args.radius-1), rng.uniform(args.radius, map_h-args.radius-1))
+			if valid_player_pos(start_pos, map_dat, my_unitbuff):
+				queries.append((start_pos, goal_pos))
+		(vg_time, nm_time, vg_len, nm_len) = (0., 0., 0., 0.)
+		for (start_pos, goal_pos) in queries:
+			tt = time.perf_counter()
+			vg_path = pathfind(world_map, start_pos, goal_pos, args.radius)
+			vg_time += time.perf_counter() - tt
+			tt = time.perf_counter()
+			nm_path = navmesh_pathfind(world_map, start_pos, goal_pos, args.radius)
+			nm_time += time.perf_counter() - tt
+			vg_len += sum([get_distance(vg_path[i], vg_path[i+1]) for i in range(len(vg_path)-1)])
+			nm_len += sum([get_distance(nm_path[i], nm_path[i+1]) for i in range(len(nm_path)-1)])
+		#
+		print(map_fn, '(radius ' + str(args.radius) + ', ' + str(len(queries)) + ' queries)')
+		print(' -- visibility graph: {:6d} nodes {:7d} edges {:9d} bytes   build {:8.2f} ms   query {:7.3f} ms'.format(vg_count[0], vg_count[1], vg_bytes, 1000*vg_build, 1000*vg_time/len(queries)))
+		print(' -- navmesh:          {:6d} rects {:7d} portals {:7d} bytes   build {:8.2f} ms   query {:7.3f} ms'.format(nm_count[0], nm_count[1], nm_bytes, 1000*nm_build, 1000*nm_time/len(queries)))
+		print(' -- navmesh path length / visibility graph path length: {:.4f}'.format(nm_len / max(vg_len, 1.)))
@@ -21,6 +21,8 @@ class Obstacle:
 		self.is_activated  = False
 		self.was_activated = False
 		self.font_loc      = None	# disabling text drawing for now...
+		self.draw_items    = None	# polygons in map coordinates, built on first draw
+		self.draw_rects    = None	# their bounding boxes, for culling
 
 	def check_for_ob_start(self, player_pos):
 		if not self.was_activated and not self.is_activated:
@@ -40,6 +42,7 @@ class Obstacle:
 
 	def add_location(self, loc_name, tl, br):
 		self.locs[loc_name] = (tl, br)
+		self.draw_items     = None
 
 	def add_event_explode_locs(self, loc_list, unit_list, delay):
 		new_events = []
@@ -156,33 +159,32 @@ class Obstacle:
 		snd_out = list(snd_out.keys())
 		return (gfx_out, snd_out, kill_out, tele_out, wall_out)
 
+	#
+	# everything draw() puts on screen, as ('polygon', color, points) in map coordinates
+	# -- built once (locations don't move after loading), draw() only offsets them and skips the ones off screen
+	#
+	def get_draw_items(self):
+		if self.draw_items == None:
+			def get_box_points(tl, br):
+				return [Vector2(tl), Vector2(br.x, tl.y), Vector2(br), Vector2(tl.x, br.y)]
+			revive_d = Vector2(OB_REVIVE_RADIUS, OB_REVIVE_RADIUS)
+			self.draw_items = [('polygon', Color.LOC_BG, get_box_points(tl, br)) for (tl, br) in self.locs.values()]
+			self.draw_items.append(('polygon', Color.OB_STARTBOX, get_box_points(self.start_box[0], self.start_box[1])))
+			self.draw_items.append(('polygon', Color.OB_ENDBOX,   get_box_points(self.end_box[0], self.end_box[1])))
+			self.draw_items.append(('polygon', Color.OB_REVIVE,   get_box_points(self.revive_coords - revive_d, self.revive_coords + revive_d)))
+			self.draw_rects = [pygame.Rect(points[0], points[2] - points[0] + Vector2(1,1)) for (item_type, color, points) in self.draw_items]
+		return self.draw_items
+
+	def draw_polygons(self, screen, offset, start_ind, end_ind):
+		screen_rect = screen.get_rect()
+		for i in range(start_ind, end_ind):
+			if screen_rect.colliderect(self.draw_rects[i].move(offset)):
+				screen.draw_polygon(self.draw_items[i][1], [n + offset for n in self.draw_items[i][2]])
+
 	def draw(self, screen, offset):
-		start_p  = [self.start_box[0] + offset,
-		            Vector2(self.start_box[1].x, self.start_box[0].y) + offset,
-		            self.start_box[1] + offset,
-		            Vector2(self.start_box[0].x, self.start_box[1].y) + offset]
-		end_p    = [self.end_box[0] + offset,
-		            Vector2(self.end_box[1].x, self.end_box[0].y) + offset,
-		            self.end_box[1] + offset,
-		            Vector2(self.end_box[0].x, self.end_box[1].y) + offset]
-		revive_p = [self.revive_coords + Vector2(-OB_REVIVE_RADIUS,-OB_REVIVE_RADIUS) + offset,
-		            self.revive_coords + Vector2( OB_REVIVE_RADIUS,-OB_REVIVE_RADIUS) + offset,
-		            self.revive_coords + Vector2( OB_REVIVE_RADIUS, OB_REVIVE_RADIUS) + offset,
-		            self.revive_coords + Vector2(-OB_REVIVE_RADIUS, OB_REVIVE_RADIUS) + offset]
-		loc_polygons = []
-		loc_labels   = []
-		for k in self.locs.keys():
-			loc_polygons.append([self.locs[k][0] + offset,
-			                     Vector2(self.locs[k][1].x, self.locs[k][0].y) + offset,
-			                     self.locs[k][1] + offset,
-			                     Vector2(self.locs[k][0].x, self.locs[k][1].y) + offset])
-			loc_labels.append((k, self.locs[k][0] + Vector2(5,5) + offset))
-		#
-		for p in loc_polygons:
-			pygame.draw.polygon(screen, Color.LOC_BG, p)
+		draw_items = self.get_draw_items()
+		self.draw_polygons(screen, offset, 0, len(self.locs))
 		if self.font_loc != None:
-			for text_dat in loc_labels:
-				self.font_loc.render(screen, text_dat[0], text_dat[1], centered=False)
-		pygame.draw.polygon(screen, Color.OB_STARTBOX, start_p)
-		pygame.draw.polygon(screen, Color.OB_ENDBOX, end_p)
-		pygame.draw.polygon(screen, Color.OB_REVIVE, revive_p)
+			for k in self.locs.keys():
+				self.font_loc.render(screen, k, self.locs[k][0] + Vector2(5,5) + offset, centered=False)
+		self.draw_polygons(screen, offset, len(self.locs), len(draw_items))
@@ -0,0 +1,63 @@
+import pygame
+
+from pygame.math import Vector2
+
+from source.globals import TERRAIN_CHUNK_SIZE
+from source.tilemap import get_visible_chunks
+
+#
+# a fixed set of map-space draw calls rendered once into transparent chunks, then only blitted (for chunks on screen)
+# -- items are ('polygon', color, points) or ('line', color, (p0, p1), width), with points in map coordinates
+# -- items are bucketed by every chunk their bounding box touches, a chunk is drawn the first time it comes on screen
+# -- items are drawn in the order given, so later items go on top like they would drawing straight to the screen
+# -- polygon edges on the map border and thick lines spill over a little, so the chunks cover a few pixels past the map
+#
+OVERLAY_MARGIN = 2
+
+class OverlayCache:
+	def __init__(self, items, map_size):
+		self.map_size = (int(map_size[0]) + OVERLAY_MARGIN, int(map_size[1]) + OVERLAY_MARGIN)
+		self.num_cx   = (self.map_size[0] + TERRAIN_CHUNK_SIZE - 1)//TERRAIN_CHUNK_SIZE
+		self.num_cy   = (self.map_size[1] + TERRAIN_CHUNK_SIZE - 1)//TERRAIN_CHUNK_SIZE
+		self.buckets  = {}	# [(cx, cy)] = [item, ...]
+		self.chunks   = {}	# [(cx, cy)] = surface, or None if there's nothing in it
+		for item in items:
+			if item[0] == 'line':
+				pad = item[3]
+			else:
+				pad = 1
+			xs  = [p[0] for p in item[2]]
+			ys  = [p[1] for p in item[2]]
+			cx0 = max(0, int((min(xs) - pad) // TERRAIN_CHUNK_SIZE))
+			cy0 = max(0, int((min(ys) - pad) // TERRAIN_CHUNK_SIZE))
+			cx1 = min(self.num_cx-1, int((max(xs) + pad) // TERRAIN_CHUNK_SIZE))
+			cy1 = min(self.num_cy-1, int((max(ys) + pad) // TERRAIN_CHUNK_SIZE))
+			for cx in range(cx0, cx1+1):
+				for cy in range(cy0, cy1+1):
+					if (cx, cy) not in self.buckets:
+						self.buckets[(cx, cy)] = []
+					self.buckets[(cx, cy)].append(item)
+
+	def get_chunk(self, cx, cy):
+		if (cx, cy) in self.chunks:
+			return self.chunks[(cx, cy)]
+		if (cx, cy) not in self.buckets:
+			self.chunks[(cx, cy)] = None
+			return None
+		chunk_origin = Vector2(cx*TERRAIN_CHUNK_SIZE, cy*TERRAIN_CHUNK_SIZE)
+		chunk_size   = (min(TERRAIN_CHUNK_SIZE, self.map_size[0] - int(chunk_origin.x)), min(TERRAIN_CHUNK_SIZE, self.map_size[1] - int(chunk_origin.y)))
+		chunk_surface = pygame.Surface(chunk_size, pygame.SRCALPHA).convert_alpha()
+		for item in self.buckets[(cx, cy)]:
+			points = [Vector2(p) - chunk_origin for p in item[2]]
+			if item[0] == 'line':
+				pygame.draw.line(chunk_surface, item[1], points[0], points[1], width=item[3])
+			else:
+				pygame.draw.polygon(chunk_surface, item[1], points)
+		self.chunks[(cx, cy)] = chunk_surface
+		return chunk_surface
+
+	def draw(self, screen, offset):
+		for (cx, cy) in get_visible_chunks(screen, offset, self.map_size):
+			chunk_surface = self.get_chunk(cx, cy)
+			if chunk_surface != None:
+				screen.blit(chunk_surface, Vector2(cx*TERRAIN_CHUNK_SIZE, cy*TERRAIN_CHUNK_SIZE) + offset)
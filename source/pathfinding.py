@@ -1,22 +1,58 @@
 import copy
+import csv
 import heapq
+import math
 import numpy as np
-import pygame
+import time
 
 from collections import deque
-from pygame.math import Vector2
+from functools   import lru_cache
 
 from source.globals  import GRID_SIZE
 
 UNIT_RADIUS_EPS = 0.01
 
+# what each filt_count entry counts, and the stages the navgraph build is timed in
+FILT_NAMES   = ['candidates', 'good_angles', 'no_wall_turn', 'traversable', 'noncollinear']
+BUILD_STAGES = ['labeling', 'nodes', 'line_merge', 'pair_filter', 'ray_cast', 'collinear_prune']
+
+# per-query telemetry: seconds spent in each phase of pathfind, how many of the last queries MapData keeps
+QUERY_PHASES   = ['bfs', 'nudge', 'straight_line', 'insertion', 'astar']
+QUERY_LOG_SIZE = 256
+
+#
+# positions are plain (x, y) tuples in pixels so that none of this needs pygame
+#
+def get_distance(a, b):
+	dx = b[0] - a[0]
+	dy = b[1] - a[1]
+	return math.sqrt(dx*dx + dy*dy)
+
+#
+# returns (nodes, node_angle_dict, merged_lines, tile_2_region_id), split into stages so they can be benchmarked
+# -- seconds spent in each stage are written to stage_times, if given
 #
+def get_pathfinding_data(map_dat, stage_times=None):
+	if stage_times == None:
+		stage_times = {}
+	tt = time.perf_counter()
+	(tile_2_region_id, num_regions) = get_region_labels(map_dat)
+	stage_times['labeling'] = time.perf_counter() - tt
+	tt = time.perf_counter()
+	(nodes, collision_lines)        = get_region_nodes(map_dat, tile_2_region_id, num_regions)
+	node_angle_dict                 = get_node_angles(map_dat, nodes)
+	stage_times['nodes'] = time.perf_counter() - tt
+	tt = time.perf_counter()
+	merged_lines                    = merge_collision_lines(collision_lines)
+	stage_times['line_merge'] = time.perf_counter() - tt
+	return (nodes, node_angle_dict, merged_lines, tile_2_region_id)
+
 #
+# bfs to identify fully-connected pathing regions
 #
-def get_pathfinding_data(map_dat):
+def get_region_labels(map_dat):
 	tile_2_region_id = np.zeros((map_dat.shape[0], map_dat.shape[1]), dtype='i4') - 1
 	num_regions      = 0
-	# bfs to identify fully-connected pathing regions
 	visited = {}
 	for x in range(1, map_dat.shape[0]-1):
 		for y in range(1, map_dat.shape[1]-1):
@@ -32,11 +68,14 @@ def get_pathfinding_data(map_dat):
 							tile_2_region_id[neighbor[0],neighbor[1]] = num_regions
 							queue.append(neighbor)
 				num_regions += 1
+	return (tile_2_region_id, num_regions)
+
+#
+# for each region get pathing nodes and collision lines
+#
+def get_region_nodes(map_dat, tile_2_region_id, num_regions):
 	nodes           = [[] for n in range(num_regions)]
 	collision_lines = [[] for n in range(num_regions)]
-	#
-	# for each region get pathing nodes and collision lines
-	#
 	for x in range(1, map_dat.shape[0]-1):
 		for y in range(1, map_dat.shape[1]-1):
 			if map_dat[x,y] == 0:
@@ -61,10 +100,14 @@ def get_pathfinding_data(map_dat):
 					collision_lines[my_region_id].append([(x+1,y), (x+1,y+1), True])
 				if not g:
 					collision_lines[my_region_id].append([(x+1,y+1), (x,y+1), False])
-	#
-	# precompute which corners are clear for each node (for downstream pruning)
-	# -- node has wall to NW, NE, SE, SW : &1, &2, &4, &8
-	#
+	return (nodes, collision_lines)
+
+#
+# precompute which corners are clear for each node (for downstream pruning)
+# -- node has wall to NW, NE, SE, SW : &1, &2, &4, &8
+#
+def get_node_angles(map_dat, nodes):
+	num_regions     = len(nodes)
 	node_angle_dict = [{} for n in range(num_regions)]
 	for rid in range(num_regions):
 		for node in nodes[rid]:
@@ -77,9 +120,13 @@ def get_pathfinding_data(map_dat):
 				node_angle_dict[rid][node] += 4
 			if map_dat[node[0]-1,node[1]+1] == 1:
 				node_angle_dict[rid][node] += 8
-	#
-	# merge attached line segments
-	#
+	return node_angle_dict
+
+#
+# merge attached line segments
+#
+def merge_collision_lines(collision_lines):
+	num_regions  = len(collision_lines)
 	merged_lines = []
 	for rid in range(num_regions):
 		all_adj = np.zeros((len(collision_lines[rid]), len(collision_lines[rid])), dtype='i4')
@@ -110,23 +157,126 @@ def get_pathfinding_data(map_dat):
 				my_yr = [collision_lines[rid][n][0][1] for n in lc] + [collision_lines[rid][n][1][1] for n in lc]
 				my_y  = (min(my_yr), max(my_yr))
 			merged_lines[-1].append([(my_x[0], my_y[0]), (my_x[1], my_y[1])])
-	#
-	return (nodes, node_angle_dict, merged_lines, tile_2_region_id)
+	return merged_lines
+
+#
+# how many tiles do we need to grow the walls by so that every open tile center fits a unit of this radius?
+# -- units up to half a tile wide fit on any open tile, so all of them share the un-inflated map
+#
+def get_inflate_tiles(unit_radius):
+	return max(0, int(math.ceil((unit_radius - GRID_SIZE/2) / GRID_SIZE)))
+
+def inflate_wall_map(map_dat, num_tiles):
+	if num_tiles <= 0:
+		return map_dat
+	inflated = np.copy(map_dat)
+	for axis in [0, 1]:
+		prev = np.copy(inflated)
+		for d in range(1, num_tiles+1):
+			if axis == 0:
+				inflated[d:,:]  = np.maximum(inflated[d:,:],  prev[:-d,:])
+				inflated[:-d,:] = np.maximum(inflated[:-d,:], prev[d:,:])
+			else:
+				inflated[:,d:]  = np.maximum(inflated[:,d:],  prev[:,:-d])
+				inflated[:,:-d] = np.maximum(inflated[:,:-d], prev[:,d:])
+	return inflated
+
+#
+# connect every pair of pathing nodes (within each region) that a unit of the given radius can walk between
+# -- map_dat is the real wall map, the nodes may come from an inflated one
+# -- filt_count = [candidates, good angles, doesn't turn into wall, traversable, non-collinear]
+# -- region_stats[rid] = (filt_count, stage_times)
+#
+def get_navgraph_edges(pf_nodes, pf_nodedict, map_dat, unit_radius):
+	pf_edges     = []
+	region_stats = []
+	for rid in range(len(pf_nodes)):
+		(region_edges, filt_count, stage_times) = get_region_edges(pf_nodes[rid], pf_nodedict[rid], map_dat, unit_radius)
+		pf_edges.append(region_edges)
+		region_stats.append((filt_count, stage_times))
+	return (get_scaled_nodes(pf_nodes), pf_edges, region_stats)
+
+def get_scaled_nodes(pf_nodes):
+	return [[(x*GRID_SIZE + GRID_SIZE/2, y*GRID_SIZE + GRID_SIZE/2) for (x,y) in region_nodes] for region_nodes in pf_nodes]
+
+#
+# regions don't share edges, so each one can be built on its own (e.g. in a worker process)
+#
+def get_region_edges(nodes, node_dict, map_dat, unit_radius):
+	filt_count  = [0,0,0,0,0]
+	stage_times = {}
+	tt = time.perf_counter()
+	pairs = get_candidate_pairs(nodes, node_dict, filt_count)
+	stage_times['pair_filter'] = time.perf_counter() - tt
+	tt = time.perf_counter()
+	pairs = get_traversable_pairs(nodes, pairs, map_dat, unit_radius, filt_count)
+	stage_times['ray_cast'] = time.perf_counter() - tt
+	tt = time.perf_counter()
+	edges = get_noncollinear_edges(nodes, node_dict, pairs, filt_count)
+	stage_times['collinear_prune'] = time.perf_counter() - tt
+	return (edges, filt_count, stage_times)
+
+#
+# cheap tests first: pairs whose angles could actually be part of a shortest path
+#
+def get_candidate_pairs(nodes, node_dict, filt_count):
+	pairs = []
+	for i in range(len(nodes)):
+		for j in range(i+1,len(nodes)):
+			edge = [nodes[i], nodes[j]]
+			filt_count[0] += 1
+			if edge_has_good_incoming_angles(edge, node_dict):
+				filt_count[1] += 1
+				if edge_never_turns_into_wall(edge, node_dict):
+					filt_count[2] += 1
+					pairs.append((i,j))
+	return pairs
+
+#
+# ray cast the remaining pairs against the wall map
+#
+def get_traversable_pairs(nodes, pairs, map_dat, unit_radius, filt_count):
+	nodes_scaled = get_scaled_nodes([nodes])[0]
+	traversable  = []
+	for (i,j) in pairs:
+		if edge_is_traversable([nodes_scaled[i], nodes_scaled[j]], map_dat, unit_radius, stepsize=0.9):
+			filt_count[3] += 1
+			traversable.append((i,j))
+	return traversable
+
+#
+# drop edges that pass straight through other nodes we already have edges for
+#
+def get_noncollinear_edges(nodes, node_dict, pairs, filt_count):
+	candidate_edges = [[nodes[i], nodes[j]] for (i,j) in pairs]
+	edges = {}
+	for i in range(len(nodes)):
+		edges[i] = []
+	for (i,j) in pairs:
+		edge = [nodes[i], nodes[j]]
+		if not edge_is_collinear(edge, node_dict, candidate_edges):
+			filt_count[4] += 1
+			edges[i].append(j)
+			edges[j].append(i)
+	return edges
 
 #
 #
 #
 def edge_is_collinear(edge, node_dict, all_edges, stepsize=0.1):
-	dv = Vector2(edge[1][0] - edge[0][0], edge[1][1] - edge[0][1])
-	nsteps = int(dv.length()/stepsize)-1
+	(dx, dy) = (edge[1][0] - edge[0][0], edge[1][1] - edge[0][1])
+	length   = math.sqrt(dx*dx + dy*dy)
+	nsteps   = int(length/stepsize)-1
 	if nsteps <= 0:
 		return False
-	dv.scale_to_length(stepsize)
-	v = Vector2(edge[0][0] + 0.5, edge[0][1] + 0.5)
+	fraction = stepsize/length
+	(dx, dy) = (dx*fraction, dy*fraction)
+	(vx, vy) = (edge[0][0] + 0.5, edge[0][1] + 0.5)
 	nodes_we_encountered = []
 	for i in range(nsteps):
-		v += dv
-		(mx,my) = (int(v.x), int(v.y))
+		vx += dx
+		vy += dy
+		(mx,my) = (int(vx), int(vy))
 		if (mx,my) in node_dict and (mx,my) not in edge and (mx,my) not in nodes_we_encountered:
 			nodes_we_encountered.append((mx,my))
 	if len(nodes_we_encountered):
@@ -198,23 +348,34 @@ def edge_never_turns_into_wall(edge, node_dict):
 	return True
 
 #
-# edges are vector2 of scaled coords
+# points on a unit's bounding box that we test against the wall map
+# -- units up to a tile wide only need the 4 corners, wider ones are sampled at tile spacing so they can't straddle a wall
+# -- there are only ever a few radii and this is called for every ray cast, so each one is computed once
+#
+@lru_cache(maxsize=None)
+def get_footprint_offsets(unit_radius):
+	num_steps = max(1, int(math.ceil(2*unit_radius / GRID_SIZE)))
+	coords    = [-unit_radius + i*(2*unit_radius/num_steps) for i in range(num_steps+1)]
+	return tuple([(dx, dy) for dx in coords for dy in coords])
+
+#
+# edges are pairs of (x, y) in scaled coords
 #
 def edge_is_traversable(edge, map_dat, unit_radius, stepsize=2.0):
-	corner_offsets = [Vector2(-unit_radius, -unit_radius),
-	                  Vector2(-unit_radius,  unit_radius),
-	                  Vector2( unit_radius, -unit_radius),
-	                  Vector2( unit_radius,  unit_radius)]
-	dv = edge[1] - edge[0]
-	nsteps = int(dv.length()/stepsize)-1
+	corner_offsets = get_footprint_offsets(unit_radius)
+	(dx, dy) = (edge[1][0] - edge[0][0], edge[1][1] - edge[0][1])
+	length   = math.sqrt(dx*dx + dy*dy)
+	nsteps   = int(length/stepsize)-1
 	if nsteps <= 0:	# we're basically on top of the destination
 		return True
-	dv.scale_to_length(stepsize)
-	for co in corner_offsets:
-		v = Vector2(edge[0].x, edge[0].y) + co	# need to make a new vec2 otherwise we modify the original variable (doh)
+	fraction = stepsize/length
+	(dx, dy) = (dx*fraction, dy*fraction)
+	for (ox, oy) in corner_offsets:
+		(vx, vy) = (edge[0][0] + ox, edge[0][1] + oy)
 		for i in range(nsteps):
-			v += dv
-			(mx, my) = (int(v.x / GRID_SIZE), int(v.y / GRID_SIZE))
+			vx += dx
+			vy += dy
+			(mx, my) = (int(vx / GRID_SIZE), int(vy / GRID_SIZE))
 			if map_dat[mx,my] == 1:
 				return False
 	return True
@@ -223,39 +384,53 @@ def edge_is_traversable(edge, map_dat, unit_radius, stepsize=2.0):
 #
 #
 def valid_player_pos(v, map_dat, unit_radius):
-	corner_offsets = [Vector2(-unit_radius, -unit_radius),
-	                  Vector2(-unit_radius,  unit_radius),
-	                  Vector2( unit_radius, -unit_radius),
-	                  Vector2( unit_radius,  unit_radius)]
-	for co in corner_offsets:
-		v_adj = v + co
-		(mx, my) = (int(v_adj.x / GRID_SIZE), int(v_adj.y / GRID_SIZE))
+	corner_offsets = get_footprint_offsets(unit_radius)
+	for (ox, oy) in corner_offsets:
+		(mx, my) = (int((v[0] + ox) / GRID_SIZE), int((v[1] + oy) / GRID_SIZE))
 		if map_dat[mx,my] == 1:
 			return False
 	return True
 
 #
-# returns reversed list of waypoints
+# where a nudged goal may go: somewhere a unit fits, on a tile that's open in the (inflated) region map
+# -- a spot that only fits in the real wall map can be out of sight of every node, which are placed using the inflated one
 #
-def pathfind(world_object, starting_pos, ending_pos):
-	#
-	map_dat      = world_object.wall_map
-	pf_nodes     = world_object.nodes
-	pf_edges     = world_object.edges
-	pf_regionmap = world_object.regionmap
-	my_unitbuff  = world_object.p_loswidth
+def valid_goal_pos(v, map_dat, pf_regionmap, unit_region, unit_radius):
+	if pf_regionmap[int(v[0] / GRID_SIZE), int(v[1] / GRID_SIZE)] != unit_region:
+		return False
+	return valid_player_pos(v, map_dat, unit_radius)
+
+#
+# figure out which region we're pathing in and where we're actually going to end up
+# -- returns (unit_region, starting_tile, ending_pos), or None if there's nowhere for us to go
+# -- seconds spent finding an in-region tile for out-of-region clicks and nudging the goal are written to query_stats, if given
+#
+def get_pathfinding_endpoints(map_dat, pf_regionmap, starting_pos, ending_pos, my_unitbuff, query_stats=None):
+	if query_stats == None:
+		query_stats = {}
 	#
-	(ux,uy) = (int(starting_pos.x / GRID_SIZE), int(starting_pos.y / GRID_SIZE))
-	(cx,cy) = (int(ending_pos.x / GRID_SIZE), int(ending_pos.y / GRID_SIZE))
+	(ux,uy) = (int(starting_pos[0] / GRID_SIZE), int(starting_pos[1] / GRID_SIZE))
+	(cx,cy) = (int(ending_pos[0] / GRID_SIZE), int(ending_pos[1] / GRID_SIZE))
 	unit_region  = pf_regionmap[ux,uy]
+	# large units can stand on tiles that are closed in their inflated map, so start from the nearest open tile
+	if unit_region < 0:
+		open_tiles = []
+		for (x,y) in [(ux+dx, uy+dy) for dx in [-1,0,1] for dy in [-1,0,1]]:
+			if x >= 0 and y >= 0 and x < map_dat.shape[0] and y < map_dat.shape[1] and pf_regionmap[x,y] >= 0:
+				open_tiles.append((get_distance(starting_pos, (x*GRID_SIZE + GRID_SIZE/2, y*GRID_SIZE + GRID_SIZE/2)), (x,y)))
+		if not open_tiles:
+			return None
+		(ux,uy) = sorted(open_tiles)[0][1]
+		unit_region = pf_regionmap[ux,uy]
 	click_region = pf_regionmap[cx,cy]
-	starting_pos_quant = Vector2(ux*GRID_SIZE + GRID_SIZE/2, uy*GRID_SIZE + GRID_SIZE/2)
-	ending_pos_quant   = Vector2(cx*GRID_SIZE + GRID_SIZE/2, cy*GRID_SIZE + GRID_SIZE/2)
+	starting_pos_quant = (ux*GRID_SIZE + GRID_SIZE/2, uy*GRID_SIZE + GRID_SIZE/2)
+	ending_pos_quant   = (cx*GRID_SIZE + GRID_SIZE/2, cy*GRID_SIZE + GRID_SIZE/2)
 	#
 	# if we clicked out of bounds move to the tile closest to the click position (that is in bounds)
 	# --- draw a line from click pos towards current unit pos, looking for a valid destination
 	#
 	found_nearest_inbound_tile = False
+	tt = time.perf_counter()
 	if click_region != unit_region:
 		steps    = abs(cx-ux) + abs(cy-uy)
 		(x0, y0) = (cx, cy)
@@ -264,7 +439,7 @@ def pathfind(world_object, starting_pos, ending_pos):
 			x = x0 + int(i*(dx/steps))
 			y = y0 + int(i*(dy/steps))
 			if pf_regionmap[x,y] == unit_region:
-				ending_pos_quant = Vector2(x*GRID_SIZE + GRID_SIZE/2, y*GRID_SIZE + GRID_SIZE/2)
+				ending_pos_quant = (x*GRID_SIZE + GRID_SIZE/2, y*GRID_SIZE + GRID_SIZE/2)
 				found_nearest_inbound_tile = True
 				break
 		# if that failed, lets do a bfs to find the nearest valid tile
@@ -283,43 +458,100 @@ def pathfind(world_object, starting_pos, ending_pos):
 							visited[neighbor] = True
 							queue.append(neighbor)
 			if len(found_tiles):
-				found_tiles = sorted([((Vector2(n[0],n[1]) - Vector2(cx,cy)).length(), n) for n in found_tiles])
+				found_tiles = sorted([(get_distance((cx,cy), n), n) for n in found_tiles])
 				(x,y) = found_tiles[0][1]
-				ending_pos_quant = Vector2(x*GRID_SIZE + GRID_SIZE/2, y*GRID_SIZE + GRID_SIZE/2)
+				ending_pos_quant = (x*GRID_SIZE + GRID_SIZE/2, y*GRID_SIZE + GRID_SIZE/2)
 				found_nearest_inbound_tile = True
 		# somehow that also failed, so we're not going to move at all. sorry!
 		if not found_nearest_inbound_tile:
-			return []
+			query_stats['bfs'] = time.perf_counter() - tt
+			return None
+	query_stats['bfs'] = time.perf_counter() - tt
 	#
 	# if ending position is not valid (e.g. in a wall) choose closest in-bounds tile and nudge towards desired coords
 	#
+	tt = time.perf_counter()
 	if found_nearest_inbound_tile or not valid_player_pos(ending_pos, map_dat, my_unitbuff):
-		#print('ending_pos:', ending_pos)
-		#print('quant:     ', ending_pos_quant)
-		nudged_pos = ending_pos_quant
-		if nudged_pos.x > ending_pos.x:
-			while nudged_pos.x > ending_pos.x and valid_player_pos(nudged_pos - Vector2(1,0), map_dat, my_unitbuff):
-				nudged_pos -= Vector2(1,0)
-		elif nudged_pos.x < ending_pos.x:
-			while nudged_pos.x < ending_pos.x and valid_player_pos(nudged_pos + Vector2(1,0), map_dat, my_unitbuff):
-				nudged_pos += Vector2(1,0)
-		if nudged_pos.y > ending_pos.y:
-			while nudged_pos.y > ending_pos.y and valid_player_pos(nudged_pos - Vector2(0,1), map_dat, my_unitbuff):
-				nudged_pos -= Vector2(0,1)
-		elif nudged_pos.y < ending_pos.y:
-			while nudged_pos.y < ending_pos.y and valid_player_pos(nudged_pos + Vector2(0,1), map_dat, my_unitbuff):
-				nudged_pos += Vector2(0,1)
-		ending_pos = nudged_pos
+		(nx, ny) = ending_pos_quant
+		if nx > ending_pos[0]:
+			while nx > ending_pos[0] and valid_goal_pos((nx-1, ny), map_dat, pf_regionmap, unit_region, my_unitbuff):
+				nx -= 1
+		elif nx < ending_pos[0]:
+			while nx < ending_pos[0] and valid_goal_pos((nx+1, ny), map_dat, pf_regionmap, unit_region, my_unitbuff):
+				nx += 1
+		if ny > ending_pos[1]:
+			while ny > ending_pos[1] and valid_goal_pos((nx, ny-1), map_dat, pf_regionmap, unit_region, my_unitbuff):
+				ny -= 1
+		elif ny < ending_pos[1]:
+			while ny < ending_pos[1] and valid_goal_pos((nx, ny+1), map_dat, pf_regionmap, unit_region, my_unitbuff):
+				ny += 1
+		ending_pos = (nx, ny)
+	query_stats['nudge'] = time.perf_counter() - tt
+	return (unit_region, (ux,uy), ending_pos)
+
+#
+# what one pathfind call did: seconds per phase, nodes expanded, ray casts and how it ended ('none', 'straight', 'path')
+#
+def get_blank_query_stats(starting_pos, ending_pos, unit_radius):
+	query_stats = {k: 0. for k in QUERY_PHASES}
+	query_stats['start']          = (starting_pos[0], starting_pos[1])
+	query_stats['goal']           = (ending_pos[0], ending_pos[1])
+	query_stats['unit_radius']    = unit_radius
+	query_stats['nodes_expanded'] = 0
+	query_stats['ray_casts']      = 0
+	query_stats['result']         = 'none'
+	query_stats['total']          = 0.
+	return query_stats
+
+def log_query(world_object, query_stats, start_time, result):
+	query_stats['result'] = result
+	query_stats['total']  = time.perf_counter() - start_time
+	world_object.query_log.append(query_stats)
+
+def write_query_log_csv(out_fn, query_log):
+	fields = ['start_x', 'start_y', 'goal_x', 'goal_y', 'unit_radius', 'result', 'total'] + QUERY_PHASES + ['nodes_expanded', 'ray_casts']
+	with open(out_fn, 'w', newline='') as f:
+		writer = csv.writer(f)
+		writer.writerow(fields)
+		for query_stats in query_log:
+			writer.writerow([query_stats['start'][0], query_stats['start'][1], query_stats['goal'][0], query_stats['goal'][1]] +
+			                [query_stats[k] for k in fields[4:]])
+
+#
+# returns reversed list of waypoints, as (x, y) tuples
+# -- every call is logged to world_object.query_log, see get_blank_query_stats()
+#
+def pathfind(world_object, starting_pos, ending_pos, unit_radius=None):
+	#
+	if unit_radius == None:
+		unit_radius = world_object.unit_radius
+	start_time = time.perf_counter()
+	(map_dat, pf_nodes, pf_edges, pf_collision, pf_regionmap) = world_object.get_navgraph(unit_radius)
+	my_unitbuff  = unit_radius - UNIT_RADIUS_EPS
+	starting_pos = (starting_pos[0], starting_pos[1])
+	ending_pos   = (ending_pos[0], ending_pos[1])
+	query_stats  = get_blank_query_stats(starting_pos, ending_pos, unit_radius)
+	#
+	endpoints = get_pathfinding_endpoints(map_dat, pf_regionmap, starting_pos, ending_pos, my_unitbuff, query_stats)
+	if endpoints == None:
+		log_query(world_object, query_stats, start_time, 'none')
+		return []
+	(unit_region, starting_tile, ending_pos) = endpoints
 	#
 	# do we have a straight line between current position and where we want to go?
 	# -- using a small stepsize here so that we don't fail LoS checks if start and end are very close
 	#
+	tt = time.perf_counter()
 	have_straight_line = edge_is_traversable([starting_pos, ending_pos], map_dat, my_unitbuff, stepsize=0.9)
+	query_stats['straight_line'] = time.perf_counter() - tt
+	query_stats['ray_casts']    += 1
 	if have_straight_line:
+		log_query(world_object, query_stats, start_time, 'straight')
 		return [ending_pos, starting_pos]
 	#
 	# looks like we have to actually do pathfinding...
 	#
+	tt = time.perf_counter()
 	my_edges      = copy.deepcopy(pf_edges[unit_region])
 	num_edges     = len(my_edges)
 	starting_node = num_edges
@@ -340,15 +572,17 @@ def pathfind(world_object, starting_pos, ending_pos):
 		if edge_is_traversable([v, ending_pos], map_dat, my_unitbuff):
 			my_edges[i].append(ending_node)
 			my_edges[ending_node].append(i)
+	query_stats['insertion'] = time.perf_counter() - tt
+	query_stats['ray_casts'] += 2*len(pf_nodes[unit_region])
 	#
+	# no node in sight of one end, we can't get there from here (so we don't move)
 	if not my_edges[starting_node] or not my_edges[ending_node]:
-		print('Error: something went wrong and we were unable to connect starting/ending nodes to graph')
-		print(' -- starting_pos:', starting_pos)
-		print(' -- ending_pos:  ', ending_pos)
-		exit(1)
+		log_query(world_object, query_stats, start_time, 'none')
+		return []
 	#
 	# astar
 	#
+	tt = time.perf_counter()
 	my_nodes = pf_nodes[unit_region] + [starting_pos, ending_pos]
 	visited = {}
 	came_from = {}
@@ -358,6 +592,7 @@ def pathfind(world_object, starting_pos, ending_pos):
 	while queue:
 		(my_f, my_g, current_node) = heapq.heappop(queue)
 		visited[current_node] = True
+		query_stats['nodes_expanded'] += 1
 		if current_node == ending_node:
 			traceback = [ending_node]
 			while traceback[-1] != starting_node:
@@ -369,8 +604,8 @@ def pathfind(world_object, starting_pos, ending_pos):
 			v1 = my_nodes[current_node]
 			v2 = my_nodes[neighbor]
 			v3 = ending_pos
-			g  = my_g + (v2-v1).length()
-			h  = (v3-v2).length()
+			g  = my_g + get_distance(v1, v2)
+			h  = get_distance(v2, v3)
 			# if neighbor is in open list already with a lower g score --> skip
 			insert_neighbor = True
 			for n in queue:
@@ -379,7 +614,9 @@ def pathfind(world_object, starting_pos, ending_pos):
 					break
 			# otherwise add neighbor to open list
 			if insert_neighbor:
-				h = (v3-v2).length()
+				h = get_distance(v2, v3)
 				heapq.heappush(queue, (g+h, g, neighbor))
 				came_from[neighbor] = current_node
+	query_stats['astar'] = time.perf_counter() - tt
+	log_query(world_object, query_stats, start_time, 'path')
 	return [my_nodes[n] for n in traceback]
@@ -0,0 +1,81 @@
+import pygame
+
+from pygame.math import Vector2
+
+from source.misc_gfx    import Color
+from source.pathfinding import QUERY_PHASES
+
+# upper edges (in ms) of the query time histogram bins, anything slower goes in the last bin
+HIST_BINS_MS  = [0.5, 1, 2, 4, 8, 16, 32, 64]
+PHASE_LABELS  = {'bfs':'bfs', 'nudge':'nudge', 'straight_line':'los', 'insertion':'insert', 'astar':'astar'}
+# (header, width in px) for each column of the query table
+COLUMNS       = [('total ms', 48), ('result', 48)] + [(PHASE_LABELS[k], 36) for k in QUERY_PHASES] + [('expanded', 48), ('rays', 36)]
+OVERLAY_ALPHA = 192
+
+#
+# debug overlay for the pathfind query log: the last few queries broken down by phase and a histogram of total times
+#
+class QueryOverlay:
+	def __init__(self, pos, font, num_rows=8, width=420, hist_height=40):
+		self.pos         = pos
+		self.font        = font
+		self.num_rows    = num_rows
+		self.width       = width
+		self.row_height  = font.char_height + 3
+		self.hist_height = hist_height
+		self.height      = (num_rows + 2)*self.row_height + hist_height + self.row_height + 8
+		self.background  = pygame.Surface((width, self.height))
+		self.background.fill(Color.BACKGROUND)
+		self.background.set_alpha(OVERLAY_ALPHA)
+
+	def get_histogram(self, query_log):
+		counts = [0 for n in range(len(HIST_BINS_MS)+1)]
+		for query_stats in query_log:
+			time_ms = 1000*query_stats['total']
+			bin_ind = len(HIST_BINS_MS)
+			for i,bin_edge in enumerate(HIST_BINS_MS):
+				if time_ms < bin_edge:
+					bin_ind = i
+					break
+			counts[bin_ind] += 1
+		return counts
+
+	# the pixel font isn't monospaced, so each column gets its own x position
+	def draw_row(self, screen, row_strs, pos):
+		col_x = 0
+		for (row_str, (header, width)) in zip(row_strs, COLUMNS):
+			self.font.render(screen, row_str, Vector2(pos.x + col_x, pos.y))
+			col_x += width
+
+	def draw(self, screen, query_log):
+		screen.blit(self.background, self.pos)
+		(x, y) = (self.pos.x + 4, self.pos.y + 4)
+		self.font.render(screen, 'pathfind: ' + str(len(query_log)) + ' queries logged  (F3 hide, F4 export csv)', Vector2(x, y))
+		y += self.row_height
+		self.draw_row(screen, [n[0] for n in COLUMNS], Vector2(x, y))
+		y += self.row_height
+		#
+		recent_queries = list(query_log)[-self.num_rows:]
+		for query_stats in reversed(recent_queries):
+			row_strs = ['{:.2f}'.format(1000*query_stats['total']), query_stats['result']]
+			row_strs.extend(['{:.2f}'.format(1000*query_stats[k]) for k in QUERY_PHASES])
+			row_strs.extend([str(query_stats['nodes_expanded']), str(query_stats['ray_casts'])])
+			self.draw_row(screen, row_strs, Vector2(x, y))
+			y += self.row_height
+		y = self.pos.y + 4 + (self.num_rows + 2)*self.row_height + 4
+		#
+		# histogram of total query times over everything in the log
+		#
+		counts    = self.get_histogram(query_log)
+		max_count = max(counts + [1])
+		bin_width = int((self.width - 8) / len(counts))
+		for i,count in enumerate(counts):
+			bar_height = int(self.hist_height * count / max_count)
+			bar_tl     = Vector2(x + i*bin_width, y + self.hist_height - bar_height)
+			if bar_height:
+				screen.draw_rect(Color.PAL_BLUE_2, pygame.Rect(bar_tl, (bin_width - 2, bar_height)))
+			if i < len(HIST_BINS_MS):
+				bin_label = '<' + str(HIST_BINS_MS[i])
+			else:
+				bin_label = str(HIST_BINS_MS[-1]) + '+'
+			self.font.render(screen, bin_label + ' ' + str(count), Vector2(x + i*bin_width, y + self.hist_height + 2))
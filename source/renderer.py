@@ -0,0 +1,421 @@
+import math
+import os
+import pygame
+import weakref
+
+from collections        import Counter
+from pygame._sdl2.video import Renderer, Texture, Window
+from pygame.math        import Vector2
+
+from source.misc_gfx import upscale_to_display
+
+#
+# everything on screen is drawn through one of these
+# -- blit(), blits(), fill(), get_size() and get_rect() work like they do on a Surface, so code that only blits doesn't care which one it gets
+# -- draw_line(), draw_rect(), draw_polygon() and draw_ellipse() take the same arguments as pygame.draw.*(), minus the surface
+# -- upscale() stretches the frame to the window (if it needs it), present() puts it on screen
+#
+RENDER_BACKENDS = ['software', 'sdl2']
+
+SHAPE_CACHE_SIZE = 1024
+
+DIRTY_RECT_LIMIT = 32	# more than this many changed regions (or more than half the screen) and the whole frame is redrawn
+
+def open_renderer(backend, resolution, display_size=None, fullscreen=False, scale_mode='nearest', title=''):
+	if backend == 'sdl2':
+		return SDLRenderer(resolution, display_size, fullscreen, scale_mode, title)
+	disp_flags = 0
+	if fullscreen:
+		disp_flags |= pygame.FULLSCREEN
+	if display_size == None:
+		return SurfaceRenderer(pygame.display.set_mode(size=resolution, flags=disp_flags, depth=0, display=0, vsync=0))
+	display_surface = pygame.display.set_mode(size=display_size, flags=disp_flags, depth=0, display=0, vsync=0)
+	return SurfaceRenderer(pygame.Surface(resolution, 0, display_surface), display_surface, scale_mode)
+
+#
+# software: draws into a Surface, then scales it into the display surface on the cpu (see upscale_to_display())
+# -- with no display surface the frame is the display (or an offscreen surface, for tools and benchmarks)
+#
+class SurfaceRenderer:
+	partial_redraw = True
+
+	def __init__(self, surface, display_surface=None, scale_mode='nearest'):
+		self.surface         = surface
+		self.display_surface = display_surface
+		self.scale_mode      = scale_mode
+		self.scale2x_buffer  = None
+		if display_surface != None and scale_mode == 'scale2x' and Vector2(display_surface.get_size()) != 2*Vector2(surface.get_size()):
+			self.scale2x_buffer = pygame.Surface(2*Vector2(surface.get_size()), 0, display_surface)
+
+	def get_size(self):
+		return self.surface.get_size()
+
+	def get_rect(self):
+		return self.surface.get_rect()
+
+	def get_display_size(self):
+		if self.display_surface == None:
+			return self.surface.get_size()
+		return self.display_surface.get_size()
+
+	def blit(self, source, dest, area=None, special_flags=0):
+		return self.surface.blit(source, dest, area, special_flags)
+
+	def blits(self, blit_sequence, doreturn=False):
+		return self.surface.blits(blit_sequence, doreturn=doreturn)
+
+	def fill(self, color, rect=None):
+		return self.surface.fill(color, rect)
+
+	def draw_line(self, color, start_pos, end_pos, width=1):
+		pygame.draw.line(self.surface, color, start_pos, end_pos, width=width)
+
+	def draw_rect(self, color, rect, width=0, border_radius=0):
+		pygame.draw.rect(self.surface, color, rect, width=width, border_radius=border_radius)
+
+	def draw_polygon(self, color, points, width=0):
+		pygame.draw.polygon(self.surface, color, points, width=width)
+
+	def draw_ellipse(self, color, rect, width=0):
+		pygame.draw.ellipse(self.surface, color, rect, width=width)
+
+	#
+	# a rect filled with a translucent color (alpha = 0-255)
+	#
+	def blend_rect(self, color, rect, alpha):
+		rect = pygame.Rect(rect).clip(self.surface.get_rect())
+		if rect.w <= 0 or rect.h <= 0:
+			return
+		rect_surface = pygame.Surface(rect.size, 0, self.surface)
+		rect_surface.fill(color)
+		rect_surface.set_alpha(alpha)
+		self.surface.blit(rect_surface, rect, special_flags=pygame.BLEND_ALPHA_SDL2)
+
+	def set_clip(self, rect=None):
+		self.surface.set_clip(rect)
+
+	#
+	# screen rect --> the display pixels it ends up on
+	#
+	def get_display_rect(self, rect):
+		(fx, fy) = (self.get_display_size()[0]/self.surface.get_width(), self.get_display_size()[1]/self.surface.get_height())
+		(x0, y0) = (math.floor(rect.x*fx), math.floor(rect.y*fy))
+		(x1, y1) = (math.ceil(rect.right*fx), math.ceil(rect.bottom*fy))
+		return pygame.Rect(x0, y0, x1-x0, y1-y0)
+
+	#
+	# rects = only these parts of the screen changed (None = all of it)
+	# -- only nearest scaling by a whole number can be done a piece at a time, everything else scales the whole frame
+	#
+	def upscale(self, rects=None):
+		if self.display_surface == None:
+			return
+		(fx, fy) = (self.display_surface.get_width()/self.surface.get_width(), self.display_surface.get_height()/self.surface.get_height())
+		if rects == None or self.scale_mode != 'nearest' or fx != int(fx) or fy != int(fy):
+			upscale_to_display(self.surface, self.display_surface, self.scale_mode, self.scale2x_buffer)
+			return
+		for rect in rects:
+			display_rect = self.get_display_rect(rect)
+			pygame.transform.scale(self.surface.subsurface(rect), display_rect.size, self.display_surface.subsurface(display_rect))
+
+	def present(self, rects=None):
+		if rects == None:
+			pygame.display.update()
+		else:
+			pygame.display.update([self.get_display_rect(n) for n in rects])
+
+#
+# pygame._sdl2 Renderer: surfaces become textures the first time they're drawn and SDL does the blending and scaling
+# -- textures are kept for as long as their surface is alive, so a surface shouldn't be drawn into after it's been put on screen
+#    (per-surface alpha is the exception, it's read again every blit so fades still work)
+# -- SDL only draws points, lines and rects itself, other shapes are drawn once with pygame.draw and kept as textures (see draw_shape())
+# -- Surface.convert() still needs a display mode, so if there isn't one a hidden 1x1 one is opened for it
+# -- nearest and smooth scaling come from the SDL renderer, there's no scale2x here
+#
+class SDLRenderer:
+	partial_redraw = False
+
+	def __init__(self, resolution, display_size=None, fullscreen=False, scale_mode='nearest', title=''):
+		if scale_mode not in ['nearest', 'smooth']:
+			print('Error: scale mode', scale_mode, 'is not available with the sdl2 renderer')
+			exit(1)
+		os.environ['SDL_RENDER_SCALE_QUALITY'] = '1' if scale_mode == 'smooth' else '0'	# read when textures are made
+		if pygame.display.get_surface() == None:
+			pygame.display.set_mode((1,1), pygame.HIDDEN)
+		self.resolution = (int(resolution[0]), int(resolution[1]))
+		if display_size == None:
+			display_size = self.resolution
+		self.window   = Window(title, size=(int(display_size[0]), int(display_size[1])), fullscreen_desktop=fullscreen)
+		self.renderer = Renderer(self.window, accelerated=-1, vsync=False)
+		window_size   = self.window.size
+		self.renderer.scale = (window_size[0]/self.resolution[0], window_size[1]/self.resolution[1])
+		self.textures = weakref.WeakKeyDictionary()	# [surface] = Texture
+		self.shapes   = {}	# [shape key] = Texture, see draw_shape()
+
+	def get_size(self):
+		return self.resolution
+
+	def get_rect(self):
+		return pygame.Rect((0,0), self.resolution)
+
+	def get_display_size(self):
+		return self.window.size
+
+	def get_texture(self, surface):
+		texture = self.textures.get(surface)
+		if texture == None:
+			texture = Texture.from_surface(self.renderer, surface)
+			self.textures[surface] = texture
+		surface_alpha = surface.get_alpha()
+		if surface_alpha != None:
+			texture.blend_mode = pygame.BLENDMODE_BLEND
+			texture.alpha      = surface_alpha
+		return texture
+
+	#
+	# the only special flag used on screen is BLEND_ALPHA_SDL2, which is what SDL_BLENDMODE_BLEND does anyway
+	#
+	def blit(self, source, dest, area=None, special_flags=0):
+		if area == None:
+			area = source.get_rect()
+		else:
+			area = pygame.Rect(area)
+		dest_rect = pygame.Rect(int(dest[0]), int(dest[1]), area.w, area.h)
+		self.get_texture(source).draw(srcrect=area, dstrect=dest_rect)
+		return dest_rect
+
+	def blits(self, blit_sequence, doreturn=False):
+		dest_rects = [self.blit(*n) for n in blit_sequence]
+		if doreturn:
+			return dest_rects
+
+	def fill(self, color, rect=None):
+		self.renderer.draw_color = pygame.Color(color)
+		if rect == None:
+			self.renderer.clear()
+		else:
+			self.renderer.fill_rect(pygame.Rect(rect))
+
+	def draw_line(self, color, start_pos, end_pos, width=1):
+		if width == 1:
+			self.renderer.draw_color = pygame.Color(color)
+			self.renderer.draw_line((int(start_pos[0]), int(start_pos[1])), (int(end_pos[0]), int(end_pos[1])))
+		elif width > 1:
+			self.draw_shape(('line', tuple(color), width), [start_pos, end_pos], width,
+			                lambda my_surface, pts: pygame.draw.line(my_surface, color, pts[0], pts[1], width=width))
+
+	def draw_rect(self, color, rect, width=0, border_radius=0):
+		rect = pygame.Rect(rect)
+		if border_radius <= 0 and width <= 1:
+			self.renderer.draw_color = pygame.Color(color)
+			if width == 0:
+				self.renderer.fill_rect(rect)
+			else:
+				self.renderer.draw_rect(rect)
+			return
+		self.draw_shape(('rect', tuple(color), width, border_radius), [rect.topleft, rect.bottomright], 0,
+		                lambda my_surface, pts: pygame.draw.rect(my_surface, color, pygame.Rect(pts[0], Vector2(pts[1]) - Vector2(pts[0])), width=width, border_radius=border_radius))
+
+	def draw_polygon(self, color, points, width=0):
+		self.draw_shape(('polygon', tuple(color), width), points, max(1, width),
+		                lambda my_surface, pts: pygame.draw.polygon(my_surface, color, pts, width=width))
+
+	def draw_ellipse(self, color, rect, width=0):
+		rect = pygame.Rect(rect)
+		self.draw_shape(('ellipse', tuple(color), width), [rect.topleft, rect.bottomright], 0,
+		                lambda my_surface, pts: pygame.draw.ellipse(my_surface, color, pygame.Rect(pts[0], Vector2(pts[1]) - Vector2(pts[0])), width=width))
+
+	def blend_rect(self, color, rect, alpha):
+		self.renderer.draw_blend_mode = pygame.BLENDMODE_BLEND
+		self.renderer.draw_color      = pygame.Color(color[0], color[1], color[2], alpha)
+		self.renderer.fill_rect(pygame.Rect(rect))
+		self.renderer.draw_blend_mode = pygame.BLENDMODE_NONE
+
+	#
+	# shapes are keyed by their points relative to their top-left corner, so something scrolling across the screen is only drawn once
+	# -- points are truncated to ints first, like pygame.draw does, so the cached shape matches drawing it in place
+	# -- pad = how far the shape can spill past its points (thick lines, polygon edges)
+	#
+	def draw_shape(self, shape_key, points, pad, draw_func):
+		points = [(int(p[0]), int(p[1])) for p in points]
+		x0 = min([p[0] for p in points]) - pad
+		y0 = min([p[1] for p in points]) - pad
+		rel_points = tuple([(p[0] - x0, p[1] - y0) for p in points])
+		shape_key  = shape_key + (rel_points,)
+		if shape_key not in self.shapes:
+			if len(self.shapes) >= SHAPE_CACHE_SIZE:
+				self.shapes = {}
+			shape_w = max([p[0] for p in rel_points]) + pad + 1
+			shape_h = max([p[1] for p in rel_points]) + pad + 1
+			shape_surface = pygame.Surface((shape_w, shape_h), pygame.SRCALPHA)
+			draw_func(shape_surface, rel_points)
+			self.shapes[shape_key] = Texture.from_surface(self.renderer, shape_surface)
+		texture = self.shapes[shape_key]
+		texture.draw(dstrect=pygame.Rect(x0, y0, texture.width, texture.height))
+
+	#
+	# SDL redraws and presents whole frames, rects are ignored
+	#
+	def upscale(self, rects=None):
+		pass
+
+	def present(self, rects=None):
+		self.renderer.present()
+
+#
+# dirty-rect mode: wraps another renderer, records the frame's draw calls and only redraws where they differ from last frame's
+# -- a call is its arguments (surfaces by identity, plus their per-surface alpha), so a surface shouldn't be drawn into after it's been on screen
+# -- calls that were added or removed make their bounds dirty, which covers widgets, the player, animations, text and so on
+#    (scrolling moves every map-space call, so the whole screen goes dirty by itself)
+# -- redraw_dirty() replays, in order, every call that touches a dirty region, clipped to it
+#    renderers without clipping (sdl2) redraw everything when anything changed
+# -- nothing changed = nothing is drawn, scaled or presented
+#
+class DirtyRectRenderer:
+	def __init__(self, renderer):
+		self.renderer    = renderer
+		self.draw_calls  = []	# this frame's [(key, bounds, method, args)]
+		self.last_keys   = Counter()
+		self.last_bounds = {}	# [key] = bounds, from last frame
+		self.dirty_rects = None	# None = the whole screen
+		self.force_full  = True
+
+	def get_size(self):
+		return self.renderer.get_size()
+
+	def get_rect(self):
+		return self.renderer.get_rect()
+
+	def get_display_size(self):
+		return self.renderer.get_display_size()
+
+	#
+	# e.g. after the window was covered up
+	#
+	def invalidate(self):
+		self.force_full = True
+
+	def record(self, key, bounds, method, args):
+		self.draw_calls.append((key, bounds, method, args))
+
+	def blit(self, source, dest, area=None, special_flags=0):
+		dest = (float(dest[0]), float(dest[1]))
+		if area == None:
+			area_key = None
+			bounds   = pygame.Rect((int(dest[0]), int(dest[1])), source.get_size())
+		else:
+			area_key = tuple(pygame.Rect(area))
+			bounds   = pygame.Rect((int(dest[0]), int(dest[1])), area_key[2:])
+		self.record(('blit', source, source.get_alpha(), dest, area_key, special_flags), bounds.inflate(2,2), 'blit', (source, dest, area_key, special_flags))
+		return bounds
+
+	def blits(self, blit_sequence, doreturn=False):
+		dest_rects = [self.blit(*n) for n in blit_sequence]
+		if doreturn:
+			return dest_rects
+
+	def fill(self, color, rect=None):
+		if rect == None:
+			bounds = self.get_rect()
+		else:
+			rect   = tuple(pygame.Rect(rect))
+			bounds = pygame.Rect(rect)
+		self.record(('fill', tuple(color), rect), bounds, 'fill', (color, rect))
+
+	def draw_line(self, color, start_pos, end_pos, width=1):
+		points = ((float(start_pos[0]), float(start_pos[1])), (float(end_pos[0]), float(end_pos[1])))
+		self.record(('line', tuple(color), points, width), get_points_bounds(points, width), 'draw_line', (color, points[0], points[1], width))
+
+	def draw_rect(self, color, rect, width=0, border_radius=0):
+		rect = tuple(pygame.Rect(rect))
+		self.record(('rect', tuple(color), rect, width, border_radius), pygame.Rect(rect).inflate(2,2), 'draw_rect', (color, rect, width, border_radius))
+
+	def draw_polygon(self, color, points, width=0):
+		points = tuple([(float(p[0]), float(p[1])) for p in points])
+		self.record(('polygon', tuple(color), points, width), get_points_bounds(points, width), 'draw_polygon', (color, points, width))
+
+	def draw_ellipse(self, color, rect, width=0):
+		rect = tuple(pygame.Rect(rect))
+		self.record(('ellipse', tuple(color), rect, width), pygame.Rect(rect).inflate(2,2), 'draw_ellipse', (color, rect, width))
+
+	def blend_rect(self, color, rect, alpha):
+		rect = tuple(pygame.Rect(rect))
+		self.record(('blend_rect', tuple(color), rect, alpha), pygame.Rect(rect), 'blend_rect', (color, rect, alpha))
+
+	#
+	# changed regions: bounds of calls that are new this frame or gone since last frame, merged where they overlap
+	#
+	def get_dirty_rects(self):
+		screen_rect = self.get_rect()
+		if self.force_full:
+			return None
+		keys  = Counter([n[0] for n in self.draw_calls])
+		rects = [bounds for (key, bounds, method, args) in self.draw_calls if keys[key] > self.last_keys[key]]
+		rects.extend([self.last_bounds[k] for k in (self.last_keys - keys).keys()])
+		merged = []
+		for rect in [n.clip(screen_rect) for n in rects]:
+			if rect.w <= 0 or rect.h <= 0:
+				continue
+			while True:
+				overlap = rect.collidelist(merged)
+				if overlap < 0:
+					break
+				rect = rect.union(merged.pop(overlap))
+			merged.append(rect)
+		if len(merged) > DIRTY_RECT_LIMIT or sum([n.w*n.h for n in merged]) > screen_rect.w*screen_rect.h/2:
+			return None
+		return merged
+
+	#
+	# runs of blits go out as one blits() call
+	# -- a surface's alpha can change between blits in the same frame (fades), so the recorded alpha is put back for the replay
+	#
+	def replay(self, calls):
+		blit_list = []
+		for (key, bounds, method, args) in calls:
+			if method == 'blit' and key[2] == args[0].get_alpha():
+				blit_list.append(args)
+				continue
+			if blit_list:
+				self.renderer.blits(blit_list, doreturn=False)
+				blit_list = []
+			if method == 'blit':
+				current_alpha = args[0].get_alpha()
+				args[0].set_alpha(key[2])
+				self.renderer.blit(*args)
+				args[0].set_alpha(current_alpha)
+			else:
+				getattr(self.renderer, method)(*args)
+		if blit_list:
+			self.renderer.blits(blit_list, doreturn=False)
+
+	def redraw_dirty(self):
+		self.dirty_rects = self.get_dirty_rects()
+		if self.dirty_rects == None or (self.dirty_rects and not self.renderer.partial_redraw):
+			self.dirty_rects = None
+			self.replay(self.draw_calls)
+		else:
+			for rect in self.dirty_rects:
+				self.renderer.set_clip(rect)
+				self.replay([n for n in self.draw_calls if n[1].colliderect(rect)])
+			if self.dirty_rects:
+				self.renderer.set_clip(None)
+		self.last_keys   = Counter([n[0] for n in self.draw_calls])
+		self.last_bounds = {n[0]: n[1] for n in self.draw_calls}
+		self.draw_calls  = []
+		self.force_full  = False
+
+	def upscale(self):
+		if self.dirty_rects != []:
+			self.renderer.upscale(self.dirty_rects)
+
+	def present(self):
+		if self.dirty_rects != []:
+			self.renderer.present(self.dirty_rects)
+
+def get_points_bounds(points, width):
+	x0 = min([p[0] for p in points])
+	y0 = min([p[1] for p in points])
+	x1 = max([p[0] for p in points])
+	y1 = max([p[1] for p in points])
+	return pygame.Rect(int(x0), int(y0), int(x1) - int(x0) + 1, int(y1) - int(y0) + 1).inflate(2*width + 2, 2*width + 2)
@@ -127,7 +127,6 @@ class ResizableBox:
             screen.blit(self.my_image, new_rect)
 
     def draw(self, screen, offset, mouseover_condition, highlight_edges=True):
-        box_surface = pygame.Surface(screen.get_size(), flags=pygame.SRCALPHA)
         tl = Vector2(self.tl.x + 1, self.tl.y + 1)
         br = Vector2(self.br.x - 1, self.br.y - 1)
         my_rect = pygame.Rect(tl + offset, br - tl)
@@ -135,29 +134,27 @@ class ResizableBox:
         col = self.box_color
         if mouseover_condition and (self.dragging_whole or self.is_mouseover or any(self.drag_mode)):
             col = self.box_color_highlight
-        pygame.draw.rect(box_surface, col, my_rect)
-        box_surface.set_alpha(96)
-        screen.blit(box_surface, (0,0), special_flags=pygame.BLEND_ALPHA_SDL2)
+        screen.blend_rect(col, my_rect, 96)
         #
         col = self.line_color
         if highlight_edges and mouseover_condition and self.dragging_whole == False and (self.edges_selected[0] or self.drag_mode[0]):
             col = self.line_color_highlight
-        pygame.draw.line(screen, col, Vector2(self.tl.x, self.br.y-1) + offset, self.tl + offset, width=self.line_width)
+        screen.draw_line(col, Vector2(self.tl.x, self.br.y-1) + offset, self.tl + offset, width=self.line_width)
         #
         col = self.line_color
         if highlight_edges and mouseover_condition and self.dragging_whole == False and (self.edges_selected[1] or self.drag_mode[1]):
             col = self.line_color_highlight
-        pygame.draw.line(screen, col, self.tl + offset, Vector2(self.br.x-1, self.tl.y) + offset, width=self.line_width)
+        screen.draw_line(col, self.tl + offset, Vector2(self.br.x-1, self.tl.y) + offset, width=self.line_width)
         #
         col = self.line_color
         if highlight_edges and mouseover_condition and self.dragging_whole == False and (self.edges_selected[2] or self.drag_mode[2]):
             col = self.line_color_highlight
-        pygame.draw.line(screen, col, Vector2(self.br.x-1, self.tl.y) + offset, self.br - Vector2(1,1) + offset, width=self.line_width)
+        screen.draw_line(col, Vector2(self.br.x-1, self.tl.y) + offset, self.br - Vector2(1,1) + offset, width=self.line_width)
         #
         col = self.line_color
         if highlight_edges and mouseover_condition and self.dragging_whole == False and (self.edges_selected[3] or self.drag_mode[3]):
             col = self.line_color_highlight
-        pygame.draw.line(screen, col, self.br - Vector2(1,1) + offset, Vector2(self.tl.x, self.br.y-1) + offset, width=self.line_width)
+        screen.draw_line(col, self.br - Vector2(1,1) + offset, Vector2(self.tl.x, self.br.y-1) + offset, width=self.line_width)
         #
         text_width = self.br.x - self.tl.x - 4
         self.font.render(screen, self.text, self.tl + offset + Vector2(4,4), max_width=text_width)
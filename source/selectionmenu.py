@@ -103,9 +103,9 @@ class SelectionMenu:
 			br = self.pos + Vector2(self.col_width, (self.index - self.current_range[0] + 1) * self.row_height)
 			my_rect = pygame.Rect(tl, br-tl)
 			if self.is_selected:
-				pygame.draw.rect(screen, Color.PAL_BLUE_3, my_rect, border_radius=2)
+				screen.draw_rect(Color.PAL_BLUE_3, my_rect, border_radius=2)
 			else:
-				pygame.draw.rect(screen, Color.PAL_BLUE_4, my_rect, border_radius=2)
+				screen.draw_rect(Color.PAL_BLUE_4, my_rect, border_radius=2)
 			#
 			for i in range(self.current_range[0], self.current_range[1]):
 				offset = self.offset + Vector2(0, (i - self.current_range[0]) * self.row_height + 1)
@@ -270,9 +270,9 @@ class TerrainMenu:
 			br = self.pos + Vector2((self.current_col+1)*self.col_width, (self.index - self.current_range[0] + 1) * self.row_height)
 			my_rect = pygame.Rect(tl, br-tl)
 			if self.is_selected:
-				pygame.draw.rect(screen, Color.PAL_BLUE_3, my_rect, border_radius=2)
+				screen.draw_rect(Color.PAL_BLUE_3, my_rect, border_radius=2)
 			else:
-				pygame.draw.rect(screen, Color.PAL_BLUE_4, my_rect, border_radius=2)
+				screen.draw_rect(Color.PAL_BLUE_4, my_rect, border_radius=2)
 			#
 			for i in range(self.current_range[0], self.current_range[1]):
 				for j in range(len(self.content[i])):
@@ -283,9 +283,9 @@ class TerrainMenu:
 					else:
 						dx = Vector2(self.tile_dim*GRID_SIZE, 0)
 						dy = Vector2(0, self.tile_dim*GRID_SIZE)
-						pygame.draw.line(screen, Color.PAL_BLUE_3,       my_pos,    my_pos+dx, width=1)
-						pygame.draw.line(screen, Color.PAL_BLUE_3,    my_pos+dx, my_pos+dx+dy, width=1)
-						pygame.draw.line(screen, Color.PAL_BLUE_3, my_pos+dx+dy,    my_pos+dy, width=1)
-						pygame.draw.line(screen, Color.PAL_BLUE_3,    my_pos+dy,       my_pos, width=1)
+						screen.draw_line(Color.PAL_BLUE_3,       my_pos,    my_pos+dx, width=1)
+						screen.draw_line(Color.PAL_BLUE_3,    my_pos+dx, my_pos+dx+dy, width=1)
+						screen.draw_line(Color.PAL_BLUE_3, my_pos+dx+dy,    my_pos+dy, width=1)
+						screen.draw_line(Color.PAL_BLUE_3,    my_pos+dy,       my_pos, width=1)
 					if highlight_walls and self.content[i][j][1]:
 						screen.blit(self.wall_highlight, my_pos, special_flags=pygame.BLEND_ALPHA_SDL2)
@@ -57,9 +57,9 @@ class TextInput:
 	def draw(self, screen):
 		my_rect = pygame.Rect(self.tl, self.br - self.tl)
 		if self.is_selected:
-			pygame.draw.rect(screen, Color.PAL_BLUE_4, my_rect, border_radius=2)
+			screen.draw_rect(Color.PAL_BLUE_4, my_rect, border_radius=2)
 		else:
-			pygame.draw.rect(screen, Color.PAL_BLUE_5, my_rect, border_radius=2)
+			screen.draw_rect(Color.PAL_BLUE_5, my_rect, border_radius=2)
 		#
 		if self.is_selected:
 			if self.draw_cursor:
@@ -1,19 +1,9 @@
+import numpy as np
 import pygame
 import os
 
-from source.globals import GRID_SIZE
-
-#
-# (is_wall, image_fn)
-#
-TILE_NAME = [(0, ''),
-             (1, ''),
-             (0, 'blank.png'),
-             (1, 'wall5.png'),
-             (0, 'block.png'),
-             (0, 'blank_light.png'),
-             (0, 'jungle_test.png'),
-             (1, 'jungle_test2.png')]
+from source.atlas   import TextureAtlas
+from source.globals import GRID_SIZE, TILE_NAME
 
 class TileManager:
 	def __init__(self, tile_dir):
@@ -27,7 +17,7 @@ class TileManager:
 		self.tile_2x2     = []
 		self.tile_4x4     = []
 		current_tile_num = 0
-		for i, (is_wall, fn) in enumerate(TILE_NAME):
+		for i, (is_wall, fn, tile_span) in enumerate(TILE_NAME):
 			# null tiles
 			if not fn:
 				self.tile_img.append(None)
@@ -44,6 +34,10 @@ class TileManager:
 				tile_fn    = os.path.join(tile_dir, fn)
 				my_surface = pygame.image.load(tile_fn).convert()
 				img_size   = my_surface.get_size()
+				# MapData works out tile ids from tile_span alone, so they need to agree
+				if img_size != (tile_span*GRID_SIZE, tile_span*GRID_SIZE):
+					print('Error: tile image size does not match its TILE_NAME tile_span:', fn, img_size)
+					exit(1)
 				#
 				if img_size == (16,16):
 					self.tile_img.append(pygame.image.load(tile_fn).convert())
@@ -80,3 +74,20 @@ class TileManager:
 						current_tile_num += 1
 				else:
 					print('skipping tile (invalid size):', fn)
+		#
+		# all the 1x1 tiles live in one opaque atlas, tile_img entries are views into it
+		#
+		self.atlas = TextureAtlas(has_alpha=False)
+		atlas_entries = [self.atlas.add(n) if n != None else None for n in self.tile_img]
+		self.atlas.build()
+		self.tile_img = [self.atlas.get_surface(n) if n != None else None for n in atlas_entries]
+		#
+		# every 1x1 tile as one (T,16,16,3) rgb array indexed [tile_id,y,x], so whole tile arrays can be rasterized with numpy
+		# -- null tiles are left black, tile_is_null says where they are
+		#
+		self.tile_pixels  = np.zeros((len(self.tile_img), GRID_SIZE, GRID_SIZE, 3), dtype='uint8')
+		self.tile_is_null = np.array([n == None for n in self.tile_img], dtype='bool')
+		self.tile_is_wall = np.array(self.is_wall, dtype='bool')
+		for (tile_num, tile_img) in enumerate(self.tile_img):
+			if tile_img != None:
+				self.tile_pixels[tile_num] = pygame.surfarray.array3d(tile_img).transpose(1,0,2)
@@ -1,23 +1,139 @@
+import numpy as np
 import pygame
 
 from pygame.math import Vector2
 
-from source.globals   import GRID_SIZE
+from source.globals   import GRID_SIZE, TERRAIN_CHUNK_SIZE
 from source.misc_gfx  import Color
 
+#
+# per-tile rgba for the whole tileset, (T,16,16,4) indexed [tile_id,y,x]
+# -- null tiles are transparent, highlighted null walls are the highlight color at the highlight's alpha
+# -- the highlight blend is the same integer math SDL uses for a surface alpha blit, so it matches blitting wall_highlight
+#
+def get_tile_rgba(tile_manager, highlight_walls=False, highlight_alpha=128):
+	tile_rgba = np.zeros(tile_manager.tile_pixels.shape[:3] + (4,), dtype='uint8')
+	tile_rgba[:,:,:,:3] = tile_manager.tile_pixels
+	tile_rgba[~tile_manager.tile_is_null,:,:,3] = 255
+	if highlight_walls:
+		solid_walls = tile_manager.tile_is_wall & ~tile_manager.tile_is_null
+		wall_px     = tile_rgba[solid_walls,:,:,:3].astype('int')
+		hl_color    = np.array(Color.PAL_YEL_2, dtype='int')
+		tile_rgba[solid_walls,:,:,:3] = wall_px + (((hl_color - wall_px)*highlight_alpha) >> 8)
+		tile_rgba[tile_manager.tile_is_wall & tile_manager.tile_is_null] = Color.PAL_YEL_2 + (highlight_alpha,)
+	return tile_rgba
+
+#
+# rgba --> uint32 pixels in my_surface's format, so they can be written straight through pixels2d (32-bit surfaces only)
+#
+def pack_pixels(rgba, my_surface):
+	(r_shift, g_shift, b_shift, a_shift) = my_surface.get_shifts()
+	packed  = rgba[...,0].astype('uint32') << r_shift
+	packed |= rgba[...,1].astype('uint32') << g_shift
+	packed |= rgba[...,2].astype('uint32') << b_shift
+	if my_surface.get_masks()[3]:
+		packed |= rgba[...,3].astype('uint32') << a_shift
+	return packed
+
+#
+# lays out tile_table[tile_id] (anything shaped (T,16,16,...) and indexed [tile_id,y,x]) for a whole tile array in one go
+# -- tile_table[map_array.T] is (h,w,16,16,...), written through a (h,16,w,16,...) view of the output so the tiles land side by side
+# -- out can be a row-major view of a surface's pixels (e.g. pixels2d(...).T of a 32-bit surface, where pitch == width*4)
+#
+def rasterize_tiles(tile_table, map_array, out=None):
+	tile_ids = map_array.T
+	(rows, cols) = tile_ids.shape
+	if out is None:
+		out = np.empty((rows*GRID_SIZE, cols*GRID_SIZE) + tile_table.shape[3:], dtype=tile_table.dtype)
+	out.reshape((rows, GRID_SIZE, cols, GRID_SIZE) + tile_table.shape[3:]).swapaxes(1,2)[:] = tile_table[tile_ids]
+	return out
+
+#
+# chunk coordinates that overlap the screen at this offset, map_size in pixels
+#
+def get_visible_chunks(screen, offset, map_size):
+	(screen_w, screen_h) = screen.get_size()
+	num_cx = (int(map_size[0]) + TERRAIN_CHUNK_SIZE - 1)//TERRAIN_CHUNK_SIZE
+	num_cy = (int(map_size[1]) + TERRAIN_CHUNK_SIZE - 1)//TERRAIN_CHUNK_SIZE
+	cx0 = max(0, int(-offset.x // TERRAIN_CHUNK_SIZE))
+	cy0 = max(0, int(-offset.y // TERRAIN_CHUNK_SIZE))
+	cx1 = min(num_cx-1, int((screen_w - 1 - offset.x) // TERRAIN_CHUNK_SIZE))
+	cy1 = min(num_cy-1, int((screen_h - 1 - offset.y) // TERRAIN_CHUNK_SIZE))
+	return [(cx, cy) for cx in range(cx0, cx1+1) for cy in range(cy0, cy1+1)]
+
+#
+# draws a tile array through a cache of pre-rendered chunks, blitting only the ones that overlap the screen
+# -- chunks are kept per (cx, cy, highlight_walls) until mark_dirty() is called for the tiles under them
+# -- a different array (e.g. after a resize or loading a map) throws the whole cache away
+#
 class TileMap:
 	def __init__(self, tile_manager):
 		self.tile_manager   = tile_manager
 		self.wall_highlight = pygame.Surface(Vector2(GRID_SIZE, GRID_SIZE))
 		self.wall_highlight.fill(Color.PAL_YEL_2)
 		self.wall_highlight.set_alpha(128)
+		self.chunk_tiles    = int(TERRAIN_CHUNK_SIZE/GRID_SIZE)
+		self.chunks         = {}	# [(cx, cy, highlight_walls)] = surface, or None if there's nothing to draw
+		self.map_array      = None
+		self.tile_tables    = {}	# [(highlight_walls, surface masks)] = packed (T,16,16) tileset, see get_terrain_surface()
+
+	#
+	# tile_box = (x0, y0, x1, y1) in tiles (exclusive), None = everything
+	#
+	def mark_dirty(self, tile_box=None):
+		if tile_box == None:
+			self.chunks = {}
+			return
+		(x0, y0, x1, y1) = [int(n) for n in tile_box]
+		if x1 <= x0 or y1 <= y0:
+			return
+		for cx in range(x0//self.chunk_tiles, (x1-1)//self.chunk_tiles + 1):
+			for cy in range(y0//self.chunk_tiles, (y1-1)//self.chunk_tiles + 1):
+				for highlight_walls in [False, True]:
+					if (cx, cy, highlight_walls) in self.chunks:
+						del self.chunks[(cx, cy, highlight_walls)]
+
+	#
+	# whole tile array --> surface, with per-pixel alpha only if it has null tiles (so whatever is underneath still shows through)
+	# -- opaque surfaces are made directly in the display's format rather than converted afterwards
+	# -- packed tilesets are cached per (highlight, pixel format), after that it's one gather straight into the surface's pixels
+	#
+	def get_terrain_surface(self, map_array, highlight_walls=False):
+		has_alpha    = self.tile_manager.tile_is_null[map_array].any()
+		surface_size = (map_array.shape[0]*GRID_SIZE, map_array.shape[1]*GRID_SIZE)
+		if has_alpha:
+			my_surface = pygame.Surface(surface_size, pygame.SRCALPHA)
+		else:
+			my_surface = pygame.Surface(surface_size, 0, pygame.display.get_surface())
+		if my_surface.get_bitsize() != 32:
+			rgba = rasterize_tiles(get_tile_rgba(self.tile_manager, highlight_walls, self.wall_highlight.get_alpha()), map_array)
+			pygame.surfarray.blit_array(my_surface, rgba[:,:,:3].transpose(1,0,2))
+			return my_surface
+		table_key = (highlight_walls, my_surface.get_masks())
+		if table_key not in self.tile_tables:
+			self.tile_tables[table_key] = pack_pixels(get_tile_rgba(self.tile_manager, highlight_walls, self.wall_highlight.get_alpha()), my_surface)
+		rasterize_tiles(self.tile_tables[table_key], map_array, out=pygame.surfarray.pixels2d(my_surface).T)
+		return my_surface
+
+	def get_chunk(self, map_array, cx, cy, highlight_walls):
+		if (cx, cy, highlight_walls) in self.chunks:
+			return self.chunks[(cx, cy, highlight_walls)]
+		(x0, y0)   = (cx*self.chunk_tiles, cy*self.chunk_tiles)
+		chunk_tids = map_array[x0:x0+self.chunk_tiles, y0:y0+self.chunk_tiles]
+		if self.tile_manager.tile_is_null[chunk_tids].all() and not (highlight_walls and self.tile_manager.tile_is_wall[chunk_tids].any()):
+			self.chunks[(cx, cy, highlight_walls)] = None
+			return None
+		self.chunks[(cx, cy, highlight_walls)] = self.get_terrain_surface(chunk_tids, highlight_walls)
+		return self.chunks[(cx, cy, highlight_walls)]
+
+	def get_visible_chunks(self, screen, offset, map_array):
+		return get_visible_chunks(screen, offset, (map_array.shape[0]*GRID_SIZE, map_array.shape[1]*GRID_SIZE))
 
 	def draw(self, screen, offset, map_array, highlight_walls=False):
-		for x in range(map_array.shape[0]):
-			for y in range(map_array.shape[1]):
-				my_pos = Vector2(x*GRID_SIZE, y*GRID_SIZE)
-				my_tid = map_array[x,y]
-				if self.tile_manager.tile_img[my_tid] != None:
-					screen.blit(self.tile_manager.tile_img[my_tid], my_pos + offset)
-				if highlight_walls and self.tile_manager.is_wall[my_tid]:
-					screen.blit(self.wall_highlight, my_pos + offset, special_flags=pygame.BLEND_ALPHA_SDL2)
+		if map_array is not self.map_array:
+			self.mark_dirty()
+			self.map_array = map_array
+		for (cx, cy) in self.get_visible_chunks(screen, offset, map_array):
+			chunk_surface = self.get_chunk(map_array, cx, cy, highlight_walls)
+			if chunk_surface != None:
+				screen.blit(chunk_surface, Vector2(cx*TERRAIN_CHUNK_SIZE, cy*TERRAIN_CHUNK_SIZE) + offset)
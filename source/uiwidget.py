@@ -12,6 +12,8 @@ class UIWidget:
 		self.is_mouseover   = False
 		self.mouseover_draw = []
 		self.return_msg     = ''
+		self.cached_surfaces = {}	# [is_mouseover] = (surface, pos), see get_surface()
+		self.cached_text     = {}
 
 	def add_image(self, pos, img_fn, mouseover_condition=(True,True)):
 		self.object_types.append('image')
@@ -49,27 +51,59 @@ class UIWidget:
 			return self.return_msg
 		return ''
 
-	def draw(self, screen):
+	#
+	# components visible in one mouseover state are composed into one transparent surface, so drawing a widget is a single blit
+	# -- both states are kept, and thrown away when anything in text_data changes (it's assigned every frame, usually to the same thing)
+	#
+	def get_surface(self, is_mouseover):
+		if self.text_data != self.cached_text:
+			self.cached_surfaces = {}
+			self.cached_text     = dict(self.text_data)
+		if is_mouseover not in self.cached_surfaces:
+			self.cached_surfaces[is_mouseover] = self.compose(is_mouseover)
+		return self.cached_surfaces[is_mouseover]
+
+	#
+	# --> (surface, top-left screen position), or (None, None) if nothing is visible in this state
+	#
+	def compose(self, is_mouseover):
+		components = []
 		for i,obj_dat in enumerate(self.object_data):
-			if (self.is_mouseover and self.mouseover_draw[i][1]) or (not self.is_mouseover and self.mouseover_draw[i][0]):
-				#
-				#
+			if (is_mouseover and self.mouseover_draw[i][1]) or (not is_mouseover and self.mouseover_draw[i][0]):
 				if self.object_types[i] == 'image':
 					(pos, img) = obj_dat
-					screen.blit(img, pos)
-				#
-				#
+					components.append(('image', pygame.Rect((int(pos.x), int(pos.y)), img.get_size()), obj_dat))
 				elif self.object_types[i] == 'line':
 					(p1, p2, color, width) = obj_dat
-					pygame.draw.line(screen, color, p1, p2, width=width)
-				#
-				#
+					bounds = pygame.Rect(int(min(p1.x, p2.x)), int(min(p1.y, p2.y)), int(abs(p2.x - p1.x)) + 1, int(abs(p2.y - p1.y)) + 1)
+					components.append(('line', bounds.inflate(2*width + 2, 2*width + 2), obj_dat))
 				elif self.object_types[i] == 'rect':
 					(tl, br, color, border_radius) = obj_dat
-					my_rect = pygame.Rect(tl, br-tl)
-					pygame.draw.rect(screen, color, my_rect, border_radius=border_radius)
-				#
-				#
+					components.append(('rect', pygame.Rect(tl, br-tl), obj_dat))
 				elif self.object_types[i] == 'text':
 					(pos, text_key, font, is_centered, max_width, num_rows) = obj_dat
-					font.render(screen, self.text_data[text_key], pos, centered=is_centered, max_width=max_width, num_rows=num_rows)
+					(text_surface, text_offset) = font.get_text_surface(self.text_data[text_key], centered=is_centered, max_width=max_width, num_rows=num_rows)
+					if text_surface != None:
+						text_pos = pos + text_offset
+						components.append(('text', pygame.Rect((int(text_pos.x), int(text_pos.y)), text_surface.get_size()), text_surface))
+		if not components:
+			return (None, None)
+		bounds = components[0][1].unionall([n[1] for n in components])
+		origin = Vector2(bounds.topleft)
+		widget_surface = pygame.Surface(bounds.size, pygame.SRCALPHA)
+		for (obj_type, obj_bounds, obj_dat) in components:
+			if obj_type == 'image':
+				widget_surface.blit(obj_dat[1], obj_dat[0] - origin)
+			elif obj_type == 'line':
+				(p1, p2, color, width) = obj_dat
+				pygame.draw.line(widget_surface, color, p1 - origin, p2 - origin, width=width)
+			elif obj_type == 'rect':
+				pygame.draw.rect(widget_surface, obj_dat[2], obj_bounds.move(-bounds.x, -bounds.y), border_radius=obj_dat[3])
+			elif obj_type == 'text':
+				widget_surface.blit(obj_dat, obj_bounds.move(-bounds.x, -bounds.y))
+		return (widget_surface, bounds.topleft)
+
+	def draw(self, screen):
+		(widget_surface, pos) = self.get_surface(self.is_mouseover)
+		if widget_surface != None:
+			screen.blit(widget_surface, pos)